@@ -0,0 +1,9 @@
+"""
+This script runs the geoindexity command line interface with python -m geoindexity.
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+This script includes the persistent result cache of GeoIndexity.
+
+Reduction results are stored in a local SQLite database, keyed by a hash of
+everything that determines them (collection, ROI, date range, property
+filters, index definitions and statistics). Repeated queries are answered
+from disk without contacting Google Earth Engine (GEE). Entries expire after
+a time-to-live, and the least recently used entries are evicted when the
+cache grows beyond its size limit.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'geoindexity', 'results.sqlite')
+
+
+def fingerprint(**parts):
+    """Returns a stable hash of the given query parts.
+
+    Arguments
+    ----------
+    **parts
+        JSON-serializable values that determine a result.
+
+    Returns
+    ----------
+    str
+        Hexadecimal SHA-256 digest.
+    """
+    text = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    A content-addressed cache of reduction results in a SQLite database.
+
+    Attributes
+    ----------
+    path : str
+        Path of the SQLite database.
+    ttl : float
+        Seconds after which an entry expires, or None to keep entries until evicted.
+    max_bytes : int
+        Maximum total size of the stored (compressed) results.
+    max_entries : int
+        Maximum number of entries, or None for no limit.
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups not found or expired.
+    """
+    def __init__(self, path=DEFAULT_PATH, ttl=None, max_bytes=512 * 1024 * 1024, max_entries=None):
+        """Opens or creates the cache database.
+
+        Arguments
+        ----------
+        path : str
+            Path of the SQLite database (default: ~/.cache/geoindexity/results.sqlite).
+        ttl : float, optional
+            Seconds after which an entry expires (default: never).
+        max_bytes : int
+            Maximum total size of the stored results (default: 512 MiB).
+        max_entries : int, optional
+            Maximum number of entries (default: no limit).
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, '
+                               'created REAL NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        return _Transaction(connection)
+
+    def get(self, key):
+        """Returns the cached value of a key, or None if it is missing or expired."""
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute('SELECT payload, created FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                row = None
+            if row is not None:
+                connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value):
+        """Stores a JSON-serializable value and evicts entries beyond the limits."""
+        payload = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                               (key, payload, len(payload), now, now))
+            self._evict(connection)
+
+    def _evict(self, connection):
+        """Deletes expired entries, then the least recently used ones until the limits are met."""
+        if self.ttl is not None:
+            connection.execute('DELETE FROM entries WHERE created < ?', (time.time() - self.ttl,))
+        count, total = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        stale = []
+        for key, size in connection.execute('SELECT key, size FROM entries ORDER BY accessed'):
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        connection.executemany('DELETE FROM entries WHERE key = ?', stale)
+
+    def __contains__(self, key):
+        with self._connect() as connection:
+            row = connection.execute('SELECT created FROM entries WHERE key = ?', (key,)).fetchone()
+        return row is not None and (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def clear(self):
+        """Deletes all entries and resets the counters."""
+        with self._connect() as connection:
+            connection.execute('DELETE FROM entries')
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Returns the number of hits, misses and entries and the stored size in bytes."""
+        with self._connect() as connection:
+            entries, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+
+class _Transaction:
+    """Context manager that commits (or rolls back) and closes a SQLite connection."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, *exc_info):
+        with closing(self.connection):
+            if exc_info[0] is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+
+
+def open_cache(cache):
+    """Returns a ResultCache for a cache argument.
+
+    Arguments
+    ----------
+    cache
+        None, a ResultCache, a path of a SQLite database, or True for the default path.
+
+    Returns
+    ----------
+    ResultCache or None
+    """
+    if cache is None or cache is False:
+        return None
+    if isinstance(cache, ResultCache):
+        return cache
+    if cache is True:
+        return ResultCache()
+    return ResultCache(os.fspath(cache))
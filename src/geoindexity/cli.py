@@ -0,0 +1,439 @@
+"""
+This script includes the geoindexity command line interface.
+
+It reduces the time-series of many AOIs from a manifest, a CSV or GeoJSON
+file of ROIs with date ranges and indices, without a notebook. The jobs of
+the manifest are grouped into shards that run across a process pool. Every
+worker initializes its own Earth Engine session on its first request and
+limits its requests in flight, so that all workers together stay within
+the request quota. Each finished shard is written to a partitioned Parquet
+dataset and recorded in a checkpoint file, so a run that was killed resumes
+with the shards that are not finished yet.
+
+    geoindexity run parcels.geojson --dates 2020-01-01/2021-01-01 --indices NDVI,EVI --output results
+"""
+
+import argparse
+import collections
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+from . import session
+from .cache import fingerprint
+
+# File in the output directory that lists the finished shards; ignored by Parquet readers
+CHECKPOINT_FILE = '_checkpoint.jsonl'
+
+# Jobs per shard, and the concurrent requests of all workers together
+SHARD_SIZE = 16
+REQUEST_QUOTA = 40
+
+Job = collections.namedtuple('Job', ['job_id', 'aoi_id', 'roi', 'start_date', 'end_date', 'collection_id',
+                                     'indices', 'stats', 'cloud_mask', 'composite'])
+Shard = collections.namedtuple('Shard', ['shard_id', 'jobs'])
+
+
+def _split(value):
+    """Splits a list given as text, such as 'NDVI;EVI' or 'NDVI EVI', or returns a list as is."""
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [item for item in re.split(r'[,;|\s]+', str(value)) if item]
+
+
+def _bbox(geometry):
+    """Returns [xmin, ymin, xmax, ymax] of a GeoJSON geometry."""
+    points = []
+
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            points.append(coordinates)
+        else:
+            for item in coordinates:
+                collect(item)
+
+    if geometry.get('type') == 'GeometryCollection':
+        for item in geometry['geometries']:
+            collect(item['coordinates'])
+    else:
+        collect(geometry['coordinates'])
+    if not points:
+        raise ValueError('Empty geometry in the manifest.')
+    xs, ys = [point[0] for point in points], [point[1] for point in points]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _manifest_rows(path):
+    """Reads the rows of a manifest as (aoi_id, roi, properties) tuples."""
+    path = os.fspath(path)
+    if path.lower().endswith(('.geojson', '.json')):
+        from .geoindexity import region_features
+
+        with open(path) as file:
+            features = region_features(json.load(file), 'id')
+        for feature in features:
+            properties = feature['properties']
+            aoi_id = properties.get('parcel_id', properties['id'])
+            yield str(aoi_id), _bbox(feature['geometry']), properties
+        return
+
+    with open(path, newline='') as file:
+        for position, row in enumerate(csv.DictReader(file)):
+            row = {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            if all(key in row for key in ('xmin', 'ymin', 'xmax', 'ymax')):
+                roi = [float(row[key]) for key in ('xmin', 'ymin', 'xmax', 'ymax')]
+            elif 'roi' in row:
+                roi = [float(value) for value in _split(row['roi'])]
+            else:
+                raise ValueError(f'Manifest row {position + 1} has no ROI; give xmin, ymin, xmax and ymax or roi columns.')
+            if len(roi) != 4:
+                raise ValueError(f'Manifest row {position + 1} has an invalid ROI: {roi}.')
+            yield str(row.get('parcel_id', row.get('id', position))), roi, row
+
+
+def read_manifest(path, dates=None, indices=('NDVI',), stats=('mean',), collection_id='Sentinel', cloud_mask=None,
+                  composite=None):
+    """Reads the jobs of a manifest.
+
+    Every row or feature is an AOI. Its columns or properties can set id (or parcel_id),
+    start_date, end_date, indices, stats, collection_id, cloud_mask and composite; missing
+    values are taken from the arguments. CSV rows give the ROI as xmin, ymin, xmax and ymax
+    columns or as a roi column; GeoJSON features are reduced over the bounding box of their
+    geometry. An AOI without start_date and end_date gets one job per date range of dates.
+
+    Arguments
+    ----------
+    path : str
+        CSV, GeoJSON or JSON file.
+    dates : list, optional
+        (start_date, end_date) tuples for AOIs without dates.
+    indices : list
+        Index names (default: ('NDVI',)).
+    stats : list
+        Statistics (default: ('mean',)).
+    collection_id : str
+        Collection (default: 'Sentinel').
+    cloud_mask : str, optional
+        Cloud mask name.
+    composite : str, optional
+        Composite period.
+
+    Returns
+    ----------
+    list
+        Job tuples in manifest order.
+
+    Raises
+    ----------
+    ValueError
+        If an AOI has no ROI or no date range, or if two jobs have the same id.
+    """
+    jobs, seen = [], set()
+    for aoi_id, roi, properties in _manifest_rows(path):
+        if properties.get('start_date') and properties.get('end_date'):
+            ranges = [(str(properties['start_date']), str(properties['end_date']))]
+        elif dates:
+            ranges = list(dates)
+        else:
+            raise ValueError(f'AOI {aoi_id} has no date range; add start_date and end_date or use --dates.')
+        for start_date, end_date in ranges:
+            job_id = f'{aoi_id}/{start_date}/{end_date}'
+            if job_id in seen:
+                raise ValueError(f'Duplicate job in the manifest: {job_id}.')
+            seen.add(job_id)
+            jobs.append(Job(job_id, aoi_id, roi, start_date, end_date,
+                            properties.get('collection_id', collection_id),
+                            _split(properties.get('indices', indices)), _split(properties.get('stats', stats)),
+                            properties.get('cloud_mask', cloud_mask), properties.get('composite', composite)))
+    return jobs
+
+
+def shard_jobs(jobs, shard_size=SHARD_SIZE):
+    """Groups jobs into shards with ids that only depend on their jobs.
+
+    Arguments
+    ----------
+    jobs : list
+        Job tuples.
+    shard_size : int
+        Jobs per shard (default: SHARD_SIZE).
+
+    Returns
+    ----------
+    list
+        Shard tuples of shard_id and jobs.
+    """
+    return [Shard(fingerprint(jobs=[list(job) for job in jobs[start:start + shard_size]])[:16],
+                  jobs[start:start + shard_size])
+            for start in range(0, len(jobs), shard_size)]
+
+
+def read_checkpoint(output):
+    """Returns the checkpoint records of the finished shards of an output directory by shard id."""
+    path = os.path.join(output, CHECKPOINT_FILE)
+    records = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut off by a killed run
+                    continue
+                records[record['shard_id']] = record
+    return records
+
+
+def _init_worker(options):
+    """Configures the session and scheduler of a worker process; both start on the first request."""
+    from . import scheduler
+
+    if options.get('project') is not None:
+        session.configure(project=options['project'])
+    scheduler.configure(max_in_flight=options['max_in_flight'], max_workers=options['max_in_flight'])
+
+
+def _reduce_job(job, options):
+    """Reduces one job; returns its DataFrame with parcel_id, start_date and end_date columns."""
+    from .geoindexity import Geoindexity
+
+    series = Geoindexity(job.roi, job.start_date, job.end_date, collection_id=job.collection_id,
+                         cloud_mask=job.cloud_mask, cache=options.get('cache'))
+    series.reduce(indices=job.indices, stats=job.stats, scale=options.get('scale'), chunked=options.get('chunked'),
+                  composite=job.composite)
+    df = series.df
+    df.insert(0, 'parcel_id', job.aoi_id)
+    df['start_date'] = job.start_date
+    df['end_date'] = job.end_date
+    return df
+
+
+def _write_shard(df, output, shard_id, partition_by):
+    """Writes the rows of a shard to the Parquet dataset; a rerun of the shard replaces its files."""
+    from . import columnar
+
+    if 'year' in partition_by and 'year' not in df.columns:
+        df = df.assign(year=df['Date'].dt.year.astype('int16'))
+    df = df.astype({'parcel_id': 'category'})
+    if partition_by:
+        columnar.to_parquet(df, output, partition_cols=partition_by, basename_template=f'part-{shard_id}-{{i}}.parquet')
+    else:
+        columnar.to_parquet(df, os.path.join(output, f'part-{shard_id}.parquet'))
+
+
+def run_shard(shard, output, options):
+    """Reduces the jobs of a shard and writes their rows. Runs in a worker process.
+
+    Arguments
+    ----------
+    shard : Shard
+        The shard.
+    output : str
+        Directory of the Parquet dataset.
+    options : dict
+        partition_by, scale, chunked and cache of run_manifest().
+
+    Returns
+    ----------
+    dict
+        Checkpoint record: shard_id, jobs, rows, seconds, process id and the errors by job id.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    frames, errors = [], {}
+    for job in shard.jobs:
+        try:
+            frames.append(_reduce_job(job, options))
+        except Exception as error:
+            errors[job.job_id] = repr(error)
+    frames = [df for df in frames if len(df)]
+    rows = 0
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+        _write_shard(df, output, shard.shard_id, options.get('partition_by') or ())
+        rows = len(df)
+    return {'shard_id': shard.shard_id, 'jobs': len(shard.jobs), 'rows': rows,
+            'seconds': time.perf_counter() - start, 'pid': os.getpid(), 'errors': errors}
+
+
+def run_manifest(manifest, output, dates=None, indices=('NDVI',), stats=('mean',), collection_id='Sentinel',
+                 cloud_mask=None, composite=None, scale=None, chunked=False, processes=None, shard_size=SHARD_SIZE,
+                 quota=REQUEST_QUOTA, partition_by=('year',), cache=None, project=None, resume=True, start_method=None,
+                 log=print):
+    """Reduces all jobs of a manifest across a process pool into a partitioned Parquet dataset.
+
+    Shards that are recorded as finished without errors in the checkpoint file of the
+    output directory are skipped, unless resume is False. Shards with failed jobs are
+    run again by the next run.
+
+    Arguments
+    ----------
+    manifest : str
+        CSV or GeoJSON manifest (see read_manifest()).
+    output : str
+        Directory of the Parquet dataset and the checkpoint file.
+    dates, indices, stats, collection_id, cloud_mask, composite
+        Defaults for the AOIs of the manifest (see read_manifest()).
+    scale : float, optional
+        Nominal scale of the reductions in meters.
+    chunked : bool
+        Reduce long date ranges in windows (default: False).
+    processes : int, optional
+        Worker processes (default: os.cpu_count()); 1 runs in the calling process with
+        its default scheduler, which quota does not change.
+    shard_size : int
+        Jobs per shard (default: SHARD_SIZE).
+    quota : int
+        Requests in flight of all worker processes together; every worker gets an equal
+        share (default: REQUEST_QUOTA).
+    partition_by : list
+        Columns to partition the dataset by; 'year' is derived from Date (default: ('year',)).
+    cache : str, optional
+        Path of a result cache shared by the workers.
+    project : str, optional
+        Google Cloud project of the Earth Engine sessions.
+    resume : bool
+        Skip the shards finished by an earlier run (default: True).
+    start_method : str, optional
+        Start method of the worker processes, such as 'fork' or 'spawn' (default: the
+        default of multiprocessing).
+    log : function
+        Receives progress messages (default: print).
+
+    Returns
+    ----------
+    dict
+        Numbers of jobs, shards, skipped shards, rows and failed jobs, seconds, and AOIs
+        (jobs) per minute of the shards run.
+    """
+    processes = processes or os.cpu_count() or 1
+    jobs = read_manifest(manifest, dates, indices, stats, collection_id, cloud_mask, composite)
+    shards = shard_jobs(jobs, shard_size)
+    os.makedirs(output, exist_ok=True)
+    finished = read_checkpoint(output) if resume else {}
+    pending = [shard for shard in shards
+               if shard.shard_id not in finished or finished[shard.shard_id]['errors']]
+    log(f'{len(jobs)} jobs in {len(shards)} shards, {len(shards) - len(pending)} finished by an earlier run')
+
+    options = {'partition_by': list(partition_by or ()), 'scale': scale, 'chunked': chunked, 'cache': cache,
+               'project': project, 'max_in_flight': max(1, quota // processes)}
+    summary = {'jobs': len(jobs), 'shards': len(shards), 'skipped': len(shards) - len(pending), 'rows': 0,
+               'failed': 0, 'processes': processes}
+    start = time.perf_counter()
+    done_jobs = 0
+    path = os.path.join(output, CHECKPOINT_FILE)
+    # Start on a new line if a killed run left half a record
+    incomplete = False
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            incomplete = file.read(1) != b'\n'
+    with open(path, 'a') as checkpoint:
+        if incomplete:
+            checkpoint.write('\n')
+        for record in _map_shards(pending, output, options, processes, start_method):
+            checkpoint.write(json.dumps(record) + '\n')
+            checkpoint.flush()
+            done_jobs += record['jobs']
+            summary['rows'] += record['rows']
+            summary['failed'] += len(record['errors'])
+            minutes = (time.perf_counter() - start) / 60
+            log(f"Shard {record['shard_id']}: {record['jobs']} jobs, {record['rows']} rows, "
+                f"{len(record['errors'])} failed ({done_jobs / max(minutes, 1e-9):.1f} AOIs/min)")
+            for job_id, error in record['errors'].items():
+                log(f'  {job_id}: {error}')
+    summary['seconds'] = time.perf_counter() - start
+    summary['aois_per_minute'] = done_jobs * 60 / max(summary['seconds'], 1e-9)
+    return summary
+
+
+def _map_shards(shards, output, options, processes, start_method=None):
+    """Yields the checkpoint records of the shards as they finish."""
+    if processes <= 1:
+        # The calling process keeps its own scheduler; only an explicit project is applied
+        if options.get('project') is not None:
+            session.configure(project=options['project'])
+        for shard in shards:
+            yield run_shard(shard, output, options)
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker,
+                             initargs=(options,)) as pool:
+        futures = [pool.submit(run_shard, shard, output, options) for shard in shards]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def read_results(output):
+    """Reads the Parquet dataset of run_manifest() into a DataFrame (see columnar.read_dataset())."""
+    from . import columnar
+
+    return columnar.read_dataset(output)
+
+
+def _date_range(text):
+    start_date, separator, end_date = text.partition('/')
+    if not separator or not start_date or not end_date:
+        raise argparse.ArgumentTypeError(f'Invalid date range: {text}. Use START/END, such as 2020-01-01/2021-01-01.')
+    return start_date, end_date
+
+
+def main(argv=None):
+    """Command line entry point of geoindexity."""
+    parser = argparse.ArgumentParser(prog='geoindexity', description='Vegetation index time-series for many AOIs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='reduce the AOIs of a manifest into a partitioned Parquet dataset')
+    run_parser.add_argument('manifest', help='CSV or GeoJSON file of AOIs')
+    run_parser.add_argument('--output', '-o', required=True, help='directory of the Parquet dataset')
+    run_parser.add_argument('--dates', type=_date_range, action='append',
+                            help='START/END date range for AOIs without dates; can be repeated')
+    run_parser.add_argument('--indices', default='NDVI', help='comma separated index names (default: NDVI)')
+    run_parser.add_argument('--stats', default='mean', help='comma separated statistics (default: mean)')
+    run_parser.add_argument('--collection', default='Sentinel', help='Sentinel, Landsat or Merged (default: Sentinel)')
+    run_parser.add_argument('--cloud-mask', default=None, help='cloud mask name (default: none)')
+    run_parser.add_argument('--composite', default=None, help='composite period (default: none)')
+    run_parser.add_argument('--scale', type=float, default=None, help='reduction scale in meters')
+    run_parser.add_argument('--chunked', action='store_true', help='reduce long date ranges in windows')
+    run_parser.add_argument('--processes', '-p', type=int, default=None, help='worker processes (default: CPUs)')
+    run_parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help=f'jobs per shard (default: {SHARD_SIZE})')
+    run_parser.add_argument('--quota', type=int, default=REQUEST_QUOTA,
+                            help=f'concurrent requests of all workers (default: {REQUEST_QUOTA})')
+    run_parser.add_argument('--partition-by', default='year', help="comma separated partition columns, '' for none")
+    run_parser.add_argument('--cache', default=None, help='result cache shared by the workers')
+    run_parser.add_argument('--project', default=None, help='Google Cloud project for Earth Engine')
+    run_parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and run all shards')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        if (args.processes or os.cpu_count() or 1) <= 1:
+            # The shards run in this process, which the command owns, so its scheduler takes the quota
+            from . import scheduler
+
+            scheduler.configure(max_in_flight=args.quota, max_workers=args.quota)
+        summary = run_manifest(args.manifest, args.output, dates=args.dates, indices=_split(args.indices),
+                               stats=_split(args.stats), collection_id=args.collection, cloud_mask=args.cloud_mask,
+                               composite=args.composite, scale=args.scale, chunked=args.chunked,
+                               processes=args.processes, shard_size=args.shard_size, quota=args.quota,
+                               partition_by=_split(args.partition_by), cache=args.cache, project=args.project,
+                               resume=not args.restart)
+        print(f"{summary['jobs'] - summary['failed']} of {summary['jobs']} jobs finished, {summary['rows']} rows, "
+              f"{summary['aois_per_minute']:.1f} AOIs/min with {summary['processes']} processes")
+        return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+This script includes the columnar storage helpers of GeoIndexity.
+
+Reduction results are kept as compact, typed pandas DataFrames: timestamps as
+datetime64[ms], index values as float32 and AOI or sensor identifiers as
+categoricals. They can be exported to Apache Arrow, Parquet and Feather and
+read back from memory-mapped Feather files. The export functions need the
+optional pyarrow dependency (pip install geoindexity[arrow]).
+"""
+
+# Columns that are neither timestamps nor index values
+CATEGORICAL_COLUMNS = ('parcel_id', 'Sensor')
+
+
+def compact(df, categorical=CATEGORICAL_COLUMNS):
+    """Converts a reduction result into compact column types.
+
+    Arguments
+    ----------
+    df : DataFrame
+        Table with a Date column (epoch milliseconds, strings or datetimes) and value columns.
+    categorical : tuple
+        Columns stored as categoricals if present (default: CATEGORICAL_COLUMNS).
+
+    Returns
+    ----------
+    DataFrame
+        The table with Date as datetime64[ms], the categorical columns as category
+        and all other columns as float32 (missing values become NaN).
+    """
+    import pandas as pd
+
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column == 'Date':
+            if pd.api.types.is_numeric_dtype(values):
+                values = pd.to_datetime(values, unit='ms')
+            else:
+                values = pd.to_datetime(values)
+            if getattr(values.dt, 'tz', None) is not None:
+                values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+            columns[column] = values.astype('datetime64[ms]')
+        elif column in categorical or isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.astype('category')
+        else:
+            columns[column] = pd.to_numeric(values, errors='coerce').astype('float32')
+    return pd.DataFrame(columns, index=df.index)
+
+
+def epoch_millis(dates):
+    """Returns a Date column as int64 milliseconds since epoch."""
+    import pandas as pd
+
+    return pd.to_datetime(dates).astype('datetime64[ms]').astype('int64')
+
+
+def _pyarrow():
+    """Imports pyarrow or raises an ImportError that explains how to install it."""
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ImportError("Arrow, Parquet and Feather support needs pyarrow. "
+                          "Install it with 'pip install pyarrow'.") from error
+    return pyarrow
+
+
+def to_arrow(df):
+    """Converts a DataFrame into a pyarrow.Table without copying numeric columns.
+
+    Arguments
+    ----------
+    df : DataFrame
+        Reduction result, ideally compacted with compact().
+
+    Returns
+    ----------
+    pyarrow.Table
+    """
+    pa = _pyarrow()
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def to_parquet(df, path, partition_cols=None, compression='zstd', basename_template=None):
+    """Writes a DataFrame to a Parquet file or a partitioned Parquet dataset.
+
+    Arguments
+    ----------
+    df : DataFrame
+        Reduction result.
+    path : str
+        File path, or directory path if partition_cols is given.
+    partition_cols : list, optional
+        Columns to partition the dataset by, such as ['parcel_id'].
+    compression : str
+        Parquet compression codec (default: 'zstd').
+    basename_template : str, optional
+        Names of the files of a partitioned dataset, such as 'part-7-{i}.parquet'. Existing
+        files with the same names are replaced, so writing the same part again replaces it
+        (default: unique names).
+    """
+    _pyarrow()
+    import pyarrow.parquet as pq
+
+    table = to_arrow(df)
+    if partition_cols:
+        options = {} if basename_template is None else {'basename_template': basename_template,
+                                                        'existing_data_behavior': 'overwrite_or_ignore'}
+        pq.write_to_dataset(table, root_path=path, partition_cols=list(partition_cols), compression=compression,
+                            **options)
+    else:
+        pq.write_table(table, path, compression=compression)
+
+
+def read_parquet(path, memory_map=True):
+    """Reads a Parquet file or dataset written by to_parquet() into a DataFrame."""
+    _pyarrow()
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path, memory_map=memory_map).to_pandas()
+
+
+def read_dataset(path):
+    """Reads a Parquet dataset with hive partitions into a DataFrame.
+
+    Files with different columns, such as reductions of different indices, are read with
+    the union of their columns; missing values become NaN.
+    """
+    pa = _pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    schema = pa.unify_schemas([dataset.schema, *(fragment.physical_schema for fragment in dataset.get_fragments())])
+    return ds.dataset(path, schema=schema, format='parquet', partitioning='hive').to_table().to_pandas()
+
+
+def to_feather(df, path, compression='uncompressed'):
+    """Writes a DataFrame to a Feather (Arrow IPC) file.
+
+    Uncompressed files (the default) can be memory-mapped by read_feather() without copying.
+    """
+    _pyarrow()
+    import pyarrow.feather as feather
+
+    feather.write_feather(to_arrow(df), path, compression=compression)
+
+
+def read_feather(path, memory_map=True, as_table=False):
+    """Reads a Feather file, memory-mapped by default.
+
+    Arguments
+    ----------
+    path : str
+        Feather file.
+    memory_map : bool
+        Map the file into memory instead of reading it (default: True).
+    as_table : bool
+        Return the pyarrow.Table, which references the mapped memory without copying (default: False).
+
+    Returns
+    ----------
+    DataFrame or pyarrow.Table
+    """
+    _pyarrow()
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, memory_map=memory_map)
+    return table if as_table else table.to_pandas()
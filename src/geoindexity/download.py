@@ -0,0 +1,258 @@
+"""
+This script includes the direct pixel download of GeoIndexity.
+
+Exports to Google Drive run as batch tasks that can take hours. For
+interactive work an image can instead be downloaded directly: the region
+is split into tiles that each fit into one request, the tiles are fetched
+concurrently through the request scheduler (getDownloadURL in NPY or
+GeoTIFF format, or ee.data.computePixels), and every tile is written into
+a NumPy array, a memory-mapped .npy file or a Zarr store as soon as it
+arrives, so memory use is bounded by the tiles in flight.
+"""
+
+import collections
+import io
+import math
+import os
+import urllib.request
+from concurrent.futures import as_completed
+
+from . import instrumentation, scheduler
+
+# Limits of a single pixel request: bytes of getDownloadURL (computePixels allows 48 MiB)
+# and pixels per side
+MAX_DOWNLOAD_BYTES = 32 * 1024 * 1024
+MAX_TILE_PIXELS = 32768
+
+# Meters per degree of latitude, to express a scale in meters on an EPSG:4326 grid
+METERS_PER_DEGREE = 111320.0
+
+Grid = collections.namedtuple('Grid', ['crs', 'transform', 'width', 'height'])
+Tile = collections.namedtuple('Tile', ['row', 'col', 'height', 'width'])
+
+
+def pixel_grid(bounds, scale, crs='EPSG:4326'):
+    """Returns the pixel grid that covers a bounding box.
+
+    Arguments
+    ----------
+    bounds : list
+        [xmin, ymin, xmax, ymax] in the coordinates of crs.
+    scale : float
+        Pixel size in meters. On EPSG:4326 it is converted to degrees with METERS_PER_DEGREE;
+        for other CRSs it is taken in CRS units.
+    crs : str
+        Coordinate reference system of the grid (default: 'EPSG:4326').
+
+    Returns
+    ----------
+    Grid
+        CRS, affine transform [scaleX, shearX, translateX, shearY, scaleY, translateY] of the
+        upper left corner, and width and height in pixels.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    size = scale / METERS_PER_DEGREE if crs == 'EPSG:4326' else scale
+    width = max(1, math.ceil((xmax - xmin) / size))
+    height = max(1, math.ceil((ymax - ymin) / size))
+    return Grid(crs, [size, 0, xmin, 0, -size, ymax], width, height)
+
+
+def tile_grid(grid, bands, itemsize=4, max_bytes=MAX_DOWNLOAD_BYTES, max_pixels=MAX_TILE_PIXELS):
+    """Splits a pixel grid into square tiles that each fit into a single request.
+
+    Arguments
+    ----------
+    grid : Grid
+        Grid of the whole region.
+    bands : int
+        Number of bands.
+    itemsize : int
+        Bytes per pixel and band (default: 4).
+    max_bytes : int
+        Maximum bytes per request (default: MAX_DOWNLOAD_BYTES).
+    max_pixels : int
+        Maximum pixels per tile side (default: MAX_TILE_PIXELS).
+
+    Returns
+    ----------
+    list
+        Tile (row, col, height, width) tuples in row-major order.
+    """
+    side = min(max_pixels, max(1, int(math.sqrt(max_bytes / (bands * itemsize)))))
+    return [Tile(row, col, min(side, grid.height - row), min(side, grid.width - col))
+            for row in range(0, grid.height, side) for col in range(0, grid.width, side)]
+
+
+def _tile_transform(grid, tile):
+    """Returns the affine transform of a tile of a grid."""
+    scale_x, shear_x, x, shear_y, scale_y, y = grid.transform
+    return [scale_x, shear_x, x + tile.col * scale_x, shear_y, scale_y, y + tile.row * scale_y]
+
+
+def _open_output(path, shape, dtype, chunks):
+    """Creates the array tiles are written to: in memory, a .npy memmap or a Zarr store."""
+    import numpy as np
+
+    if path is None:
+        return np.zeros(shape, dtype=dtype)
+    path = os.fspath(path)
+    if path.endswith('.zarr'):
+        try:
+            import zarr
+        except ImportError as error:
+            raise ImportError("Writing Zarr stores needs zarr. Install it with 'pip install geoindexity[download]'.") from error
+        return zarr.open(path, mode='w', shape=shape, chunks=chunks, dtype=dtype)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+
+def _decode(data, file_format, bands):
+    """Decodes a downloaded tile into an array of shape (bands, rows, cols)."""
+    import numpy as np
+
+    if file_format == 'NPY':
+        array = np.load(io.BytesIO(data), allow_pickle=False)
+        if array.dtype.names:
+            return np.stack([array[band] for band in bands])
+        return array[np.newaxis] if array.ndim == 2 else np.moveaxis(array, -1, 0)
+    try:
+        import tifffile
+    except ImportError as error:
+        raise ImportError("Decoding GeoTIFF tiles needs tifffile. "
+                          "Install it with 'pip install geoindexity[download]'.") from error
+    array = tifffile.imread(io.BytesIO(data))
+    return array[np.newaxis] if array.ndim == 2 else np.moveaxis(array, -1, 0)
+
+
+def _decode_array(array, bands):
+    """Converts a structured array of computePixels into shape (bands, rows, cols)."""
+    import numpy as np
+
+    return np.stack([array[band] for band in bands])
+
+
+def fetch_tile(image, grid, tile, bands, file_format='NPY', method='url', timeout=300):
+    """Downloads the pixels of one tile.
+
+    Arguments
+    ----------
+    image : ee.Image
+        Image to download.
+    grid : Grid
+        Grid of the whole region.
+    tile : Tile
+        Tile to download.
+    bands : list
+        Band names.
+    file_format : str
+        'NPY' or 'GEO_TIFF' (default: 'NPY'; GeoTIFF needs tifffile).
+    method : str
+        'url' for getDownloadURL and an HTTP request, or 'compute' for ee.data.computePixels
+        (default: 'url').
+    timeout : float
+        Seconds to wait for the HTTP response (default: 300).
+
+    Returns
+    ----------
+    numpy.ndarray
+        Pixels of shape (bands, tile.height, tile.width).
+    """
+    transform = _tile_transform(grid, tile)
+    if method == 'compute':
+        import ee
+
+        data = ee.data.computePixels({
+            'expression': image,
+            'fileFormat': 'NUMPY_NDARRAY' if file_format == 'NPY' else 'GEO_TIFF',
+            'bandIds': list(bands),
+            'grid': {
+                'dimensions': {'width': tile.width, 'height': tile.height},
+                'affineTransform': dict(zip(['scaleX', 'shearX', 'translateX', 'shearY', 'scaleY', 'translateY'],
+                                            transform)),
+                'crsCode': grid.crs,
+            },
+        })
+        if file_format == 'NPY':
+            return _decode_array(data, bands)
+        return _decode(data, file_format, bands)
+    url = image.getDownloadURL({
+        'bands': list(bands),
+        'crs': grid.crs,
+        'crs_transform': transform,
+        'dimensions': f'{tile.width}x{tile.height}',
+        'format': file_format,
+    })
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return _decode(response.read(), file_format, bands)
+
+
+def download_image(image, bounds, bands, scale, path=None, crs='EPSG:4326', dtype='float32', file_format='NPY',
+                   method='url', max_bytes=MAX_DOWNLOAD_BYTES, executor=None):
+    """Downloads an image region tile by tile into a local array.
+
+    The tiles are requested concurrently through the request scheduler, which limits
+    the requests in flight and retries throttled ones, and each tile is written to
+    the output as soon as it arrives.
+
+    Arguments
+    ----------
+    image : ee.Image
+        Image to download.
+    bounds : list
+        [xmin, ymin, xmax, ymax] of the region in the coordinates of crs.
+    bands : list
+        Band names.
+    scale : float
+        Pixel size in meters (see pixel_grid()).
+    path : str, optional
+        Output file: a path ending in '.zarr' creates a Zarr store (needs zarr), any other
+        path a memory-mapped .npy file. Without a path the array is kept in memory.
+    crs : str
+        Coordinate reference system of the output grid (default: 'EPSG:4326').
+    dtype : str
+        Data type of the output; float32 and float64 images are cast on the server (default: 'float32').
+    file_format : str
+        'NPY' or 'GEO_TIFF' (default: 'NPY').
+    method : str
+        'url' (getDownloadURL) or 'compute' (ee.data.computePixels) (default: 'url').
+    max_bytes : int
+        Maximum bytes per request, which sets the tile size (default: MAX_DOWNLOAD_BYTES).
+    executor : RequestExecutor, optional
+        Executor of the requests (default: the default executor of geoindexity.scheduler).
+
+    Returns
+    ----------
+    tuple
+        The array of shape (bands, height, width) (numpy.ndarray, numpy.memmap or zarr.Array)
+        and its Grid.
+    """
+    import numpy as np
+
+    bands = list(bands)
+    dtype = np.dtype(dtype)
+    if dtype == np.float32 and hasattr(image, 'toFloat'):
+        image = image.toFloat()
+    elif dtype == np.float64 and hasattr(image, 'toDouble'):
+        image = image.toDouble()
+    grid = pixel_grid(bounds, scale, crs)
+    tiles = tile_grid(grid, len(bands), dtype.itemsize, max_bytes)
+    side = max(max(tile.height, tile.width) for tile in tiles)
+    out = _open_output(path, (len(bands), grid.height, grid.width), dtype, (1, side, side))
+
+    executor = executor or scheduler.get_executor()
+    size = len(bands) * grid.height * grid.width * dtype.itemsize
+    with instrumentation.span('download', tiles=len(tiles), response_bytes=size):
+        futures = {executor.submit(lambda tile=tile: fetch_tile(image, grid, tile, bands, file_format, method),
+                                   'download'): tile
+                   for tile in tiles}
+        try:
+            for future in as_completed(futures):
+                tile = futures.pop(future)
+                out[:, tile.row:tile.row + tile.height, tile.col:tile.col + tile.width] = future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+    if hasattr(out, 'flush'):
+        out.flush()
+    return out, grid
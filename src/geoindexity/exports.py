@@ -0,0 +1,314 @@
+"""
+This script includes the export task manager of GeoIndexity.
+
+Earth Engine runs exports as batch tasks in a per-user queue with a limit on
+concurrent tasks. Starting hundreds of tasks at once, one per image, floods
+that queue and gives no way of knowing when they are done. ExportManager
+queues exports locally and keeps at most max_running of them on the server.
+It polls their status in one batched request with backoff and resubmits
+tasks that failed with a temporary error. The task state is persisted to a
+JSON file, so an interrupted run can be restarted without exporting
+completed images again.
+"""
+
+import json
+import os
+import statistics
+import threading
+import time
+
+from . import instrumentation, scheduler, session
+
+# Task states of Earth Engine; QUEUED marks exports that were not submitted yet
+ACTIVE_STATES = ('UNSUBMITTED', 'READY', 'RUNNING', 'CANCEL_REQUESTED')
+FINAL_STATES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+
+def task_status(task_ids):
+    """Returns the status of Earth Engine tasks in one request.
+
+    Arguments
+    ----------
+    task_ids : list
+        Task ids.
+
+    Returns
+    ----------
+    list
+        Status dictionaries with id, state and error_message.
+    """
+    import ee
+
+    session.ensure_initialized()
+    return scheduler.get_info(lambda: ee.data.getTaskStatus(list(task_ids)), 'task status')
+
+
+class ExportManager:
+    """
+    A queue of Earth Engine export tasks with a concurrency budget.
+
+    Exports are added as functions that create an unstarted ee.batch.Task, so a
+    failed export can be created and started again.
+
+    Attributes
+    ----------
+    max_running : int
+        Maximum number of submitted tasks that are not finished.
+    poll_interval : float
+        Seconds between status polls while tasks change state.
+    max_poll_interval : float
+        Upper bound of the poll interval; it grows by backoff while nothing changes.
+    backoff : float
+        Factor applied to the poll interval after a poll without changes.
+    max_retries : int
+        Number of times a failed export is submitted again.
+    retryable : function
+        Decides from the error message whether a failed export is submitted again.
+    path : str
+        JSON file the task state is persisted to, or None.
+    tasks : dict
+        State of every export by name: state, task_id, attempts, the queued, submitted,
+        started and finished timestamps, error, and the polls in a row that did not know the task.
+    """
+    def __init__(self, max_running=10, poll_interval=10.0, max_poll_interval=120.0, backoff=1.5, max_retries=2,
+                 retryable=scheduler.is_retryable, path=None, status=task_status, sleep=time.sleep):
+        """Initializes the manager and loads the persisted state.
+
+        Arguments
+        ----------
+        max_running : int
+            Maximum number of submitted, unfinished tasks (default: 10).
+        poll_interval : float
+            Seconds between status polls while tasks change state (default: 10.0).
+        max_poll_interval : float
+            Upper bound of the poll interval (default: 120.0).
+        backoff : float
+            Growth of the poll interval after a poll without changes (default: 1.5).
+        max_retries : int
+            Number of resubmissions of a failed export (default: 2).
+        retryable : function
+            Decides from the error message whether a failed export is resubmitted
+            (default: scheduler.is_retryable, which accepts temporary errors).
+        path : str, optional
+            JSON file the task state is persisted to. Exports that completed in an
+            earlier run are skipped, and running ones are monitored instead of submitted again.
+        status : function
+            Returns status dictionaries for a list of task ids (default: task_status()).
+        sleep : function
+            Waits the given number of seconds (default: time.sleep).
+        """
+        self.max_running = max_running
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.max_retries = max_retries
+        self.retryable = retryable
+        self.path = path
+        self.tasks = {}
+        self.resubmissions = 0
+        self._status = status
+        self._sleep = sleep
+        self._factories = {}
+        self._started = None
+        self._lock = threading.RLock()
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                self.tasks = json.load(file)['tasks']
+
+    def add(self, name, factory):
+        """Queues an export.
+
+        Arguments
+        ----------
+        name : str
+            Unique name of the export, such as its description.
+        factory : function
+            Returns an unstarted ee.batch.Task, such as lambda: ee.batch.Export.image.toDrive(...).
+
+        Returns
+        ----------
+        str
+            State of the export: QUEUED, or the persisted state of an earlier run.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            entry = self.tasks.get(name)
+            if entry is None or entry['state'] in ('FAILED', 'CANCELLED'):
+                self.tasks[name] = {'state': 'QUEUED', 'task_id': None, 'attempts': 0, 'queued': time.time(),
+                                    'submitted': None, 'started': None, 'finished': None, 'error': None,
+                                    'unknown': 0}
+                self._save()
+            return self.tasks[name]['state']
+
+    def _save(self):
+        """Writes the task state atomically to path."""
+        if self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'tasks': self.tasks}, file, indent=1)
+        os.replace(temporary, self.path)
+
+    def _names(self, *states):
+        return [name for name, entry in self.tasks.items() if entry['state'] in states]
+
+    def _start(self, name):
+        """Creates the task of an export and starts it; temporary errors are retried by the scheduler.
+
+        The task is created once and only its start is retried, as long as the task has no id.
+        So an error after the server created the task does not start a second one.
+        """
+        task = self._factories[name]()
+
+        def start():
+            if getattr(task, 'id', None) is None:
+                task.start()
+            return task
+
+        return scheduler.get_info(start, 'export start')
+
+    def _submit(self):
+        """Starts queued exports until max_running tasks are active.
+        An export whose task cannot be started is marked FAILED with the error.
+        """
+        active = len(self._names(*ACTIVE_STATES))
+        queued = [name for name in self._names('QUEUED') if name in self._factories]
+        for name in queued[:max(0, self.max_running - active)]:
+            entry = self.tasks[name]
+            entry['attempts'] += 1
+            try:
+                task = self._start(name)
+            except Exception as error:
+                now = time.time()
+                entry.update(state='FAILED', task_id=None, submitted=now, started=None, finished=now,
+                             error=str(error))
+                continue
+            entry.update(state='READY', task_id=task.id, submitted=time.time(), started=None, error=None, unknown=0)
+
+    def _poll(self):
+        """Updates the active tasks from one status request; returns True if a state changed.
+
+        A task that the server reports as UNKNOWN or leaves out, such as a task id of an
+        earlier run that expired, fails after more than max_retries such polls in a row.
+        """
+        active = {self.tasks[name]['task_id']: name for name in self._names(*ACTIVE_STATES)}
+        if not active:
+            return False
+        with instrumentation.span('export_status', tasks=len(active)) as span:
+            statuses = self._status(list(active))
+            span.set(finished=sum(status.get('state') in FINAL_STATES for status in statuses))
+        changed = False
+        now = time.time()
+        states = {status.get('id'): status for status in statuses}
+        for task_id, name in active.items():
+            status = states.get(task_id, {'id': task_id, 'state': 'UNKNOWN'})
+            entry = self.tasks[name]
+            state = status.get('state', entry['state'])
+            if state == 'UNKNOWN':
+                entry['unknown'] = entry.get('unknown', 0) + 1
+                if entry['unknown'] <= self.max_retries:
+                    continue
+                state = 'FAILED'
+                status = {'error_message': f'Task {task_id} is unknown to the server.'}
+            else:
+                entry['unknown'] = 0
+            if state == entry['state'] or state not in ACTIVE_STATES + FINAL_STATES:
+                continue
+            changed = True
+            if state == 'RUNNING':
+                entry['started'] = entry['started'] or now
+            if state in FINAL_STATES:
+                entry['started'] = entry['started'] or now
+                entry['finished'] = now
+                entry['error'] = status.get('error_message')
+            if state == 'FAILED' and entry['attempts'] <= self.max_retries and \
+                    name in self._factories and self.retryable(entry['error'] or ''):
+                self.resubmissions += 1
+                entry.update(state='QUEUED', task_id=None, finished=None)
+            else:
+                entry['state'] = state
+        return changed
+
+    def step(self):
+        """Submits queued exports within the budget and polls the active ones once.
+
+        Returns
+        ----------
+        bool
+            True if a task changed state.
+        """
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+            self._submit()
+            changed = self._poll()
+            if changed:
+                self._submit()
+            self._save()
+            return changed
+
+    def pending(self):
+        """Returns the number of exports that are queued or not finished."""
+        with self._lock:
+            return len(self._names('QUEUED', *ACTIVE_STATES))
+
+    def run(self, timeout=None):
+        """Processes the queue until every export is finished.
+
+        Arguments
+        ----------
+        timeout : float, optional
+            Seconds after which to return even if exports are still pending.
+
+        Returns
+        ----------
+        dict
+            The statistics of stats().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = self.poll_interval
+        while True:
+            changed = self.step()
+            if not self.pending() or (deadline is not None and time.monotonic() >= deadline):
+                return self.stats()
+            interval = self.poll_interval if changed else min(self.max_poll_interval, interval * self.backoff)
+            if deadline is not None:
+                interval = min(interval, max(0.0, deadline - time.monotonic()))
+            self._sleep(interval)
+
+    def cancel(self):
+        """Removes the queued exports that were not submitted yet."""
+        with self._lock:
+            for name in self._names('QUEUED'):
+                self.tasks[name].update(state='CANCELLED', finished=time.time())
+            self._save()
+
+    def stats(self):
+        """Summarizes the exports.
+
+        Returns
+        ----------
+        dict
+            Number of exports by state and of resubmissions, completed tasks per hour since the
+            first step(), and mean and maximum seconds spent in the server queue (submitted
+            to running) and running (running to finished).
+        """
+        with self._lock:
+            entries = list(self.tasks.values())
+        summary = {state: sum(entry['state'] == state for entry in entries)
+                   for state in ('QUEUED',) + ACTIVE_STATES + FINAL_STATES}
+        summary['resubmissions'] = self.resubmissions
+        if self._started is not None:
+            elapsed = max(time.time() - self._started, 1e-9)
+            summary['tasks_per_hour'] = summary['COMPLETED'] * 3600 / elapsed
+        waits = [entry['started'] - entry['submitted'] for entry in entries
+                 if entry['started'] is not None and entry['submitted'] is not None]
+        runs = [entry['finished'] - entry['started'] for entry in entries
+                if entry['finished'] is not None and entry['started'] is not None]
+        if waits:
+            summary.update(queue_seconds_mean=statistics.fmean(waits), queue_seconds_max=max(waits))
+        if runs:
+            summary.update(run_seconds_mean=statistics.fmean(runs), run_seconds_max=max(runs))
+        return summary
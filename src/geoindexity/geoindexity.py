@@ -5,14 +5,374 @@ GeoIndexity classes and functions are based on the Earth Engine API
 for Google Earth Engine (GEE). A valid GEE account is therefore
 necessary to use GeoIndexity. For more information on setting up your
 GEE account and using GeoIndexity, please see https://github.com/ro-hit81/GeoIndexity/blob/main/README.md
+
+Importing this module does not contact GEE. The Earth Engine session is
+initialized on the first server call (see geoindexity.session), and pandas,
+matplotlib and NumPy are only imported by the functions that use them.
+Collection building, result parsing, plotting and exports run in spans of
+geoindexity.instrumentation.
 """
 
+import collections
+import datetime
+import hashlib
+import json
+import math
+import re
+
 import ee
-ee.Initialize()
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+from . import columnar, download, graph, instrumentation, local, registry, render, scheduler, session
+from .cache import fingerprint, open_cache
+from .columnar import compact, epoch_millis
+
+# Statistics accepted by Geoindexity.reduce(), besides percentiles given as 'p<N>'
+STATISTICS = ('mean', 'median', 'std', 'min', 'max', 'count')
+
+# Earth Engine limits: elements returned by one collection query and size of one request
+MAX_ELEMENTS = 5000
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+
+# Version of the index formulas; part of the cache keys of reductions
+INDEX_VERSION = 1
+
+# Images per time window in chunked reductions, and the smallest window
+WINDOW_IMAGES = 500
+# Images per page of iter_reductions()
+PAGE_SIZE = 250
+DAY_MILLIS = 24 * 60 * 60 * 1000
+
+# Composite periods as (step, unit of ee.Date.advance) and per-pixel composite methods
+COMPOSITE_PERIODS = {'daily': (1, 'day'), 'weekly': (7, 'day'), '16day': (16, 'day'), 'monthly': (1, 'month')}
+COMPOSITE_METHODS = ('mosaic', 'max', 'median', 'mean')
+
+# Native scale in meters of each collection. Composites have no native projection, so
+# they are reduced at this scale unless another one is given.
+NATIVE_SCALES = {'Sentinel': 10, 'Landsat': 30, 'Merged': 30}
+
+# Scene cloud cover property of each collection, part of Geoindexity.metadata()
+CLOUD_PROPERTIES = {'Sentinel': 'CLOUDY_PIXEL_PERCENTAGE', 'Landsat': 'CLOUD_COVER'}
+
+def statistic_reducer(stat):
+    """Translates a statistic name into an Earth Engine reducer.
+
+    Arguments
+    ----------
+    stat : str
+        One of STATISTICS or a percentile such as 'p10' or 'p90'.
+
+    Returns
+    ----------
+    tuple
+        The ee.Reducer, the name of its output and the column prefix used in Geoindexity.df.
+
+    Raises
+    ----------
+    ValueError: If the statistic is not supported.
+    """
+    percentile = re.fullmatch(r'p(\d{1,2}|100)', stat.lower())
+    if percentile:
+        value = int(percentile.group(1))
+        return ee.Reducer.percentile([value]), f'p{value}', f'P{value}'
+    if stat.lower() in ('std', 'stddev'):
+        return ee.Reducer.stdDev(), 'stdDev', 'Std'
+    if stat.lower() in STATISTICS:
+        return getattr(ee.Reducer, stat.lower())(), stat.lower(), stat.capitalize()
+    raise ValueError(f"Invalid statistic: {stat}. Supported statistics: {', '.join(STATISTICS)} and percentiles like 'p90'.")
+
+def _rectangle(roi):
+    """Returns the ROI as ee.Geometry.Rectangle, one shared object per ROI (see geoindexity.graph)."""
+    session.ensure_initialized()
+    return graph.intern(('Rectangle', tuple(roi)), lambda: ee.Geometry.Rectangle(list(roi)))
+
+def _filtered(collection_ids, start_date, end_date, roi, properties):
+    """Returns the merged collections filtered by date, ROI and maximum property values.
+    Shared by all products with the same filters (see geoindexity.graph).
+    """
+    def build():
+        image_collection = None
+        for collection_id in collection_ids:
+            collection = ee.ImageCollection(collection_id)
+            image_collection = collection if image_collection is None else image_collection.merge(collection)
+        image_collection = image_collection.filterDate(start_date, end_date)
+        image_collection = image_collection.filterBounds(_rectangle(roi))
+        for property_name, value in properties:
+            image_collection = image_collection.filter(ee.Filter.lte(property_name, value))
+        return image_collection
+
+    session.ensure_initialized()
+    return graph.intern(('filtered', tuple(collection_ids), start_date, end_date, tuple(roi), tuple(properties)),
+                        build)
+
+def _millis(date):
+    """Converts a 'YYYY-MM-DD' date into milliseconds since epoch (UTC)."""
+    date = datetime.datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    return int(date.timestamp() * 1000)
+
+def _date_string(millis):
+    """Converts milliseconds since epoch into a 'YYYY-MM-DD' date (UTC)."""
+    return datetime.datetime.fromtimestamp(millis / 1000, datetime.timezone.utc).strftime('%Y-%m-%d')
+
+def _period_count(start_date, end_date, period):
+    """Returns the number of composite periods needed to cover a date range.
+
+    Arguments
+    ----------
+    start_date : str
+        Start date (format: 'YYYY-MM-DD'), the start of the first period.
+    end_date : str
+        End date (format: 'YYYY-MM-DD', exclusive).
+    period : str
+        One of COMPOSITE_PERIODS.
+
+    Returns
+    ----------
+    int
+    """
+    step, unit = COMPOSITE_PERIODS[period]
+    if unit == 'day':
+        return max(0, math.ceil((_millis(end_date) - _millis(start_date)) / (step * DAY_MILLIS)))
+    start = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    months = (end.year - start.year) * 12 + end.month - start.month
+    return max(0, months + (end.day > start.day))
+
+def _period_offsets(times, start_date, end_date, period):
+    """Returns the composite periods that hold at least one of the given image times.
+
+    Arguments
+    ----------
+    times : list
+        system:time_start of the images in milliseconds.
+    start_date : str
+        Start date (format: 'YYYY-MM-DD'), the start of the first period.
+    end_date : str
+        End date (format: 'YYYY-MM-DD', exclusive).
+    period : str
+        One of COMPOSITE_PERIODS.
+
+    Returns
+    ----------
+    list
+        Sorted period numbers, or None if they cannot be told for the start date
+        (monthly periods starting after the 28th).
+    """
+    step, unit = COMPOSITE_PERIODS[period]
+    count = _period_count(start_date, end_date, period)
+    start = datetime.date.fromisoformat(start_date)
+    if unit != 'day' and start.day > 28:
+        return None
+    offsets = set()
+    for millis in times:
+        if unit == 'day':
+            offset = (millis - _millis(start_date)) // (step * DAY_MILLIS)
+        else:
+            date = datetime.datetime.fromtimestamp(millis / 1000, datetime.timezone.utc).date()
+            offset = (date.year - start.year) * 12 + date.month - start.month - (date.day < start.day)
+        if 0 <= offset < count:
+            offsets.add(offset)
+    return sorted(offsets)
+
+def _iter_pages(features, page_size, prefetch=1):
+    """Yields the properties of an ee.FeatureCollection, fetched in pages of page_size features.
+
+    The following prefetch pages are requested while a page is consumed. Fetching stops
+    at the first page that is not full.
+
+    Arguments
+    ----------
+    features : ee.FeatureCollection
+        Collection to fetch.
+    page_size : int
+        Features per request.
+    prefetch : int
+        Pages requested ahead (default: 1).
+
+    Returns
+    ----------
+    generator
+        Feature properties (dict).
+    """
+    executor = scheduler.get_executor()
+    fetch = lambda page: executor.submit(features.toList(page_size, page * page_size), 'reduce_page')
+    pending = collections.deque(fetch(page) for page in range(prefetch + 1))
+    next_page = prefetch + 1
+    try:
+        while pending:
+            page = pending.popleft().result()
+            for feature in page:
+                yield feature['properties']
+            if len(page) < page_size:
+                return
+            pending.append(fetch(next_page))
+            next_page += 1
+    finally:
+        for future in pending:
+            future.cancel()
+
+def _query_from_columns(columns):
+    """Recovers the indices and statistics of a reduction from its DataFrame columns.
+
+    Arguments
+    ----------
+    columns : list
+        Column names such as 'Date', 'Mean_NDVI' or 'P90_EVI'.
+
+    Returns
+    ----------
+    dict
+        Indices, stats and scale (None) of the reduction.
+    """
+    indices, stats = [], []
+    for column in columns:
+        if column in ('Date', 'Sensor'):
+            continue
+        prefix, _, index = column.partition('_')
+        if index not in indices:
+            indices.append(index)
+        if prefix.lower() not in stats:
+            stats.append(prefix.lower())
+    return {'indices': indices, 'stats': stats, 'scale': None}
+
+def _export_name(description, image_id, length=100):
+    """Returns the task and file name of the export of one image, at most length characters.
+
+    Names that are too long are cut and end with a hash of the image id, so that the
+    exports of different images keep different names.
+    """
+    name = re.sub(r'[^A-Za-z0-9.,:;_-]', '_', f'{description}_{image_id}')
+    if len(name) <= length:
+        return name
+    suffix = hashlib.sha1(str(image_id).encode('utf-8')).hexdigest()[:8]
+    return f'{name[:length - len(suffix) - 1]}_{suffix}'
+
+def _regions_df(result, id_property):
+    """Builds the long-format DataFrame of reduce_regions() from its columns and rows."""
+    import pandas as pd
+
+    df = compact(pd.DataFrame(result['rows'], columns=result['columns']), categorical=(id_property,))
+    return df.sort_values(by=[id_property, 'Date']).reset_index(drop=True)
+
+def _split_requests(build, parts, split, describe, name):
+    """Evaluates requests in parallel and splits the ones that are too large.
+
+    A part whose request fails because it is too large or times out is replaced by the
+    parts returned by split(), which are requested again. Every split is recorded as a
+    'split' instrumentation span.
+
+    Arguments
+    ----------
+    build : function
+        Takes a part and returns the Earth Engine object to evaluate.
+    parts : list
+        Parts of the whole request, such as time windows or chunks of polygons.
+    split : function
+        Takes a part and returns the smaller parts that replace it, or an empty list if
+        the part cannot be split any further.
+    describe : function
+        Takes a part and returns the attributes of its 'split' span.
+    name : str
+        Name of the requests in the scheduler records.
+
+    Returns
+    ----------
+    list
+        (part, result) tuples of all evaluated parts, in the order they finished.
+
+    Raises
+    ----------
+    Exception: The error of a part that fails for another reason or cannot be split.
+    """
+    executor = scheduler.get_executor()
+    submit = lambda part: executor.submit(build(part), name, scheduler.is_retryable_as_is)
+    pending = [(part, submit(part)) for part in parts]
+    results = []
+    while pending:
+        part, future = pending.pop(0)
+        try:
+            results.append((part, future.result()))
+        except Exception as error:
+            smaller = split(part) if scheduler.is_too_large(error) else []
+            if not smaller:
+                raise
+            with instrumentation.span('split', request=name, reason=str(error), **describe(part)):
+                pass
+            pending.extend((other, submit(other)) for other in smaller)
+    return results
+
+def _split_window(window):
+    """Halves a (start, end) window in milliseconds; windows of one day are not split."""
+    start, end = window
+    if end - start <= DAY_MILLIS:
+        return []
+    middle = start + (end - start) // 2
+    return [(start, middle), (middle, end)]
+
+def region_features(regions, id_property='parcel_id'):
+    """Converts client-side polygons into a list of GeoJSON features.
+
+    Arguments
+    ----------
+    regions
+        GeoJSON FeatureCollection or Feature (dict), list of GeoJSON features or geometries,
+        or any object with __geo_interface__ such as a geopandas GeoDataFrame.
+    id_property : str
+        Property that identifies a polygon. Features without it get their GeoJSON id, or
+        their position if they have no id.
+
+    Returns
+    ----------
+    list
+        GeoJSON features in EPSG:4326 that all carry id_property.
+    """
+    if hasattr(regions, 'to_crs') and getattr(regions, 'crs', None) is not None:
+        regions = regions.to_crs(epsg=4326)
+    if hasattr(regions, '__geo_interface__'):
+        regions = regions.__geo_interface__
+    if isinstance(regions, dict):
+        if regions.get('type') == 'FeatureCollection':
+            regions = regions['features']
+        else:
+            regions = [regions]
+
+    features = []
+    for position, feature in enumerate(regions):
+        if feature.get('type') != 'Feature':
+            feature = {'type': 'Feature', 'geometry': feature, 'properties': {}}
+        properties = dict(feature.get('properties') or {})
+        if id_property not in properties:
+            properties[id_property] = feature.get('id', position)
+        features.append({'type': 'Feature', 'geometry': feature['geometry'], 'properties': properties})
+    return features
+
+def chunk_features(features, chunk_size, max_bytes=None):
+    """Splits GeoJSON features into chunks that fit into a single Earth Engine request.
+
+    Arguments
+    ----------
+    features : list
+        GeoJSON features.
+    chunk_size : int
+        Maximum number of features per chunk.
+    max_bytes : int, optional
+        Maximum size of the serialized geometries per chunk (default: MAX_REQUEST_BYTES).
+
+    Returns
+    ----------
+    generator
+        Lists of features.
+    """
+    max_bytes = max_bytes or MAX_REQUEST_BYTES
+    chunk, size = [], 0
+    for feature in features:
+        feature_size = len(json.dumps(feature['geometry']))
+        if chunk and (len(chunk) >= chunk_size or size + feature_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(feature)
+        size += feature_size
+    if chunk:
+        yield chunk
 
 class Landsat:
     """
@@ -27,11 +387,17 @@ class Landsat:
     end_date : str
         The end date for filtering the image collection (format: 'YYYY-MM-DD').
     collection_id : str
-        The ID of the Landsat image collection.
+        The ID of the Landsat image collection, or None for the Landsat 8 and 9 collections
+        of the missions operating in the date range (see select_mission()).
     properties
         Properties for additional filtering, such as CLOUD_COVER.
     """
-    def __init__(self, roi, start_date, end_date, collection_id, properties=None):
+    # Collection 2 Level-2 collections of the missions with the OLI band layout
+    MISSION_COLLECTIONS = {'LANDSAT_8': 'LANDSAT/LC08/C02/T1_L2', 'LANDSAT_9': 'LANDSAT/LC09/C02/T1_L2'}
+    # Properties accepted for filtering
+    PROPERTIES = ("CLOUD_COVER", "CLOUD_COVER_LAND")
+
+    def __init__(self, roi, start_date, end_date, collection_id=None, properties=None):
         """Initializes the Landsat class with region of interest, date range, collection ID, and optional properties.
 
         Arguments
@@ -42,8 +408,8 @@ class Landsat:
             The start date for filtering the image collection (format: 'YYYY-MM-DD').
         end_date : str
             The end date for filtering the image collection (format: 'YYYY-MM-DD').
-        collection_id : str
-            The ID of the Landsat image collection.
+        collection_id : str, optional
+            The ID of the Landsat image collection (default: Landsat 8 and 9 by mission dates).
         properties
             Properties for additional filtering, such as CLOUD_COVER.
         """
@@ -51,7 +417,7 @@ class Landsat:
         self.roi = roi
         self.start_date = start_date
         self.end_date = end_date
-        self.collection_id= 'LANDSAT/LC08/C02/T1_L2'
+        self.collection_id = collection_id
         self.properties = properties or {}
 
     def bound(self):
@@ -62,11 +428,41 @@ class Landsat:
         ee.Geometry.Rectangle
             The region of interest as a rectangle.
         """
-        return ee.Geometry.Rectangle(self.roi) 
+        return _rectangle(self.roi)
     
+    def collection_ids(self):
+        """Returns the IDs of the collections to query.
+
+        Without a collection ID these are the collections of the missions in MISSION_COLLECTIONS
+        whose operational date range (see select_mission()) overlaps the date range.
+
+        Returns
+        ----------
+        list
+            Collection IDs.
+
+        Raises
+        ----------
+        ValueError: If no supported mission operated in the date range.
+        """
+        if self.collection_id:
+            return [self.collection_id]
+        missions = self.select_mission()
+        ids = []
+        for mission, collection_id in self.MISSION_COLLECTIONS.items():
+            start, end = missions[mission]
+            if start < self.end_date and (end == 'present' or end >= self.start_date):
+                ids.append(collection_id)
+        if not ids:
+            raise ValueError(f"No Landsat mission of {', '.join(self.MISSION_COLLECTIONS)} operated between "
+                             f"{self.start_date} and {self.end_date}.")
+        return ids
+
     def select_product(self):
         """Filters the Landsat image collection based on the date range, region of interest, and optional properties.
 
+        The collections of several missions are merged into one.
+
         Returns
         ----------
         ee.ImageCollection
@@ -76,16 +472,10 @@ class Landsat:
         ----------
         KeyError: If an invalid property name is provided.
         """
-        image_collection = ee.ImageCollection(self.collection_id)
-        image_collection = image_collection.filterDate(self.start_date, self.end_date)
-        image_collection = image_collection.filterBounds(self.bound())
-        if self.properties:
-            valid_properties = {"CLOUD_COVER": int, "CLOUD_LAND_COVER": int}
-            for property_name, value in self.properties.items():
-                if property_name not in valid_properties:
-                    raise KeyError(f"Invalid property name: {property_name}. Supported properties: {', '.join(valid_properties.keys())}.")
-                image_collection = image_collection.filter(ee.Filter.lte(property_name, value))
-        return image_collection
+        for property_name in self.properties:
+            if property_name not in self.PROPERTIES:
+                raise KeyError(f"Invalid property name: {property_name}. Supported properties: {', '.join(self.PROPERTIES)}.")
+        return _filtered(self.collection_ids(), self.start_date, self.end_date, self.roi, sorted(self.properties.items()))
 
     def select_mission(self):
         """Provides a dictionary of Landsat missions with their operational date ranges.
@@ -101,14 +491,14 @@ class Landsat:
             'LANDSAT_3': ('1978-03-05', '1982-07-16'),
             'LANDSAT_4': ('1982-07-16', '1984-03-01'),
             'LANDSAT_5': ('1984-03-01', '2012-05-05'), 
-            'LANDSAT_8': ('2013-03-18', '2021-10-30'),
+            'LANDSAT_8': ('2013-03-18', 'present'),
             'LANDSAT_9': ('2021-10-31', 'present')
         }
         return missions
 
     def number_of_images(self):
         """Prints the total number of images in the filtered Landsat image collection."""
-        print(f'Total Landsat images collected: {self.select_product().size().getInfo()}')
+        print(f'Total Landsat images collected: {scheduler.get_info(self.select_product().size(), "size")}')
 
 class Sentinel:
     """
@@ -127,6 +517,9 @@ class Sentinel:
     properties : dict
         Properties for additional filtering, such as CLOUDY_PIXEL_PERCENTAGE.
     """
+    # Properties accepted for filtering
+    PROPERTIES = ("CLOUDY_PIXEL_PERCENTAGE", "CLOUDY_SHADOW_PERCENTAGE", "DARK_FEATURES_PERCENTAGE")
+
     def __init__(self, roi, start_date, end_date, collection_id, properties=None):
         """Initializes the Sentinel class with region of interest, date range, collection ID, and optional properties.
 
@@ -157,7 +550,7 @@ class Sentinel:
         ee.Geometry.Rectangle
             The region of interest as a rectangle.
         """
-        return ee.Geometry.Rectangle(self.roi) 
+        return _rectangle(self.roi)
     
     def select_product(self):
         """Filters the Sentinel image collection based on the date range, region of interest, and optional properties.
@@ -171,20 +564,14 @@ class Sentinel:
         ----------
         KeyError: If an invalid property name is provided.
         """
-        image_collection = ee.ImageCollection(self.collection_id)
-        image_collection = image_collection.filterDate(self.start_date, self.end_date)
-        image_collection = image_collection.filterBounds(self.bound())
-        if self.properties:
-            valid_properties = {"CLOUDY_PIXEL_PERCENTAGE": int, "CLOUDY_SHADOW_PERCENTAGE": int, "DARK_FEATURES_PERCENTAGE": int}
-            for property_name, value in self.properties.items():
-                if property_name not in valid_properties:
-                    raise KeyError(f"Invalid property name: {property_name}. Supported properties: {', '.join(valid_properties.keys())}.")
-                image_collection = image_collection.filter(ee.Filter.lte(property_name, value))
-        return image_collection
+        for property_name in self.properties:
+            if property_name not in self.PROPERTIES:
+                raise KeyError(f"Invalid property name: {property_name}. Supported properties: {', '.join(self.PROPERTIES)}.")
+        return _filtered([self.collection_id], self.start_date, self.end_date, self.roi, sorted(self.properties.items()))
 
     def number_of_images(self):
         """Prints the total number of images in the filtered Sentinel image collection."""
-        print(f'Total Sentinel images collected: {self.select_product().size().getInfo()}')
+        print(f'Total Sentinel images collected: {scheduler.get_info(self.select_product().size(), "size")}')
 
 class Geoindexity:
     """
@@ -202,13 +589,24 @@ class Geoindexity:
     end_date : str
         The end date for filtering the image collection (format: 'YYYY-MM-DD').
     collection_id: str
-         ID to choose a GEE collection. Default: 'Sentinel', 'Landsat'
+         ID to choose a GEE collection. Default: 'Sentinel', 'Landsat' (Landsat 8 and 9), or
+         'Merged' for harmonized Sentinel-2 and Landsat images in one collection.
     properties: dict
         Properties for additional filtering, such as CLOUDY_PIXEL_PERCENTAGE.
     reducer: str
         Tag indicating the latest used reducer.
     df: DataFrame
-        Pandas dataframe that stores information of the latest reduction.
+        Pandas dataframe that stores information of the latest reduction, with Date as
+        datetime64[ms] and float32 index values.
+    cloud_mask: str or bool
+        Per-pixel cloud mask applied to the index bands: a mask name of the collection
+        ('scl', 'qa' or 'probability' for Sentinel, 'qa' for Landsat), True for the
+        default mask of the collection, or None. For 'Merged', 'scl' and 'probability'
+        mask the Sentinel-2 images and Landsat images get their 'qa' mask.
+    cache: ResultCache
+        Persistent cache of reduction results, or None.
+    last_time: int
+        system:time_start (milliseconds) of the newest image in df, if known.
 
     Methods
     -------
@@ -222,48 +620,229 @@ class Geoindexity:
     add_evi(image):
         Calculates and adds EVI band to given image.
         Used inside evi_collection function.
+    add_ndwi(image), add_savi(image), add_nbr(image):
+        Calculate and add NDWI, SAVI and NBR bands to given image.
+    add_indices(image, indices):
+        Calculates and adds the bands of several registered indices to given image in one step.
     ndvi_collection():
         Maps add_ndvi() to the image collection.
     evi_collection():
         Maps add_evi() to the image collection.
+    reduce(indices, stats):
+        Reduces the time-series collection based on the ROI for several indices and statistics at once.
+    composite(period, method):
+        Builds daily, weekly, 16-day or monthly composites of the index bands on the server.
+    reduce_regions(regions, indices, stats):
+        Reduces the time-series collection for many polygons in batched requests.
+    update(end_date, df):
+        Extends the reduced time-series with newly acquired images only.
+    iter_reductions(indices, stats):
+        Yields the reduction image by image, fetched page by page.
+    compute_local(bands, indices):
+        Computes indices from local NumPy band arrays.
+    to_arrow(), to_parquet(path), to_feather(path):
+        Export df to Apache Arrow, Parquet or Feather.
     reduce_ndvi_mean():
         Reduces the time-series collection based on the ROI using NDVI band and mean.
     plot():
        Standard plotting function for the geoindexity time-series object.
     """
 
-    def __init__(self, roi, start_date, end_date, collection_id='Sentinel', properties=None): # collection argument as identifier between Sentinel and Landsat? 
+    def __init__(self, roi, start_date, end_date, collection_id='Sentinel', properties=None, cache=None,
+                 cloud_mask=None): # collection argument as identifier between Sentinel and Landsat? 
         self.roi = roi
         self.start_date = start_date
         self.end_date = end_date
-        self.collection_id = collection_id
+        self.collection_id = 'Landsat' if collection_id == 'Landsat8' else collection_id
         self.properties = properties
+        self.cloud_mask = cloud_mask
         self.reducer = None 
         self.df = None 
+        self.cache = open_cache(cache)
+        self.last_time = None
+        self._query = None
+        self._collection = None
+        self._indices = ()
+        self._metadata = None
+
+    def select_product(self, start_date=None, end_date=None):
+        """Returns the filtered image collection for a date range.
+
+        If the cloud mask needs a cloud probability image, it is joined to every image.
+        For 'Merged' the Sentinel-2 and Landsat collections are harmonized (see
+        registry.harmonize_function) and merged into one collection sorted by time.
+
+            Parameters:
+                start_date (str): Start date (default: start_date attribute).
+                end_date (str): End date (default: end_date attribute).
+            Returns:
+                collection (ee.ImageCollection): Filtered image collection.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+        with instrumentation.span('select_product', collection_id=self.collection_id):
+            if self.collection_id != 'Merged':
+                return self._sensor_product(self.collection_id, start_date, end_date, self.properties or {})
+            return self._merged_product(start_date, end_date)
+
+    def _merged_product(self, start_date, end_date):
+        """Returns the harmonized and merged Sentinel-2 and Landsat collection of select_product()."""
+        properties = self.properties or {}
+        supported = Sentinel.PROPERTIES + Landsat.PROPERTIES
+        for property_name in properties:
+            if property_name not in supported:
+                raise KeyError(f"Invalid property name: {property_name}. Supported properties: {', '.join(supported)}.")
+        merged = None
+        for collection_id, product in (('Sentinel', Sentinel), ('Landsat', Landsat)):
+            collection = self._sensor_product(collection_id, start_date, end_date,
+                                              {key: value for key, value in properties.items()
+                                               if key in product.PROPERTIES})
+            harmonize = registry.harmonize_function(collection_id,
+                                                    registry.mask_name(collection_id, self._sensor_mask(collection_id)))
+            collection = graph.call(collection, 'map', harmonize)
+            merged = collection if merged is None else graph.call(merged, 'merge', collection)
+        return graph.call(merged, 'sort', 'system:time_start')
+
+    def _sensor_product(self, collection_id, start_date, end_date, properties):
+        """Returns the filtered image collection of a single sensor, prepared for its cloud mask."""
+        if collection_id == 'Sentinel':
+            collection = Sentinel(roi=self.roi,
+                                  start_date=start_date,
+                                  end_date=end_date,
+                                  collection_id= 'COPERNICUS/S2_SR_HARMONIZED',
+                                  properties=properties
+                                  ).select_product()
+
+        elif collection_id == 'Landsat':
+            collection = Landsat(roi=self.roi,
+                                 start_date=start_date,
+                                 end_date=end_date,
+                                 properties=properties
+                                 ).select_product()
+        else:
+            raise ValueError(f"Invalid collection: {collection_id}. Supported collections: Sentinel, Landsat, Merged.")
+
+        name = self._sensor_mask(collection_id)
+        mask = registry.cloud_mask(collection_id, name)
+        return graph.intern(('prepared', id(collection), registry.mask_name(collection_id, name)),
+                            lambda: registry.prepare_collection(collection, mask, self.bound(), start_date, end_date))
+
+    def _sensor_mask(self, collection_id):
+        """Cloud mask argument for one sensor of the collection.
+        A merged collection applies a mask that only one sensor has, such as 'scl' or 'probability'
+        of Sentinel-2, to that sensor and the default mask of the other one, QA_PIXEL for Landsat.
+        """
+        mask = self.cloud_mask
+        if self.collection_id == 'Merged' and isinstance(mask, str) and \
+                mask not in registry.sensor(collection_id).masks and \
+                any(mask in registry.sensor(other).masks for other in ('Sentinel', 'Landsat')):
+            return True
+        return mask
+
+    def _mask_name(self):
+        """Name of the cloud mask applied with the index bands.
+        Merged collections are masked when they are harmonized instead.
+        """
+        if self.collection_id == 'Merged':
+            return None
+        return registry.mask_name(self.collection_id, self.cloud_mask)
+
+    def _product(self):
+        """The filtered ee.ImageCollection without index bands, built on first access."""
+        if self._collection is None:
+            self._collection = self.select_product()
+        return self._collection
 
-        if self.collection_id == 'Sentinel':
-            self.collection = Sentinel(roi=self.roi,
-                                       start_date=self.start_date,
-                                       end_date=self.end_date,
-                                       collection_id= 'COPERNICUS/S2_SR_HARMONIZED',
-                                       properties=self.properties
-                                       ).select_product()
-
-        if self.collection_id == 'Landsat8':
-            self.collection = Landsat8(roi=self.roi,
-                               start_date=self.start_date,
-                               end_date=self.end_date,
-                               collection_id= 'LANDSAT/LC08/C02/T1_L2',
-                               properties=self.properties
-                               ).select_product()
+    @property
+    def collection(self):
+        """The filtered ee.ImageCollection of the time-series, with the index bands added
+        by ndvi_collection() and evi_collection().
+
+        The collection is built on first access, which initializes the Earth Engine session.
+        """
+        collection = self._product()
+        if not self._indices:
+            return collection
+        return graph.call(collection, 'map',
+                          registry.image_function(self._indices, self.collection_id, self._mask_name()))
+
+    @collection.setter
+    def collection(self, value):
+        self._collection = value
+        self._indices = ()
+        self._metadata = None
+
+    def metadata(self, refresh=False):
+        """Returns the metadata of the filtered collection, fetched in one request and kept.
+
+        len(), band validation, chunk sizing and compositing read it instead of asking GEE again.
+
+            Parameters:
+                refresh (bool): Fetch the metadata again (default: False).
+            Returns:
+                metadata (dict): 'count' (number of images), 'bands' (band names of the first image),
+                    'ids' (system:index), 'times' (system:time_start in milliseconds), and
+                    'clouds' (scene cloud cover, see CLOUD_PROPERTIES) or, for merged collections,
+                    'sensors', in collection order.
+        """
+        if self._metadata is None or refresh:
+            collection = self._product()
+            size = collection.size()
+            parts = {
+                'count': size,
+                'bands': ee.Algorithms.If(size.gt(0), ee.Image(collection.first()).bandNames(), ee.List([])),
+                'ids': collection.aggregate_array('system:index'),
+                'times': collection.aggregate_array('system:time_start'),
+            }
+            if self.collection_id == 'Merged':
+                parts['sensors'] = collection.aggregate_array('Sensor')
+            elif self.collection_id in CLOUD_PROPERTIES:
+                parts['clouds'] = collection.aggregate_array(CLOUD_PROPERTIES[self.collection_id])
+            self._metadata = scheduler.get_info(ee.Dictionary(parts), 'metadata')
+        return self._metadata
+
+    def _check_bands(self, indices):
+        """Raises a ValueError if the fetched metadata lacks bands the indices need.
+        Does nothing before the metadata is fetched or for an empty collection.
+        """
+        if self._metadata is None or not self._metadata['count']:
+            return
+        missing = [band for band in registry.required_bands(indices, self.collection_id)
+                   if band not in self._metadata['bands']]
+        if missing:
+            raise ValueError(f"The images of the collection lack bands for {', '.join(indices)}: {', '.join(missing)}.")
 
     def __len__(self):
         """Returns the number if images in the time-series."""
-        return self.collection.size().getInfo()
+        return self.metadata()['count']
 
     def bound(self):
         """Returns the AOI as ee.Geometry.Rectanlge"""
-        return ee.Geometry.Rectangle(self.roi)
+        return _rectangle(self.roi)
+
+    def reflectance(self, image, band):
+        """Returns a band of the given image scaled to surface reflectance.
+
+            Parameters:
+                image (ee.Image): Single image.
+                band (str): Band name.
+            Returns:
+                band (ee.Image): Single band image with reflectance values.
+        """
+        return registry.reflectance(image.select(band), registry.sensor(self.collection_id))
+
+    def add_indices(self, image, indices):
+        """Calculates and adds the bands of several registered indices to given image in one step.
+        The cloud mask is applied to the index bands in the same step.
+
+            Parameters:
+                image (ee.Image): Single image.
+                indices (list): Index names, see registry.INDICES.
+            Returns:
+                image (ee.Image): Input image with added index bands.
+        """
+        return registry.image_function(tuple(index.upper() for index in indices), self.collection_id,
+                                       self._mask_name())(image)
 
     def add_ndvi(self, image):
         """Calculates and adds NDVI band to given image.
@@ -274,215 +853,816 @@ class Geoindexity:
             Returns:
                 image (ee.Image): Input image with added NDVI band.
         """
-        if self.collection_id == 'Sentinel':
-            ndvi = image.expression(
-                '((nir-red)/(nir+red))',
-                {'nir': image.select('B4'),
-                 'red': image.select('B8')}
-            ).rename('NDVI')
-        elif self.collection_id == 'Landsat8':
-            ndvi = image.expression(
-                '((nir - red)/(nir + red))',
-                {'nir': image.select('SR_B5'),
-                 'red': image.select('SR_B4')}
-            ).rename('NDVI')
-
-        return image.addBands(ndvi)
+        return self.add_indices(image, ['NDVI'])
 
     def add_evi(self, image):
         """Calculates and adds EVI band to given image.
-                Used inside evi_collection function.
-
-                    Parameters:
-                        image (ee.Image): Single image.
-                    Returns:
-                        image (ee.Image): Input image with added EVI band.
-                """
-        if self.collection_id == 'Sentinel':
-            evi = image.expression(
-                '2.4*((nir-red)/(nir+ 6*red - 7.5* blue +1))',
-                {'nir': image.select('SR_B8'),
-                 'red': image.select('SR_B4'),
-                 'blue': image.select('SR_B2')}
-            ).rename('EVI')
-
-
-        elif self.collection_id == 'Landsat8':
-            evi = image.expression(
-                '(2.5 * (nir–red) / (nir + 6 * red – 7.5 * blue + 1)',  # Change to Landsat8 here!
-                {'nir': image.select('SR_B5'),
-                 'red': image.select('SR_B4'),
-                 'blue': image.select('SR_B2')}
-            ).rename('EVI')
-
-        return image.addBands(evi)
+        Used inside evi_collection function.
+
+            Parameters:
+                image (ee.Image): Single image.
+            Returns:
+                image (ee.Image): Input image with added EVI band.
+        """
+        return self.add_indices(image, ['EVI'])
+
+    def add_ndwi(self, image):
+        """Calculates and adds NDWI (McFeeters) band to given image.
+
+            Parameters:
+                image (ee.Image): Single image.
+            Returns:
+                image (ee.Image): Input image with added NDWI band.
+        """
+        return self.add_indices(image, ['NDWI'])
+
+    def add_savi(self, image):
+        """Calculates and adds SAVI band (L = 0.5) to given image.
+
+            Parameters:
+                image (ee.Image): Single image.
+            Returns:
+                image (ee.Image): Input image with added SAVI band.
+        """
+        return self.add_indices(image, ['SAVI'])
+
+    def add_nbr(self, image):
+        """Calculates and adds NBR band to given image.
+
+            Parameters:
+                image (ee.Image): Single image.
+            Returns:
+                image (ee.Image): Input image with added NBR band.
+        """
+        return self.add_indices(image, ['NBR'])
 
     def ndvi_collection(self):
-        """Maps add_ndvi() to the image collection."""
-        self.collection = self.collection.map(self.add_ndvi)
+        """Adds the NDVI band to the images of the collection attribute.
+        Calling it again does not add the band twice.
+        """
+        self._add_collection_indices(['NDVI'])
 
     def evi_collection(self):
-        """Maps add_evi() to the image collection."""
-        self.collection = self.collection.map(self.add_evi)
+        """Adds the EVI band to the images of the collection attribute.
+        Calling it again does not add the band twice.
+        """
+        self._add_collection_indices(['EVI'])
 
-    def reduce_ndvi_mean(self):
-        """Reduces the time-series collection based on the ROI using NDVI band and mean.
+    def _add_collection_indices(self, indices):
+        """Records indices to add to the collection attribute; all of them are added in one map()."""
+        self._indices = tuple(dict.fromkeys(self._indices + tuple(registry.get(index).name for index in indices)))
+
+    def fingerprint(self, **query):
+        """Returns the cache key of a query on this time-series.
+
+        The key covers the collection, ROI, date range, property filters, cloud mask and
+        index formulas, plus the given query arguments. It is computed without contacting GEE.
+
+            Parameters:
+                **query: JSON-serializable arguments of the query, such as indices and stats.
+            Returns:
+                key (str): Hexadecimal SHA-256 digest.
+        """
+        formulas = {index.upper(): registry.get(index).expression for index in query.get('indices', ())}
+        return fingerprint(collection_id=self.collection_id, roi=list(self.roi), start_date=self.start_date,
+                           end_date=self.end_date, properties=self.properties or {},
+                           index_version=INDEX_VERSION, formulas=formulas,
+                           cloud_mask=self.cloud_mask, **query)
 
-        Attributes reducer and df get assigned.
+    def _reduction_plan(self, indices, stats):
+        """Validates indices and statistics and prepares everything a reduction needs.
+
+            Parameters:
+                indices (list): Index names.
+                stats (list): Statistic names.
+            Returns:
+                indices (list): Upper-case index names.
+                add_indices (function): Adds all index bands to an image in a single function (see registry.image_function).
+                reducer (ee.Reducer): All statistics combined with shared inputs.
+                columns (dict): Maps reducer output names to DataFrame column names.
+                tag (str): Value for the reducer attribute.
         """
-        # Check if NDVI in collection 
-        if not 'NDVI' in self.collection.first().bandNames().getInfo():
-            raise ValueError(f"No NDVI band found. Use ndvi_collection method first to calculate NDVI")
-            
+        indices = [registry.get(index).name for index in indices]
+        if not indices or not stats:
+            raise ValueError("At least one index and one statistic are required.")
+        add_indices = registry.image_function(tuple(indices), self.collection_id, self._mask_name())
+
+        statistics = [statistic_reducer(stat) for stat in stats]
+        reducer = statistics[0][0]
+        for other, _, _ in statistics[1:]:
+            reducer = reducer.combine(other, sharedInputs=True)
+
+        # A reducer with a single output names its results after the bands only
+        columns = {}
+        for index in indices:
+            for _, output, prefix in statistics:
+                key = index if len(statistics) == 1 else f'{index}_{output}'
+                columns[key] = f'{prefix}_{index}'
+
+        tag = ','.join(f'{index}_{output.upper()}' for index in indices for _, output, _ in statistics)
+        return indices, add_indices, reducer, columns, tag
+
+    def composite(self, period='monthly', method=None, indices=('NDVI',), start_date=None, end_date=None,
+                  collection=None):
+        """Builds a regular series of composites of the index bands on the server.
+
+        The date range is split into periods with ee.List.sequence, the images of every
+        period are selected with filterDate and reduced to one composite, and periods
+        without images are dropped. If metadata() was fetched, only the periods that hold
+        images of the collection are composited. Daily mosaics merge overlapping tiles of the same day;
+        weekly, 16-day or monthly composites smooth bursts of near-identical acquisitions.
+        Every composite holds the index bands only and gets the start of its period as
+        system:time_start and the number of merged images as 'images'. Composites have no
+        native projection, so reduce them at an explicit scale (see NATIVE_SCALES).
+
+            Parameters:
+                period (str): One of COMPOSITE_PERIODS: 'daily', 'weekly', '16day' or 'monthly' (default: 'monthly').
+                method (str): One of COMPOSITE_METHODS: 'mosaic' (latest valid pixel), 'max' (pixel of the
+                    highest value of the first index, e.g. max-NDVI), 'median' or 'mean'
+                    (default: 'mosaic' for daily, 'max' otherwise).
+                indices (list): Index names (default: ['NDVI']).
+                start_date (str): Start of the first period (default: start_date attribute).
+                end_date (str): End date (default: end_date attribute).
+                collection (ee.ImageCollection): Images to composite (default: collection attribute).
+            Returns:
+                composites (ee.ImageCollection): One image per period with images.
+        """
+        if period is None:
+            raise ValueError(f"Invalid composite period: {period}. Supported periods: {', '.join(COMPOSITE_PERIODS)}.")
+        method = self._composite_query(period, method)['composite_method']
+        indices = [registry.get(index).name for index in indices]
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+        collection = self._product() if collection is None else collection
+        offsets = None
+        if self._metadata is not None and collection is self._collection and \
+                (start_date, end_date) == (self.start_date, self.end_date):
+            offsets = _period_offsets(self._metadata['times'], start_date, end_date, period)
+        key = ('composite', id(collection), self.collection_id, self._mask_name(), period, method, tuple(indices),
+               start_date, end_date, None if offsets is None else tuple(offsets))
+        return graph.intern(key, lambda: self._build_composite(collection, period, method, indices, start_date,
+                                                               end_date, offsets))
+
+    def _build_composite(self, collection, period, method, indices, start_date, end_date, offsets=None):
+        """Builds the composites of composite(), for the given period numbers or all periods."""
+        step, unit = COMPOSITE_PERIODS[period]
+        images = collection.map(lambda image: self.add_indices(image, indices).select(indices))
+        start = ee.Date(start_date)
+
+        def period_composite(offset):
+            """Composites the images of one period. Inner function of composite()."""
+            begin = start.advance(ee.Number(offset).multiply(step), unit)
+            selected = images.filterDate(begin, begin.advance(step, unit))
+            if method == 'mosaic':
+                image = selected.sort('system:time_start').mosaic()
+            elif method == 'max':
+                image = selected.qualityMosaic(indices[0])
+            else:
+                image = getattr(selected, method)()
+            return image.set('system:time_start', begin.millis(), 'images', selected.size())
+
+        count = _period_count(start_date, end_date, period) if offsets is None else len(offsets)
+        if not count:
+            composites = ee.List([])
+        elif offsets is None:
+            composites = ee.List.sequence(0, count - 1).map(period_composite)
+        else:
+            composites = ee.List(offsets).map(period_composite)
+        return ee.ImageCollection.fromImages(composites).filter(ee.Filter.gt('images', 0))
+
+    def date_windows(self, window_images=WINDOW_IMAGES):
+        """Splits the date range into windows of window_images images each.
+
+        The window bounds are taken from the image times of metadata(), so only images
+        acquired at the same time can make a window larger.
+
+            Parameters:
+                window_images (int): Target number of images per window (default: WINDOW_IMAGES).
+            Returns:
+                windows (list): (start, end) tuples in milliseconds since epoch, in order.
+        """
+        times = sorted(self.metadata()['times'])
+        bounds = [_millis(self.start_date), *times[window_images::window_images], _millis(self.end_date)]
+        return [(bounds[step], bounds[step + 1]) for step in range(len(bounds) - 1) if bounds[step] < bounds[step + 1]]
+
+    def _reduce_windows(self, reduction, windows, name='reduce'):
+        """Evaluates a reduction for several time windows in parallel.
+
+        A window that fails because the request is too large or times out is split in half
+        and both halves are requested again, down to windows of one day. Every split is
+        recorded as a 'split' instrumentation span.
+
+            Parameters:
+                reduction (function): Takes start and end in milliseconds and returns the
+                    ee.FeatureCollection to evaluate.
+                windows (list): (start, end) tuples in milliseconds.
+                name (str): Name of the requests in the scheduler records.
+            Returns:
+                results (list): Evaluated feature collections in the order of the windows.
+        """
+        describe = lambda window: {'start': _date_string(window[0]), 'end': _date_string(window[1])}
+        results = _split_requests(lambda window: reduction(*window), windows, _split_window, describe, name)
+        return [result for _, result in sorted(results, key=lambda item: item[0])]
+
+    def reduce(self, indices=('NDVI',), stats=('mean',), scale=None, chunked=False, window_images=WINDOW_IMAGES,
+               page_size=None, composite=None, composite_method=None):
+        """Reduces the time-series collection based on the ROI for several indices and statistics at once.
+
+        All index bands are added in a single map over the collection and every image is
+        reduced with one combined reducer, so the whole table is fetched in one request.
+        In chunked mode the date range is split into windows that are reduced in parallel,
+        which keeps long time-series below the element, payload and time limits of the server.
+        With a composite period the images are first merged into regular composites on the
+        server (see composite()), so one row per period instead of one per scene is returned.
+        If the object has a cache, a repeated query is answered from it without contacting GEE.
+        Attributes reducer and df get assigned; df holds a Date column and one column per
+        index and statistic, named like 'Mean_NDVI' or 'P90_EVI'.
+
+            Parameters:
+                indices (list): Index names, any of 'NDVI', 'EVI', 'NDWI', 'SAVI' and 'NBR'.
+                stats (list): Statistics, any of STATISTICS or percentiles such as 'p10'.
+                scale (float): Nominal scale in meters for the reduction (default: native resolution,
+                    NATIVE_SCALES for composites).
+                chunked (bool): Reduce the date range in windows (default: False).
+                window_images (int): Target number of images per window in chunked mode (default: WINDOW_IMAGES).
+                page_size (int): Collect the results page by page through iter_reductions() (default: one request).
+                composite (str): Composite period, one of COMPOSITE_PERIODS (default: no compositing).
+                composite_method (str): Composite method, one of COMPOSITE_METHODS (default: see composite()).
+        """
+        composite = self._composite_query(composite, composite_method)
+        scale = self._reduction_scale(scale, composite)
+        key = self.fingerprint(method='reduce', indices=[index.upper() for index in indices],
+                               stats=[stat.lower() for stat in stats], scale=scale, **composite)
+        with instrumentation.span('reduce', indices=','.join(indices), stats=','.join(stats), chunked=chunked,
+                                  **composite) as span:
+            result = self.cache.get(key) if self.cache is not None else None
+            span.set(cached=result is not None)
+            if result is None:
+                result = self._reduce(indices, stats, scale, chunked, window_images, page_size=page_size,
+                                      composite=composite)
+                if self.cache is not None:
+                    self.cache.set(key, result)
+            span.set(images=len(result['rows']))
+
+        import pandas as pd
+
+        with instrumentation.span('dataframe', rows=len(result['rows'])):
+            df = compact(pd.DataFrame(result['rows'], columns=result['columns']))
+            self.df = df.sort_values(by='Date')
+        self.reducer = result['tag']
+        self.last_time = result.get('last_time')
+        self._query = {'indices': list(indices), 'stats': list(stats), 'scale': scale, **composite}
+
+    def _composite_query(self, composite, composite_method):
+        """Validates composite arguments; returns {} or the composite part of a query."""
+        if composite is None:
+            return {}
+        if composite not in COMPOSITE_PERIODS:
+            raise ValueError(f"Invalid composite period: {composite}. Supported periods: {', '.join(COMPOSITE_PERIODS)}.")
+        method = composite_method or ('mosaic' if composite == 'daily' else 'max')
+        if method not in COMPOSITE_METHODS:
+            raise ValueError(f"Invalid composite method: {method}. Supported methods: {', '.join(COMPOSITE_METHODS)}.")
+        return {'composite': composite, 'composite_method': method}
+
+    def _reduction_scale(self, scale, composite):
+        """Returns the scale of a reduction: the given one, or NATIVE_SCALES for composites.
+        Without a scale, composites would be reduced in the default projection of 1 degree.
+        """
+        if scale is None and composite:
+            return NATIVE_SCALES[self.collection_id]
+        return scale
+
+    def _aoi_reduction(self, indices, stats, scale, composited=False):
+        """Builds the per-image function of a reduction over the ROI.
+
+            Parameters:
+                indices (list): Index names.
+                stats (list): Statistic names.
+                scale (float): Nominal scale in meters, or None.
+                composited (bool): The images are composites that already hold the index bands.
+            Returns:
+                aoi_reduce (function): Maps an image to a feature with date, time and statistics.
+                columns (dict): Maps feature properties to DataFrame column names, including
+                    'Sensor' for merged collections.
+                tag (str): Value for the reducer attribute.
+
+        The function is shared by all reductions with the same arguments, so mapping it over
+        the same collection again returns the same expression (see geoindexity.graph).
+        """
+        key = ('aoi_reduction', self.collection_id, self._mask_name(), tuple(self.roi),
+               tuple(index.upper() for index in indices), tuple(stat.lower() for stat in stats), scale, composited)
+        return graph.intern(key, lambda: self._build_aoi_reduction(indices, stats, scale, composited))
+
+    def _build_aoi_reduction(self, indices, stats, scale, composited):
+        """Builds the per-image function of _aoi_reduction()."""
+        indices, add_indices, reducer, columns, tag = self._reduction_plan(indices, stats)
         aoi = self.bound()
 
-        def aoi_ndvi_mean(image, aoi=aoi):
-            """Calculates NDVI mean for a given image based on AOI.
-            Inner function of reduce_ndvi_mean().
+        def aoi_reduce(image, aoi=aoi):
+            """Adds the index bands to an image and reduces them over the AOI.
+            Inner function of reduce().
 
                 Parameters:
                     image (ee.Image): Input image.
                     aoi (ee.Geometry): AOI geometry.
                 Returns:
-                    feature (ee.Feature): Feature that stores the time-stamp and mean NDVI.
+                    feature (ee.Feature): Feature that stores the time-stamp and all statistics.
+            """
+            values = (image if composited else add_indices(image)).select(indices).reduceRegion(
+                reducer=reducer,
+                geometry=aoi,
+                scale=scale
+            )
+            feature = ee.Feature(None, values).set('time', image.get('system:time_start'))
+            return feature.set('Sensor', image.get('Sensor')) if sensor else feature
+
+        # Merged collections report the sensor of every image; composites mix sensors
+        sensor = self.collection_id == 'Merged' and not composited
+        if sensor:
+            columns = {'Sensor': 'Sensor', **columns}
+        return aoi_reduce, columns, tag
+
+    def _reduce(self, indices, stats, scale, chunked, window_images, collection=None, page_size=None,
+                composite=None, start_date=None, end_date=None):
+        """Evaluates a reduction on the server. Inner part of reduce() and update().
+
+            Parameters:
+                collection (ee.ImageCollection): Collection to reduce (default: collection attribute).
+                page_size (int): Fetch the results in pages of this many images (default: all at once).
+                composite (dict): Composite period and method from _composite_query(), or None.
+                start_date, end_date (str): Date range of the composites (default: attributes).
+            Returns:
+                result (dict): Column names, rows, reducer tag and the newest system:time_start.
+        """
+        collection = self._product() if collection is None else collection
+        scale = self._reduction_scale(scale, composite)
+        windows = self.date_windows(window_images) if chunked and not page_size else None
+        self._check_bands(indices)
+        aoi_reduce, columns, tag = self._aoi_reduction(indices, stats, scale, composited=bool(composite))
+        if composite:
+            collection = self.composite(composite['composite'], composite['composite_method'], indices,
+                                        start_date, end_date, collection)
+
+        if page_size:
+            features = _iter_pages(graph.call(collection, 'map', aoi_reduce), page_size)
+        elif chunked:
+            results = self._reduce_windows(
+                lambda start, end: collection.filterDate(start, end).map(aoi_reduce),
+                windows)
+            features = (feature['properties'] for result in results for feature in result['features'])
+        else:
+            result = scheduler.get_info(graph.call(collection, 'map', aoi_reduce), 'reduce')
+            features = (feature['properties'] for feature in result['features'])
+
+        # One row per image, missing statistics (fully masked AOI) become None
+        rows, last_time = [], None
+        with instrumentation.span('parse') as span:
+            for properties in features:
+                rows.append([properties['time'], *(properties.get(key) for key in columns)])
+                last_time = max(last_time or 0, properties['time'])
+            span.set(images=len(rows))
+        return {'columns': ['Date', *columns.values()], 'rows': rows, 'tag': tag, 'last_time': last_time}
+
+    def iter_reductions(self, indices=('NDVI',), stats=('mean',), scale=None, page_size=PAGE_SIZE, prefetch=1,
+                        composite=None, composite_method=None):
+        """Yields the reduction of the time-series image by image, in date order.
+
+        The results are fetched in pages of page_size images (toList slices), and the
+        next pages are requested while the current one is consumed, so records arrive
+        as soon as the first page is computed and memory stays bounded by the page size.
+        Attributes reducer and df are not changed; use reduce(page_size=...) to collect
+        the pages into df.
+
+            Parameters:
+                indices (list): Index names, as in reduce().
+                stats (list): Statistics, as in reduce().
+                scale (float): Nominal scale in meters for the reduction (default: native resolution,
+                    NATIVE_SCALES for composites).
+                page_size (int): Images per request (default: PAGE_SIZE).
+                prefetch (int): Pages requested ahead of the one being consumed (default: 1).
+                composite (str): Composite period, as in reduce() (default: no compositing).
+                composite_method (str): Composite method, as in reduce().
+            Yields:
+                record (dict): 'Date' ('YYYY-MM-DD'), 'time' (system:time_start in milliseconds) and one
+                    value per index and statistic, keyed by column name such as 'Mean_NDVI'.
+        """
+        composite = self._composite_query(composite, composite_method)
+        scale = self._reduction_scale(scale, composite)
+        self._check_bands(indices)
+        aoi_reduce, columns, _ = self._aoi_reduction(indices, stats, scale, composited=bool(composite))
+        collection = self._product()
+        if composite:
+            collection = self.composite(composite['composite'], composite['composite_method'], indices)
+        features = graph.call(graph.call(collection, 'sort', 'system:time_start'), 'map', aoi_reduce)
+        for properties in _iter_pages(features, page_size, prefetch):
+            record = {'Date': _date_string(properties['time']), 'time': properties['time']}
+            record.update((column, properties.get(key)) for key, column in columns.items())
+            yield record
+
+    def update(self, end_date=None, df=None):
+        """Extends the time-series with the images acquired after the last reduced one.
+
+        Only the new images are queried and reduced, with the indices and statistics of the
+        latest reduction, and their rows are appended to df. The last processed image is
+        taken from the last_time attribute, or from the latest Date of df (in which case
+        images from the following day on are queried). For a composited series the last,
+        possibly incomplete period is composited again and replaced. Attributes df,
+        end_date and last_time get updated.
+
+            Parameters:
+                end_date (str): New end date (default: tomorrow, so that today is included).
+                df (DataFrame): Stored result of an earlier reduction to extend; its column
+                    names (such as 'Mean_NDVI') define the indices and statistics.
+            Returns:
+                added (int): Number of new rows.
+        """
+        if df is not None:
+            self.df = df
+            self.last_time = None
+            self._query = None
+        if self.df is None:
+            raise ValueError(f"Time-series not reduced yet. Use reducer function based on your selected Index")
+        if self._query is None:
+            self._query = _query_from_columns(self.df.columns)
+        if end_date is None:
+            tomorrow = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+            end_date = tomorrow.strftime('%Y-%m-%d')
+
+        composite = {key: self._query[key] for key in ('composite', 'composite_method') if key in self._query}
+        previous = self.df
+        if composite and len(self.df):
+            # Periods are aligned to the original start date, so the latest Date starts a period
+            start_date = str(self.df['Date'].max())[:10]
+            new_images = self.select_product(start_date, end_date)
+            previous = self.df[self.df['Date'] < self.df['Date'].max()]
+        elif self.last_time is not None:
+            start_date = _date_string(self.last_time)
+            new_images = self.select_product(start_date, end_date) \
+                             .filter(ee.Filter.gt('system:time_start', self.last_time))
+        elif len(self.df):
+            start_date = _date_string(_millis(str(self.df['Date'].max())[:10]) + DAY_MILLIS)
+            new_images = self.select_product(start_date, end_date)
+        else:
+            start_date = self.start_date
+            new_images = self.select_product(self.start_date, end_date)
+
+        result = self._reduce(self._query['indices'], self._query['stats'], self._query['scale'],
+                              False, WINDOW_IMAGES, collection=new_images, composite=composite,
+                              start_date=start_date, end_date=end_date)
+
+        import pandas as pd
+
+        added = compact(pd.DataFrame(result['rows'], columns=result['columns'])).reindex(columns=self.df.columns)
+        self.df = compact(pd.concat([previous, added], ignore_index=True)).sort_values(by='Date')
+        self.reducer = result['tag']
+        self.end_date = end_date
+        self._collection = None
+        self._metadata = None
+        if result['last_time'] is not None:
+            self.last_time = max(result['last_time'], self.last_time or 0)
+
+        # The extended series is the result of the query with the new end date
+        if self.cache is not None:
+            key = self.fingerprint(method='reduce', indices=[index.upper() for index in self._query['indices']],
+                                   stats=[stat.lower() for stat in self._query['stats']], scale=self._query['scale'],
+                                   **composite)
+            frame = self.df.assign(Date=epoch_millis(self.df['Date']))
+            numeric = {column: 'float64' for column in frame.columns if column != 'Sensor'}
+            rows = frame.astype(numeric).astype(object).where(frame.notna(), None).values.tolist()
+            self.cache.set(key, {'columns': list(self.df.columns), 'rows': rows,
+                                 'tag': self.reducer, 'last_time': self.last_time})
+        return len(added)
+
+    def reduce_regions(self, regions, indices=('NDVI',), stats=('mean',), id_property='parcel_id',
+                       chunk_size=None, scale=None):
+        """Reduces the time-series collection for many polygons at once.
+
+        Every image is reduced with reduceRegions over a chunk of polygons, and each chunk is
+        fetched in one request; the chunks are requested concurrently. Chunks are sized so
+        that the number of returned rows stays below MAX_ELEMENTS and the uploaded polygons
+        stay below MAX_REQUEST_BYTES. If even a single polygon returns more rows, the date
+        range is also split (see date_windows()). A chunk that still fails because it is too
+        large or times out is split in half, and a single polygon is split by date, down to
+        windows of one day. The ROI of the object should cover all polygons, since it still
+        filters the image collection.
+
+            Parameters:
+                regions: ee.FeatureCollection, GeoJSON FeatureCollection (dict), list of GeoJSON
+                    features or any object with __geo_interface__ such as a GeoDataFrame.
+                indices (list): Index names, as in reduce().
+                stats (list): Statistics, as in reduce().
+                id_property (str): Property that identifies a polygon (default: 'parcel_id').
+                    Client-side features without it use their GeoJSON id or position.
+                chunk_size (int): Polygons per request (default: derived from the image count).
+                scale (float): Nominal scale in meters for the reduction (default: native resolution).
+            Returns:
+                df (DataFrame): Long-format table with id_property, Date and one column per
+                    index and statistic, sorted by polygon and date.
+        """
+        if not isinstance(regions, ee.FeatureCollection):
+            regions = region_features(regions, id_property)
+        key = None
+        if self.cache is not None and isinstance(regions, list):
+            key = self.fingerprint(method='reduce_regions', regions=fingerprint(regions=regions),
+                                   indices=[index.upper() for index in indices],
+                                   stats=[stat.lower() for stat in stats], id_property=id_property, scale=scale)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return _regions_df(cached, id_property)
+
+        # The metadata is fetched first, so that the band check has something to validate
+        count = len(self)
+        self._check_bands(indices)
+        indices, add_indices, reducer, columns, _ = self._reduction_plan(indices, stats)
+        if chunk_size is None:
+            chunk_size = max(1, MAX_ELEMENTS // max(1, count))
+        # Each request covers a chunk of polygons and a window of images
+        window_images = max(1, MAX_ELEMENTS // chunk_size)
+        windows = self.date_windows(window_images) if count > window_images else [None]
+
+        # Chunks are lists of client-side features or (offset, size) of a server-side collection,
+        # so that they can be split further
+        if isinstance(regions, ee.FeatureCollection):
+            total = scheduler.get_info(regions.size(), 'size')
+            chunks = [(offset, min(chunk_size, total - offset)) for offset in range(0, total, chunk_size)]
+            to_collection = lambda chunk: ee.FeatureCollection(regions.toList(chunk[1], chunk[0]))
+            polygons = lambda chunk: chunk[1]
+        else:
+            chunks = list(chunk_features(regions, chunk_size))
+            to_collection = ee.FeatureCollection
+            polygons = len
+
+        # With a single index, reduceRegions names the properties after the reducer outputs
+        outputs = [statistic_reducer(stat)[1] for stat in stats] if len(indices) == 1 else list(columns)
+        selectors = [id_property, 'time']
+
+        def chunk_reduction(part):
+            """Builds the reduction of the images of a date window, or of all images, over the
+            polygons of a chunk. Inner function of reduce_regions().
             """
-            # Extract the date from the image metadata
-            date = ee.Date(image.get('system:time_start')).format("YYYY-MM-dd", 'UTC')
+            chunk, window = part
+            collection = to_collection(chunk)
+
+            def regions_reduce(image):
+                time = image.get('system:time_start')
+                reduced = add_indices(image).select(indices).reduceRegions(
+                    collection=collection,
+                    reducer=reducer,
+                    scale=scale
+                )
+                return reduced.map(lambda feature: feature.set('time', time)) \
+                              .select([*selectors, *outputs], [*selectors, *columns], False)
 
-            # Calculate the mean NDVI value within the AOI
-            mean = image.select('NDVI').reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=aoi
-            ).get('NDVI')
+            images = self._product() if window is None else self._product().filterDate(*window)
+            return images.filterBounds(collection).map(regions_reduce).flatten()
 
-            # Return the date and mean NDVI as a feature
-            return ee.Feature(None, {
-                'date': date,
-                'mean_ndvi': mean
-            })
+        def split_part(part):
+            """Halves the chunk of a part, or the date window of a single polygon.
+            Inner function of reduce_regions().
+            """
+            chunk, window = part
+            size = polygons(chunk)
+            if size > 1:
+                if isinstance(chunk, tuple):
+                    halves = [(chunk[0], size // 2), (chunk[0] + size // 2, size - size // 2)]
+                else:
+                    halves = [chunk[:size // 2], chunk[size // 2:]]
+                return [(half, window) for half in halves]
+            window = window or (_millis(self.start_date), _millis(self.end_date))
+            return [(chunk, half) for half in _split_window(window)]
 
-        features = self.collection.map(aoi_ndvi_mean).getInfo()
+        def describe(part):
+            """Attributes of the 'split' span of a part. Inner function of reduce_regions()."""
+            chunk, window = part
+            window = window or (_millis(self.start_date), _millis(self.end_date))
+            return {'polygons': polygons(chunk), 'start': _date_string(window[0]), 'end': _date_string(window[1])}
 
-        # Extract dates and mean NDVI values from the feature collection
-        dates = [feature['properties']['date'] for feature in features['features']]
-        mean_ndvi = [feature['properties']['mean_ndvi'] for feature in features['features']]
+        # All chunks and windows are submitted at once; the executor limits the requests in flight
+        parts = [(chunk, window) for chunk in chunks for window in windows]
+        results = [result for _, result in _split_requests(chunk_reduction, parts, split_part, describe,
+                                                           'reduce_regions')]
+        rows = [[feature['properties'].get(id_property), feature['properties']['time'],
+                 *(feature['properties'].get(name) for name in columns)]
+                for features in results for feature in features['features']]
+        result = {'columns': [id_property, 'Date', *columns.values()], 'rows': rows}
+        if key is not None:
+            self.cache.set(key, result)
+        return _regions_df(result, id_property)
+
+    def reduce_ndvi_mean(self, chunked=False, composite=None, composite_method=None):
+        """Reduces the time-series collection based on the ROI using NDVI band and mean.
 
-        # Create a DataFrame from the extracted data
-        df = pd.DataFrame({
-            'Date': dates,
-            'Mean_NDVI': mean_ndvi
-        })
+        Shortcut for reduce(indices=['NDVI'], stats=['mean']). Attributes reducer and df get assigned.
+
+            Parameters:
+                chunked (bool): Reduce the date range in parallel windows (default: False).
+                composite (str): Composite period, such as 'daily' or 'monthly' (default: one row per image).
+                composite_method (str): Composite method, such as 'max' or 'median' (default: see composite()).
+        """
+        self.reduce(indices=['NDVI'], stats=['mean'], chunked=chunked, composite=composite,
+                    composite_method=composite_method)
+
+    def compute_local(self, bands, indices=('NDVI',), **kwargs):
+        """Computes indices from band arrays that are already local, without contacting GEE.
+
+        Uses the band names, reflectance scaling and cloud mask of the collection, see local.compute_indices().
+
+            Parameters:
+                bands (dict): Band arrays by band name, or a structured array from computePixels.
+                indices (list): Index names (default: ['NDVI']).
+            Returns:
+                arrays (dict): float32 arrays by index name, NaN where a band is nodata.
+        """
+        kwargs.setdefault('mask', self._mask_name())
+        return local.compute_indices(bands, indices, self.collection_id, **kwargs)
 
-        # Sort the DataFrame by date
-        df_sorted = df.sort_values(by='Date')
+    def download(self, image, bands, scale=30, path=None, **kwargs):
+        """Downloads the pixels of an image over the AOI into a local array, without a Drive export.
 
-        self.df = df_sorted
-        self.reducer = 'NDVI_MEAN'
+        The AOI is split into tiles that fit into single requests, which are fetched concurrently
+        and written to the output as they arrive, see download.download_image().
+
+            Parameters:
+                image (ee.Image): Image to download, such as a composite with index bands.
+                bands (list): Band names, such as ['NDVI'].
+                scale (float): Pixel size in meters (default: 30).
+                path (str): Output .npy file (memory-mapped) or .zarr store (default: in memory).
+            Returns:
+                array (numpy.ndarray): Pixels of shape (bands, rows, cols), or a numpy.memmap or zarr.Array.
+                grid (download.Grid): CRS, affine transform and size of the array.
+        """
+        session.ensure_initialized()
+        return download.download_image(image, self.roi, bands, scale, path=path, **kwargs)
+
+    def to_arrow(self):
+        """Returns df as a pyarrow.Table (requires pyarrow)."""
+        if self.df is None:
+            raise ValueError(f"Time-series not reduced yet. Use reducer function based on your selected Index")
+        return columnar.to_arrow(self.df)
+
+    def to_parquet(self, path, compression='zstd'):
+        """Writes df to a Parquet file (requires pyarrow).
+
+            Parameters:
+                path (str): Output file.
+                compression (str): Parquet compression codec (default: 'zstd').
+        """
+        if self.df is None:
+            raise ValueError(f"Time-series not reduced yet. Use reducer function based on your selected Index")
+        columnar.to_parquet(self.df, path, compression=compression)
+
+    def to_feather(self, path):
+        """Writes df to an uncompressed Feather file that columnar.read_feather() can memory-map (requires pyarrow).
+
+            Parameters:
+                path (str): Output file.
+        """
+        if self.df is None:
+            raise ValueError(f"Time-series not reduced yet. Use reducer function based on your selected Index")
+        columnar.to_feather(self.df, path)
 
     def plot(self):
-        """Standard plotting function for the geoindexity time-series object."""
+        """Standard plotting function for the geoindexity time-series object.
+
+        The figure is drawn by render.SeriesRenderer and shown with pyplot; use
+        download_plot_local() or render.render_batch() to write files without pyplot.
+
+            Returns:
+                figure (matplotlib.figure.Figure): The shown figure.
+        """
         if not self.reducer:
             raise ValueError(f"Time-series not reduced yet. Use reducer function based on your selected Index")
         
-        if self.reducer == 'NDVI_MEAN':
-            plt.figure(figsize=(10, 5))
-            plt.plot(self.df['Date'], self.df['Mean_NDVI'], marker='o', linestyle='--')
-            plt.title('Mean NDVI Time Series')
-            plt.xlabel('Date')
-            plt.xticks(rotation=45)
-            plt.ylabel('Mean NDVI')
-            plt.yticks(np.arange(-1, 1, 0.5))
-            plt.grid(True)
-            plt.show()
-            
-
-    def export_image_to_drive(self, image, description, folder='earth_engine_exports'):
+        import matplotlib.pyplot as plt
+
+        with instrumentation.span('plot', rows=len(self.df)):
+            figure = render.SeriesRenderer(plt.figure(figsize=render.FIGSIZE)).draw(self.df)
+        plt.show()
+        return figure
+
+    def _start_export(self, name, factory, manager):
+        """Starts an export task, or queues it in an ExportManager.
+
+        Returns the started ee.batch.Task, or the state of the export in the manager.
+        """
+        with instrumentation.span('export', description=name, queued=manager is not None):
+            if manager is not None:
+                return manager.add(name, factory)
+            task = factory()
+            task.start()
+            return task
+
+    def export_image_to_drive(self, image, description, folder='earth_engine_exports', manager=None):
         """Exports a single image to Google Drive.
 
         Parameters:
             image (ee.Image): Image to export.
             description (str): Description for the exported image.
             folder (str): Folder name in Google Drive where the image will be exported (default: 'earth_engine_exports').
+            manager (exports.ExportManager): Queue the export in this manager instead of starting it (default: None).
         """
-        task = ee.batch.Export.image.toDrive(image=image,
-                                             description=description,
-                                             folder=folder,
-                                             scale=30,  # Adjust scale as needed
-                                             region=self.bound())
-        task.start()
+        region = self.bound()
+        task = self._start_export(description, lambda: ee.batch.Export.image.toDrive(image=image,
+                                                                                     description=description,
+                                                                                     folder=folder,
+                                                                                     scale=30,  # Adjust scale as needed
+                                                                                     region=region), manager)
+        if manager is not None:
+            print(f'Queued {description} for export to Google Drive')
+            return task
 
         print(f'Exporting {description} to Google Drive...')
         print(f'Export task id: {task.id}')
-    
-    def export_image_collection_to_drive(self, description, folder='earth_engine_exports'):
-        """Exports the entire image collection to Google Drive as a single zip file.
+        return task
 
-        Parameters:
-            description (str): Description for the exported image collection.
-            folder (str): Folder name in Google Drive where the zip file will be exported (default: 'earth_engine_exports').
+    def export_image_collection_to_drive(self, description, folder='earth_engine_exports', scale=30, manager=None):
+        """Exports every image of the collection to Google Drive as a separate GeoTIFF.
+
+        Each image gets its own export task, named after the description and the image index.
+        Large collections should be exported through an ExportManager, which keeps the number
+        of running tasks within the Earth Engine queue limits.
+
+            Parameters:
+                description (str): Description prefix for the exported images.
+                folder (str): Folder name in Google Drive where the images will be exported (default: 'earth_engine_exports').
+                scale (float): Pixel size in meters (default: 30).
+                manager (exports.ExportManager): Queue the exports in this manager instead of starting them (default: None).
+            Returns:
+                tasks (list): The started ee.batch.Task objects, or the export names queued in the manager.
         """
-        images = self.collection.toList(self.collection.size())
-        task = ee.batch.Export.image.toDrive(imageCollection=images,
-                                             description=description,
-                                             folder=folder,
-                                             fileFormat='GeoTIFF',
-                                             region=self.bound())
-        task.start()
+        ids = self.metadata()['ids']
+        region = self.bound()
+        tasks = []
+        for image_id in ids:
+            name = _export_name(description, image_id)
 
-        print(f'Exporting {description} to Google Drive...')
-        print(f'Export task id: {task.id}')
+            def export(image_id=image_id, name=name):
+                # GeoTIFF bands need a common type; Sentinel-2 mixes UInt16 and Byte bands
+                image = ee.Image(self.collection.filter(ee.Filter.eq('system:index', image_id)).first()).toFloat()
+                return ee.batch.Export.image.toDrive(image=image,
+                                                     description=name,
+                                                     folder=folder,
+                                                     fileNamePrefix=name,
+                                                     fileFormat='GeoTIFF',
+                                                     scale=scale,
+                                                     region=region)
 
-    def export_plot_to_drive(self, description, folder='earth_engine_exports'):
+            task = self._start_export(name, export, manager)
+            tasks.append(name if manager is not None else task)
+
+        if manager is not None:
+            print(f'Queued {len(tasks)} images of {description} for export to Google Drive')
+            return tasks
+
+        print(f'Exporting {len(tasks)} images of {description} to Google Drive...')
+        print(f"Export task ids: {', '.join(str(task.id) for task in tasks)}")
+        return tasks
+
+    def export_plot_to_drive(self, description, folder='earth_engine_exports', manager=None):
         """Exports the current plot to Google Drive as a PNG file.
 
         Parameters:
             description (str): Description for the exported plot.
             folder (str): Folder name in Google Drive where the plot will be exported (default: 'earth_engine_exports').
+            manager (exports.ExportManager): Queue the export in this manager instead of starting it (default: None).
         """
-        plt.figure(figsize=(10, 5))
-        plt.plot(self.df['Date'], self.df['Mean_NDVI'], marker='o', linestyle='--')
-        plt.title('Mean NDVI Time Series')
-        plt.xlabel('Date')
-        plt.xticks(rotation=45)
-        plt.ylabel('Mean NDVI')
-        plt.yticks(np.arange(-1, 1, 0.5))
-        plt.grid(True)
+        columns = [column for column in self.df.columns if column != 'Date']
 
         # Save the plot to a temporary file
         temp_file = 'plot.png'
-        plt.savefig(temp_file)
-        plt.close()
+        with instrumentation.span('plot', rows=len(self.df)):
+            render.render_series(self.df, temp_file)
 
         # Export the plot file to Google Drive
-        task = ee.batch.Export.table.toDrive(collection=ee.FeatureCollection([]),
-                                             description=description,
-                                             folder=folder,
-                                             fileFormat='png',
-                                             selectors=['Date', 'Mean_NDVI'])
-        task.start()
+        task = self._start_export(description, lambda: ee.batch.Export.table.toDrive(collection=ee.FeatureCollection([]),
+                                                                                     description=description,
+                                                                                     folder=folder,
+                                                                                     fileFormat='png',
+                                                                                     selectors=['Date', *columns]),
+                                  manager)
+        if manager is not None:
+            print(f'Queued {description} plot for export to Google Drive')
+            return task
 
         print(f'Exporting {description} plot to Google Drive...')
         print(f'Export task id: {task.id}')
+        return task
 
 def download_plot_local(obj, fig_name='plot.png'):
     """
     Generates and saves a plot locally.
 
+    The plot is drawn without pyplot on a figure that later calls on the same thread
+    reuse (see render.render_series()); render.render_batch() renders many series at once.
+
     Parameters:
     - obj: Geoindexity
         The Geoindexity object containing the data to plot.
     - fig_name: str, optional
         The filename to save the plot as (default is 'plot.png').
     """
-    plt.figure(figsize=(10, 5))
-    plt.plot(obj.df['Date'], obj.df['Mean_NDVI'], marker='o', linestyle='--')
-    plt.title('Mean NDVI Time Series')
-    plt.xlabel('Date')
-    plt.xticks(rotation=45)
-    plt.ylabel('Mean NDVI')
-    plt.grid(True)
-    plt.savefig(fig_name)
-    plt.close()
+    with instrumentation.span('plot', rows=len(obj.df)):
+        render.render_series(obj.df, fig_name)
 
     # Print a message indicating where the file is saved
     print(f'Plot saved as: {fig_name}')
@@ -0,0 +1,86 @@
+"""
+This script includes the expression graph cache of GeoIndexity.
+
+Earth Engine objects are immutable descriptions of server computations, so
+two objects built from the same inputs are interchangeable. GeoIndexity
+builds them through this module, which hash-conses them: an expression is
+looked up by a key of its inputs and built only once, and every later
+request for it returns the identical object. The ROI geometry, the filtered
+collections and the mapped collections are therefore shared by all methods
+and instances. map() traces its function only once per collection, and the
+Earth Engine serializer, which caches the encoding of every object by its
+id, encodes a shared sub-expression only once per request and sends it as a
+reference wherever it appears again.
+"""
+
+import collections
+import threading
+
+# Number of expressions kept; the least recently used ones are dropped beyond it
+MAX_NODES = 4096
+
+_nodes = collections.OrderedDict()
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0}
+
+
+def intern(key, build):
+    """Returns the expression of a key, building it on first use.
+
+    Arguments
+    ----------
+    key : tuple
+        Hashable description of all inputs of the expression.
+    build : function
+        Builds the expression without arguments.
+
+    Returns
+    ----------
+    The shared expression.
+    """
+    with _lock:
+        if key in _nodes:
+            _nodes.move_to_end(key)
+            _counters['hits'] += 1
+            return _nodes[key]
+        _counters['misses'] += 1
+    node = build()
+    with _lock:
+        node = _nodes.setdefault(key, node)
+        while len(_nodes) > MAX_NODES:
+            _nodes.popitem(last=False)
+    return node
+
+
+def call(obj, method, *args):
+    """Returns obj.method(*args), shared by all calls with the same object and arguments.
+
+    The key holds the id of obj, which stays unique because the result references
+    obj as its argument as long as the result is kept.
+
+    Arguments
+    ----------
+    obj : ee.ComputedObject
+        Object to call the method on.
+    method : str
+        Method name, such as 'map' or 'filterDate'.
+    *args
+        Hashable arguments, such as a function built once (see registry.image_function()).
+
+    Returns
+    ----------
+    ee.ComputedObject
+    """
+    return intern(('call', id(obj), method, args), lambda: getattr(obj, method)(*args))
+
+
+def clear():
+    """Drops all expressions, e.g. after an index or sensor definition changed."""
+    with _lock:
+        _nodes.clear()
+
+
+def stats():
+    """Returns the number of hits, misses and kept expressions."""
+    with _lock:
+        return {**_counters, 'nodes': len(_nodes)}
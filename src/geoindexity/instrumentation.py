@@ -0,0 +1,343 @@
+"""
+This script includes the instrumentation hooks of GeoIndexity.
+
+The hot paths of GeoIndexity (building the filtered collection, every
+getInfo() of the request scheduler, parsing the results into rows and a
+DataFrame, plotting and exports) run inside spans. A span records its
+latency and attributes such as payload bytes, retries and image counts, and
+is passed to the registered callbacks when it ends. Recorder collects spans
+into per-query metrics; opentelemetry_callback() and prometheus_callback()
+forward them to OpenTelemetry or Prometheus, which are optional.
+
+Without callbacks, span() returns one shared no-op object, so the hooks cost
+a function call and attributes that are expensive to measure, such as
+payload sizes, are not computed.
+"""
+
+import collections
+import itertools
+import statistics
+import threading
+import time
+import warnings
+
+_callbacks = ()
+_callbacks_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+
+
+class Span:
+    """
+    A timed section of GeoIndexity, used as a context manager.
+
+    Attributes
+    ----------
+    name : str
+        Name of the section, such as 'getInfo', 'parse' or 'plot'.
+    attributes : dict
+        Measured values of the section, such as request, payload_bytes, retries or images.
+    span_id : int
+        Unique number of the span in the process.
+    parent_id : int
+        span_id of the enclosing span, or None.
+    start : float
+        Start as seconds since epoch.
+    seconds : float
+        Duration, set when the span ends.
+    error : str
+        Representation of the exception that ended the span, or None.
+    """
+    enabled = True
+
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_ids)
+        parent = current() if parent is None else parent
+        self.parent_id = parent.span_id if parent is not None and parent.enabled else None
+        self.start = None
+        self.seconds = None
+        self.error = None
+        self._clock = None
+
+    def set(self, **attributes):
+        """Adds or replaces attributes of the span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.start = time.time()
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self._clock
+        if exc_value is not None:
+            self.error = repr(exc_value)
+        stack = _local.stack
+        if stack and stack[-1] is self:
+            stack.pop()
+        _emit(self)
+        return False
+
+    def __repr__(self):
+        return f'Span({self.name!r}, seconds={self.seconds}, attributes={self.attributes})'
+
+
+class _NullSpan:
+    """The span returned while instrumentation is disabled; it ignores everything."""
+    enabled = False
+    span_id = None
+    attributes = {}
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, parent=None, **attributes):
+    """Returns a span for a section of code, to be used in a with statement.
+
+    Arguments
+    ----------
+    name : str
+        Name of the section.
+    parent : Span, optional
+        Enclosing span, for sections that run on another thread (default: the current
+        span of this thread).
+    **attributes
+        Initial attributes.
+
+    Returns
+    ----------
+    Span
+        A new span, or NULL_SPAN if no callback is registered.
+    """
+    if not _callbacks:
+        return NULL_SPAN
+    return Span(name, parent, **attributes)
+
+
+def enabled():
+    """Returns True if a callback is registered, i.e. spans are recorded."""
+    return bool(_callbacks)
+
+
+def current():
+    """Returns the innermost open span of this thread, or None."""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def add_callback(callback):
+    """Registers a function that is called with every finished Span; returns the callback.
+
+    Callbacks run on the thread of the span, so they have to be thread-safe. An error in
+    a callback is reported as a warning and does not stop GeoIndexity.
+    """
+    global _callbacks
+    with _callbacks_lock:
+        if callback not in _callbacks:
+            _callbacks = _callbacks + (callback,)
+    return callback
+
+
+def remove_callback(callback):
+    """Unregisters a callback of add_callback()."""
+    global _callbacks
+    with _callbacks_lock:
+        _callbacks = tuple(item for item in _callbacks if item is not callback)
+
+
+def _emit(finished):
+    for callback in _callbacks:
+        try:
+            callback(finished)
+        except Exception as error:
+            warnings.warn(f'Instrumentation callback {callback!r} failed: {error!r}')
+
+
+def payload_bytes(value):
+    """Returns the size of a request or response in bytes, or None if it cannot be measured.
+
+    Earth Engine objects are measured by their serialized expression, arrays by their
+    buffer size and other results by their JSON encoding. Only called by enabled spans.
+    """
+    try:
+        if hasattr(value, 'getInfo'):
+            import ee
+
+            return len(ee.serializer.toJSON(value))
+        if hasattr(value, 'nbytes'):
+            return int(value.nbytes)
+        import json
+
+        return len(json.dumps(value, separators=(',', ':')))
+    except Exception:
+        return None
+
+
+class Recorder:
+    """
+    A callback that collects finished spans into per-query metrics.
+
+    Use it with add_callback(), or as a context manager that registers it for a block.
+
+    Attributes
+    ----------
+    spans : collections.deque
+        The latest finished spans.
+    """
+    def __init__(self, history=100000):
+        """Initializes the recorder.
+
+        Arguments
+        ----------
+        history : int
+            Number of spans kept (default: 100000).
+        """
+        self.spans = collections.deque(maxlen=history)
+
+    def __call__(self, finished):
+        self.spans.append(finished)
+
+    def __enter__(self):
+        add_callback(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_callback(self)
+        return False
+
+    def summary(self, by=None):
+        """Summarizes the spans by name.
+
+        Arguments
+        ----------
+        by : str, optional
+            Attribute appended to the name of the group, e.g. 'request' to split getInfo
+            spans by request name.
+
+        Returns
+        ----------
+        dict
+            By span name: count, errors, total, mean and maximum seconds, and the sum of every
+            numeric attribute, such as payload_bytes, retries or images.
+        """
+        groups = collections.defaultdict(list)
+        for finished in list(self.spans):
+            key = finished.name
+            if by is not None and by in finished.attributes:
+                key = f'{key}:{finished.attributes[by]}'
+            groups[key].append(finished)
+        summary = {}
+        for key, spans in groups.items():
+            seconds = [finished.seconds for finished in spans]
+            entry = {'count': len(spans), 'errors': sum(finished.error is not None for finished in spans),
+                     'seconds': sum(seconds), 'seconds_mean': statistics.fmean(seconds), 'seconds_max': max(seconds)}
+            for finished in spans:
+                for attribute, value in finished.attributes.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        entry[attribute] = entry.get(attribute, 0) + value
+            summary[key] = entry
+        return summary
+
+    def clear(self):
+        """Drops the collected spans."""
+        self.spans.clear()
+
+
+def opentelemetry_callback(tracer=None):
+    """Returns a callback that exports every span to OpenTelemetry.
+
+    Needs opentelemetry-api ('pip install geoindexity[otel]') and a configured SDK for the
+    spans to be exported anywhere. Attributes are prefixed with 'geoindexity.'.
+
+    Arguments
+    ----------
+    tracer : opentelemetry.trace.Tracer, optional
+        Tracer of the spans (default: the tracer 'geoindexity' of the global provider).
+
+    Returns
+    ----------
+    function
+        A callback for add_callback().
+    """
+    try:
+        from opentelemetry import trace
+    except ImportError as error:
+        raise ImportError("OpenTelemetry export needs opentelemetry-api. "
+                          "Install it with 'pip install geoindexity[otel]'.") from error
+    tracer = tracer or trace.get_tracer('geoindexity')
+
+    def export(finished):
+        attributes = {f'geoindexity.{key}': value for key, value in finished.attributes.items()
+                      if isinstance(value, (bool, int, float, str))}
+        start = int(finished.start * 1e9)
+        exported = tracer.start_span(finished.name, start_time=start, attributes=attributes)
+        if finished.error is not None:
+            exported.set_status(trace.Status(trace.StatusCode.ERROR, finished.error))
+        exported.end(end_time=start + int(finished.seconds * 1e9))
+
+    return export
+
+
+def prometheus_callback(registry=None, prefix='geoindexity'):
+    """Returns a callback that exports every span to Prometheus metrics.
+
+    Needs prometheus-client ('pip install geoindexity[prometheus]'). The metrics, labelled
+    by span name, are <prefix>_span_seconds (histogram), <prefix>_span_errors_total,
+    <prefix>_retries_total, <prefix>_payload_bytes_total, <prefix>_response_bytes_total
+    and <prefix>_images_total.
+    Create the callback once per registry.
+
+    Arguments
+    ----------
+    registry : prometheus_client.CollectorRegistry, optional
+        Registry of the metrics (default: the global registry).
+    prefix : str
+        Prefix of the metric names (default: 'geoindexity').
+
+    Returns
+    ----------
+    function
+        A callback for add_callback().
+    """
+    try:
+        import prometheus_client
+    except ImportError as error:
+        raise ImportError("Prometheus export needs prometheus-client. "
+                          "Install it with 'pip install geoindexity[prometheus]'.") from error
+    options = {} if registry is None else {'registry': registry}
+    seconds = prometheus_client.Histogram(f'{prefix}_span_seconds', 'Duration of GeoIndexity spans', ['name'],
+                                          **options)
+    errors = prometheus_client.Counter(f'{prefix}_span_errors', 'GeoIndexity spans ended by an error', ['name'],
+                                       **options)
+    counters = {attribute: prometheus_client.Counter(f'{prefix}_{attribute}', description, ['name'], **options)
+                for attribute, description in (('retries', 'Retried GeoIndexity requests'),
+                                               ('payload_bytes', 'Bytes of GeoIndexity requests'),
+                                               ('response_bytes', 'Bytes of GeoIndexity responses'),
+                                               ('images', 'Images processed by GeoIndexity'))}
+
+    def export(finished):
+        seconds.labels(finished.name).observe(finished.seconds)
+        if finished.error is not None:
+            errors.labels(finished.name).inc()
+        for attribute, counter in counters.items():
+            value = finished.attributes.get(attribute)
+            if isinstance(value, (int, float)) and value > 0:
+                counter.labels(finished.name).inc(value)
+
+    return export
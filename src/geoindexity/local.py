@@ -0,0 +1,171 @@
+"""
+This script includes the local index engine of GeoIndexity.
+
+It evaluates the index formulas of geoindexity.registry, compiled into
+NumPy kernels, on arrays that are already on the local machine, for
+example pixels fetched with computePixels or sampleRectangle, or read
+from GeoTIFF files, so they do not have to be uploaded to Google Earth
+Engine (GEE) again. The arrays are processed in row tiles with float32
+buffers that are reused for every tile, and all arithmetic is done in
+place. Digital numbers are converted
+to surface reflectance with the same scale and offset as on the server,
+and pixels that are nodata in any input band or cloudy according to the
+cloud mask become NaN, like masked pixels on the server.
+"""
+
+from . import registry
+
+# Rows per tile; 1024 rows of a Sentinel-2 tile are about 45 MB per float32 buffer
+TILE_ROWS = 1024
+
+
+def required_bands(indices, collection_id='Sentinel', mask=None):
+    """Returns the band names needed to compute the given indices locally.
+
+    Arguments
+    ----------
+    indices : list
+        Index names, such as ['NDVI', 'EVI'].
+    collection_id : str
+        A collection of the registry, such as 'Sentinel' or 'Landsat' (default: 'Sentinel').
+    mask : str or bool, optional
+        Cloud mask of the collection (see registry.cloud_mask()), whose band is needed as well.
+
+    Returns
+    ----------
+    list
+        Band names in order of first use, followed by the band of the cloud mask.
+
+    Raises
+    ----------
+    ValueError: If an index or the collection is not supported.
+    """
+    names = registry.required_bands(indices, collection_id)
+    clouds = registry.cloud_mask(collection_id, mask)
+    if clouds is not None and clouds.band not in names:
+        names.append(clouds.band)
+    return names
+
+
+def _cloudy(band, mask, out):
+    """Sets out to True where a CloudMask considers the pixels of a band array cloudy."""
+    import numpy as np
+
+    if mask.kind == 'bits':
+        flags = sum(1 << bit for bit in mask.values)
+        np.not_equal(np.bitwise_and(band, flags), 0, out=out)
+    elif mask.kind == 'classes':
+        out[...] = np.isin(band, mask.values)
+    elif mask.kind == 'probability':
+        np.greater_equal(band, mask.values, out=out)
+    else:
+        raise ValueError(f"Invalid cloud mask kind: {mask.kind}.")
+
+
+def compute_indices(bands, indices=('NDVI',), collection_id='Sentinel', reflectance=True, nodata='sensor',
+                    mask=None, tile_rows=TILE_ROWS, out=None):
+    """Computes spectral indices from local band arrays, tile by tile.
+
+    Arguments
+    ----------
+    bands : dict or numpy structured array
+        Band arrays of equal shape by band name, such as {'B8': nir, 'B4': red}.
+        A structured array as returned by computePixels in NPY format works as well.
+    indices : list
+        Index names (default: ['NDVI']).
+    collection_id : str
+        A collection of the registry; selects band names and reflectance scaling (default: 'Sentinel').
+    reflectance : bool
+        Convert digital numbers to surface reflectance (default: True). Use False
+        for arrays that already hold reflectance.
+    nodata : number, optional
+        Value marking missing pixels in the input bands, or None (default: the fill value of the sensor).
+    mask : str or bool, optional
+        Cloud mask of the collection (see registry.cloud_mask()). Its band, such as SCL,
+        QA_PIXEL or the s2cloudless probability, must be in bands.
+    tile_rows : int
+        Rows processed at a time (default: TILE_ROWS).
+    out : dict, optional
+        Preallocated float32 output arrays by index name, such as numpy.memmap arrays.
+
+    Returns
+    ----------
+    dict
+        float32 arrays by index name; nodata, cloudy and undefined pixels are NaN.
+
+    Raises
+    ----------
+    ValueError: If an index, the collection or a band is missing, or the shapes differ.
+    """
+    import numpy as np
+
+    definitions = [registry.get(index) for index in indices]
+    clouds = registry.cloud_mask(collection_id, mask)
+    names = required_bands(indices, collection_id, mask)
+    available = bands.dtype.names if hasattr(bands, 'dtype') else bands
+    missing = [name for name in names if name not in available]
+    if missing:
+        raise ValueError(f"Missing bands for {', '.join(indices)}: {', '.join(missing)}.")
+    arrays = {name: np.asarray(bands[name]) for name in names}
+    shape = arrays[names[0]].shape
+    if any(array.shape != shape for array in arrays.values()):
+        raise ValueError("All band arrays must have the same shape.")
+    sensor = registry.sensor(collection_id)
+    scale, offset = (np.float32(sensor.scale), np.float32(sensor.offset)) if reflectance else (1, 0)
+    if nodata == 'sensor':
+        nodata = sensor.nodata
+    mappings = [definition.band_names(collection_id) for definition in definitions]
+    spectral = registry.required_bands(indices, collection_id)
+    kernels = [definition.kernel for definition in definitions]
+
+    out = dict(out or {})
+    for definition in definitions:
+        if definition.name not in out:
+            out[definition.name] = np.empty(shape, dtype=np.float32)
+
+    rows = shape[0]
+    tile_shape = (min(tile_rows, rows),) + tuple(shape[1:])
+    inputs = {name: np.empty(tile_shape, dtype=np.float32) for name in spectral}
+    scratch = [np.empty(tile_shape, dtype=np.float32) for _ in range(max((count for _, count in kernels), default=0))]
+    invalid = np.empty(tile_shape, dtype=bool)
+    test = np.empty(tile_shape, dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for start in range(0, rows, tile_rows):
+            stop = min(start + tile_rows, rows)
+            size = stop - start
+            view = lambda buffer: buffer[:size]
+            # Every band is scaled once per tile and shared by all indices
+            for name in spectral:
+                buffer = view(inputs[name])
+                np.multiply(arrays[name][start:stop], scale, out=buffer, dtype=np.float32)
+                if offset:
+                    np.add(buffer, offset, out=buffer)
+            view(invalid).fill(False)
+            if nodata is not None:
+                for name in spectral:
+                    np.equal(arrays[name][start:stop], nodata, out=view(test))
+                    np.logical_or(view(invalid), view(test), out=view(invalid))
+            if clouds is not None:
+                _cloudy(arrays[clouds.band][start:stop], clouds, view(test))
+                np.logical_or(view(invalid), view(test), out=view(invalid))
+            for definition, mapping, (kernel, _) in zip(definitions, mappings, kernels):
+                target = out[definition.name][start:stop]
+                kernel({role: view(inputs[band]) for role, band in mapping.items()}, target,
+                       [view(buffer) for buffer in scratch])
+                if nodata is not None or clouds is not None:
+                    np.copyto(target, np.nan, where=view(invalid))
+    return out
+
+
+def compute_index(bands, index='NDVI', collection_id='Sentinel', **kwargs):
+    """Computes a single spectral index from local band arrays.
+
+    See compute_indices() for the arguments.
+
+    Returns
+    ----------
+    numpy.ndarray
+        float32 array of the index.
+    """
+    return compute_indices(bands, [index], collection_id, **kwargs)[index.upper()]
@@ -0,0 +1,513 @@
+"""
+This script includes the spectral index registry of GeoIndexity.
+
+Every index is defined once by a formula over band roles such as nir and
+red, for example '(nir - red) / (nir + red)'. Sensors map the roles to
+their band names and describe how digital numbers are scaled to surface
+reflectance. From a definition GeoIndexity compiles both the per-image
+Earth Engine function used on the server and a NumPy kernel used by the
+local engine (geoindexity.local), so both paths compute the same numbers.
+New indices and sensors are added with register() and register_sensor().
+
+Sensors also declare per-pixel cloud masks (QA bit flags, scene
+classification classes or a joined cloud probability), which are applied
+by the same per-image function that computes the index bands.
+
+Images of different sensors are merged into one collection by mapping
+their bands onto common roles with harmonize_function(), which scales
+them to reflectance and adjusts them to Landsat 8 OLI with the
+coefficients in HARMONIZATION. The 'Merged' sensor computes the indices
+of such images.
+"""
+
+import ast
+import collections
+import functools
+
+from . import graph
+
+Sensor = collections.namedtuple('Sensor', ['bands', 'scale', 'offset', 'nodata', 'masks'])
+
+# A per-pixel cloud mask. kind is 'bits' (pixels with any of the bit numbers in values set
+# in band are masked), 'classes' (pixels whose band value is in values are masked) or
+# 'probability' (pixels with band >= values of the image joined from collection are masked).
+CloudMask = collections.namedtuple('CloudMask', ['kind', 'band', 'values', 'collection'])
+
+SENSORS = {}
+INDICES = {}
+
+# Band and linear adjustment (slope, intercept) of every common reflectance role per sensor,
+# onto Landsat 8 OLI. Sentinel-2 uses the narrow NIR band B8A and the bandpass adjustment of
+# Harmonized Landsat Sentinel-2 (HLS) v2.0; Landsat 8 and 9 OLI are the reference.
+HARMONIZATION = {
+    'Sentinel': {'blue': ('B2', 0.9778, -0.004), 'green': ('B3', 1.0053, -0.0009), 'red': ('B4', 0.9765, 0.0009),
+                 'nir': ('B8A', 0.9983, -0.0001), 'swir1': ('B11', 0.9987, -0.0011),
+                 'swir2': ('B12', 1.003, -0.0012)},
+    'Landsat': {'blue': ('SR_B2', 1.0, 0.0), 'green': ('SR_B3', 1.0, 0.0), 'red': ('SR_B4', 1.0, 0.0),
+                'nir': ('SR_B5', 1.0, 0.0), 'swir1': ('SR_B6', 1.0, 0.0), 'swir2': ('SR_B7', 1.0, 0.0)},
+}
+
+
+def register_sensor(collection_id, bands, scale=1.0, offset=0.0, nodata=None, masks=None):
+    """Registers the band names, reflectance scaling and cloud masks of a collection.
+
+    Arguments
+    ----------
+    collection_id : str
+        Collection identifier as used by Geoindexity, such as 'Sentinel'.
+    bands : dict
+        Band name by role, such as {'nir': 'B8', 'red': 'B4'}.
+    scale : float
+        Surface reflectance = digital number * scale + offset (default: 1.0).
+    offset : float
+        See scale (default: 0.0).
+    nodata : number, optional
+        Fill value of the bands (default: None).
+    masks : dict, optional
+        CloudMask by name; the first one is the default mask of the collection.
+
+    Returns
+    ----------
+    Sensor
+    """
+    sensor = Sensor(dict(bands), scale, offset, nodata, dict(masks or {}))
+    SENSORS[collection_id] = sensor
+    image_function.cache_clear()
+    harmonize_function.cache_clear()
+    graph.clear()
+    return sensor
+
+
+def sensor(collection_id):
+    """Returns the Sensor of a collection.
+
+    Raises
+    ----------
+    ValueError: If the collection is not registered.
+    """
+    if collection_id not in SENSORS:
+        raise ValueError(f"Invalid collection: {collection_id}. Supported collections: {', '.join(SENSORS)}.")
+    return SENSORS[collection_id]
+
+
+def cloud_mask(collection_id, name=True):
+    """Returns the CloudMask of a collection.
+
+    Arguments
+    ----------
+    collection_id : str
+        Registered collection.
+    name : str or bool
+        Mask name, True for the default mask of the collection (None if it has no masks),
+        or None/False for no mask.
+
+    Returns
+    ----------
+    CloudMask or None
+
+    Raises
+    ----------
+    ValueError: If the collection has no mask of that name.
+    """
+    if name is None or name is False:
+        return None
+    masks = sensor(collection_id).masks
+    if name is True:
+        return next(iter(masks.values()), None)
+    if name not in masks:
+        raise ValueError(f"Invalid cloud mask for {collection_id}: {name}. Supported masks: {', '.join(masks) or 'none'}.")
+    return masks[name]
+
+
+def mask_name(collection_id, name=True):
+    """Returns the name of the cloud mask selected by name (see cloud_mask()), or None."""
+    mask = cloud_mask(collection_id, name)
+    if mask is None:
+        return None
+    return next(key for key, value in sensor(collection_id).masks.items() if value is mask)
+
+
+def clear_sky(image, mask):
+    """Returns an ee.Image that is 1 where a CloudMask considers the pixels of an image clear."""
+    import ee
+
+    if mask.kind == 'bits':
+        flags = sum(1 << bit for bit in mask.values)
+        return image.select(mask.band).bitwiseAnd(flags).eq(0)
+    if mask.kind == 'classes':
+        return image.select(mask.band).remap(list(mask.values), [0] * len(mask.values), 1)
+    if mask.kind == 'probability':
+        return ee.Image(image.get(mask.collection)).select(mask.band).lt(mask.values)
+    raise ValueError(f"Invalid cloud mask kind: {mask.kind}.")
+
+
+def prepare_collection(collection, mask, region, start_date, end_date):
+    """Joins the images a CloudMask needs to an ee.ImageCollection; other masks need nothing.
+
+    Each image of collection gets the matching image (same system:index) of mask.collection
+    as a property named after that collection.
+
+    Arguments
+    ----------
+    collection : ee.ImageCollection
+        Filtered collection.
+    mask : CloudMask
+        Cloud mask, or None.
+    region : ee.Geometry
+        Region the collection is filtered to.
+    start_date : str
+        Start date of the collection (format: 'YYYY-MM-DD').
+    end_date : str
+        End date of the collection (format: 'YYYY-MM-DD').
+
+    Returns
+    ----------
+    ee.ImageCollection
+    """
+    import ee
+
+    if mask is None or mask.kind != 'probability':
+        return collection
+    probability = ee.ImageCollection(mask.collection).filterBounds(region).filterDate(start_date, end_date)
+    join = ee.Join.saveFirst(mask.collection)
+    condition = ee.Filter.equals(leftField='system:index', rightField='system:index')
+    return ee.ImageCollection(join.apply(collection, probability, condition))
+
+
+class IndexDefinition:
+    """
+    A spectral index defined by a formula over band roles.
+
+    Attributes
+    ----------
+    name : str
+        Upper-case index name, also the name of the band it adds.
+    expression : str
+        Formula in Python/Earth Engine expression syntax (+, -, *, /, ** and numbers).
+    roles : tuple
+        Band roles used by the formula, in order of first use.
+    bands : dict
+        Band name overrides by collection and role, for roles that are not in the sensor mapping.
+    """
+    _OPERATORS = {ast.Add: 'add', ast.Sub: 'subtract', ast.Mult: 'multiply', ast.Div: 'divide', ast.Pow: 'power'}
+
+    def __init__(self, name, expression, bands=None):
+        """Parses and validates the formula.
+
+        Arguments
+        ----------
+        name : str
+            Index name.
+        expression : str
+            Formula over band roles, such as '(nir - red) / (nir + red)'.
+        bands : dict, optional
+            Band name overrides by collection and role, such as {'Sentinel': {'re1': 'B5'}}.
+
+        Raises
+        ----------
+        ValueError: If the formula uses unsupported syntax.
+        """
+        self.name = name.upper()
+        self.expression = expression
+        self.bands = bands or {}
+        try:
+            self._tree = ast.parse(expression, mode='eval').body
+        except SyntaxError as error:
+            raise ValueError(f"Invalid formula of {self.name}: {expression}") from error
+        roles = []
+        for node in ast.walk(self._tree):
+            if isinstance(node, ast.Name):
+                if node.id not in roles:
+                    roles.append(node.id)
+            elif isinstance(node, ast.BinOp):
+                if type(node.op) not in self._OPERATORS:
+                    raise ValueError(f"Unsupported operator in formula of {self.name}: {expression}")
+            elif isinstance(node, ast.UnaryOp):
+                if not isinstance(node.op, (ast.USub, ast.UAdd)):
+                    raise ValueError(f"Unsupported operator in formula of {self.name}: {expression}")
+            elif isinstance(node, ast.Constant):
+                if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+                    raise ValueError(f"Unsupported constant in formula of {self.name}: {expression}")
+            elif not isinstance(node, (ast.Load, ast.operator, ast.unaryop)):
+                raise ValueError(f"Unsupported syntax in formula of {self.name}: {expression}")
+        self.roles = tuple(roles)
+
+    def __repr__(self):
+        return f"IndexDefinition({self.name!r}, {self.expression!r})"
+
+    def band_names(self, collection_id):
+        """Returns the band name of every role for a collection.
+
+        Raises
+        ----------
+        ValueError: If the collection has no band for a role.
+        """
+        mapping = dict(sensor(collection_id).bands)
+        mapping.update(self.bands.get(collection_id, {}))
+        missing = [role for role in self.roles if role not in mapping]
+        if missing:
+            raise ValueError(f"{self.name} is not available for {collection_id}: no band for {', '.join(missing)}.")
+        return {role: mapping[role] for role in self.roles}
+
+    def evaluate(self, **inputs):
+        """Evaluates the formula on numbers or arrays, with temporaries; used as a reference."""
+        def visit(node):
+            if isinstance(node, ast.Name):
+                return inputs[node.id]
+            if isinstance(node, ast.Constant):
+                return node.value
+            if isinstance(node, ast.UnaryOp):
+                return -visit(node.operand) if isinstance(node.op, ast.USub) else visit(node.operand)
+            left, right = visit(node.left), visit(node.right)
+            return {'add': lambda: left + right, 'subtract': lambda: left - right,
+                    'multiply': lambda: left * right, 'divide': lambda: left / right,
+                    'power': lambda: left ** right}[self._OPERATORS[type(node.op)]]()
+        return visit(self._tree)
+
+    @functools.cached_property
+    def kernel(self):
+        """The formula compiled into in-place NumPy operations.
+
+        A tuple of a function kernel(inputs, out, scratch), where inputs holds float32
+        arrays by role and scratch is a list of float32 buffers, and the number of
+        scratch buffers it needs. The inputs are not modified.
+        """
+        import numpy as np
+
+        steps = []
+        free = []
+        count = [0]
+
+        def temporary():
+            if free:
+                return free.pop()
+            count[0] += 1
+            return ('scratch', count[0] - 1)
+
+        def visit(node, root=False):
+            if isinstance(node, ast.Name):
+                operand = ('input', node.id)
+            elif isinstance(node, ast.Constant):
+                operand = ('constant', np.float32(node.value))
+            elif isinstance(node, ast.UnaryOp):
+                value = visit(node.operand)
+                if isinstance(node.op, ast.UAdd) or value[0] == 'constant':
+                    operand = value if isinstance(node.op, ast.UAdd) else ('constant', -value[1])
+                else:
+                    target = ('out',) if root else value if value[0] == 'scratch' else temporary()
+                    steps.append((np.negative, (value,), target))
+                    return target
+            else:
+                left, right = visit(node.left), visit(node.right)
+                function = getattr(np, self._OPERATORS[type(node.op)])
+                if left[0] == right[0] == 'constant':
+                    operand = ('constant', np.float32(function(left[1], right[1])))
+                else:
+                    operands = (left, right)
+                    held = [value for value in operands if value[0] == 'scratch']
+                    target = ('out',) if root else held[0] if held else temporary()
+                    free.extend(value for value in held if value != target)
+                    steps.append((function, operands, target))
+                    return target
+            if root:
+                steps.append((np.copyto, (operand,), ('out',)))
+                return ('out',)
+            return operand
+
+        visit(self._tree, root=True)
+        steps = tuple(steps)
+
+        def kernel(inputs, out, scratch):
+            def resolve(value):
+                kind = value[0]
+                if kind == 'input':
+                    return inputs[value[1]]
+                if kind == 'scratch':
+                    return scratch[value[1]]
+                if kind == 'out':
+                    return out
+                return value[1]
+
+            for function, operands, target in steps:
+                if function is np.copyto:
+                    np.copyto(resolve(target), resolve(operands[0]))
+                else:
+                    function(*(resolve(value) for value in operands), out=resolve(target))
+
+        return kernel, count[0]
+
+
+def register(name, expression, bands=None):
+    """Registers a spectral index, replacing an existing definition of the same name.
+
+    Arguments
+    ----------
+    name : str
+        Index name, such as 'NDRE'.
+    expression : str
+        Formula over band roles, such as '(nir - re1) / (nir + re1)'.
+    bands : dict, optional
+        Band name overrides by collection and role, for roles the sensors do not map.
+
+    Returns
+    ----------
+    IndexDefinition
+    """
+    definition = IndexDefinition(name, expression, bands)
+    INDICES[definition.name] = definition
+    image_function.cache_clear()
+    graph.clear()
+    return definition
+
+
+def get(name):
+    """Returns the IndexDefinition of an index name.
+
+    Raises
+    ----------
+    ValueError: If the index is not registered.
+    """
+    if name.upper() not in INDICES:
+        raise ValueError(f"Invalid index: {name}. Supported indices: {', '.join(INDICES)}.")
+    return INDICES[name.upper()]
+
+
+def required_bands(indices, collection_id):
+    """Returns the band names needed for the given indices, in order of first use."""
+    names = []
+    for index in indices:
+        for band in get(index).band_names(collection_id).values():
+            if band not in names:
+                names.append(band)
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def image_function(indices, collection_id, mask=None):
+    """Returns a function that adds all given index bands to an image in one step.
+
+    Every band is scaled to surface reflectance once and shared by all formulas,
+    the cloud mask is applied to all index bands at once, and the index bands are
+    added with a single addBands, so mapping the function over a collection adds
+    one node per image regardless of the number of indices. The function is built
+    once per combination of indices, collection and mask.
+
+    Arguments
+    ----------
+    indices : tuple
+        Index names.
+    collection_id : str
+        Registered collection.
+    mask : str, optional
+        Name of a cloud mask of the collection (see cloud_mask()). Masks of kind
+        'probability' need a collection prepared with prepare_collection().
+
+    Returns
+    ----------
+    function
+        Maps an ee.Image to the image with the index bands added (or overwritten).
+    """
+    import ee
+
+    definitions = [get(index) for index in indices]
+    band_names = [definition.band_names(collection_id) for definition in definitions]
+    scaling = sensor(collection_id)
+    clouds = cloud_mask(collection_id, mask)
+
+    def add_indices(image):
+        scaled = {}
+        for mapping in band_names:
+            for band in mapping.values():
+                if band not in scaled:
+                    scaled[band] = reflectance(image.select(band), scaling)
+        bands = [image.expression(definition.expression, {role: scaled[band] for role, band in mapping.items()})
+                 .rename(definition.name)
+                 for definition, mapping in zip(definitions, band_names)]
+        bands = bands[0] if len(bands) == 1 else ee.Image.cat(bands)
+        if clouds is not None:
+            bands = bands.updateMask(clear_sky(image, clouds))
+        return image.addBands(bands, None, True)
+
+    return add_indices
+
+
+@functools.lru_cache(maxsize=None)
+def harmonize_function(collection_id, mask=None):
+    """Returns a function that maps an image of a sensor onto the common reflectance roles.
+
+    The function scales the bands of HARMONIZATION to surface reflectance, applies the
+    linear cross-sensor adjustment and the cloud mask, and renames the bands to their roles
+    (blue, green, red, nir, swir1, swir2). The result keeps system:time_start and
+    system:index and gets the collection identifier as property 'Sensor'.
+
+    Arguments
+    ----------
+    collection_id : str
+        A collection of HARMONIZATION, such as 'Sentinel' or 'Landsat'.
+    mask : str, optional
+        Name of a cloud mask of the collection (see cloud_mask()).
+
+    Returns
+    ----------
+    function
+        Maps an ee.Image to the harmonized ee.Image.
+
+    Raises
+    ----------
+    ValueError: If the collection cannot be harmonized.
+    """
+    import ee
+
+    if collection_id not in HARMONIZATION:
+        raise ValueError(f"Invalid collection: {collection_id}. Collections that can be merged: {', '.join(HARMONIZATION)}.")
+    scaling = sensor(collection_id)
+    clouds = cloud_mask(collection_id, mask)
+    roles = HARMONIZATION[collection_id]
+
+    def harmonize(image):
+        bands = []
+        for role, (band, slope, intercept) in roles.items():
+            band = reflectance(image.select(band), scaling)
+            if slope != 1:
+                band = band.multiply(slope)
+            if intercept:
+                band = band.add(intercept)
+            bands.append(band.rename(role))
+        harmonized = ee.Image.cat(bands)
+        if clouds is not None:
+            harmonized = harmonized.updateMask(clear_sky(image, clouds))
+        harmonized = harmonized.copyProperties(image, ['system:time_start', 'system:index'])
+        return ee.Image(harmonized).set('Sensor', collection_id)
+
+    return harmonize
+
+
+def reflectance(band, scaling):
+    """Scales an ee.Image of digital numbers to surface reflectance with the scale and offset of a Sensor."""
+    if scaling.scale != 1:
+        band = band.multiply(scaling.scale)
+    if scaling.offset:
+        band = band.add(scaling.offset)
+    return band
+
+
+# Sentinel-2 scene classification: saturated, cloud shadow, cloud medium and high probability, cirrus.
+# QA60 is empty for scenes processed since 2022-01-25, so 'scl' is the default.
+register_sensor('Sentinel', {'blue': 'B2', 'green': 'B3', 'red': 'B4', 'nir': 'B8', 'swir1': 'B11', 'swir2': 'B12'},
+                scale=0.0001, nodata=0,
+                masks={'scl': CloudMask('classes', 'SCL', (1, 3, 8, 9, 10), None),
+                       'qa': CloudMask('bits', 'QA60', (10, 11), None),
+                       'probability': CloudMask('probability', 'probability', 40, 'COPERNICUS/S2_CLOUD_PROBABILITY')})
+# Landsat Collection 2 QA_PIXEL: dilated cloud, cirrus, cloud, cloud shadow
+register_sensor('Landsat', {'blue': 'SR_B2', 'green': 'SR_B3', 'red': 'SR_B4', 'nir': 'SR_B5', 'swir1': 'SR_B6',
+                            'swir2': 'SR_B7'},
+                scale=0.0000275, offset=-0.2, nodata=0,
+                masks={'qa': CloudMask('bits', 'QA_PIXEL', (1, 2, 3, 4), None)})
+# Harmonized images of several sensors: bands are named after their roles and hold reflectance
+register_sensor('Merged', {role: role for role in HARMONIZATION['Landsat']})
+
+register('NDVI', '(nir - red) / (nir + red)')
+register('EVI', '2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)')
+register('NDWI', '(green - nir) / (green + nir)')
+register('SAVI', '1.5 * (nir - red) / (nir + red + 0.5)')
+register('NBR', '(nir - swir2) / (nir + swir2)')
@@ -0,0 +1,351 @@
+"""
+This script includes the plot rendering of GeoIndexity.
+
+pyplot keeps every figure in a global registry and creates a new figure,
+axes and lines for every plot, which is slow for thousands of series and
+leaks figures that are not closed. SeriesRenderer instead draws on one
+matplotlib Figure with an Agg canvas and no pyplot state, and reuses its
+axes and lines: rendering another series only replaces the line data.
+Dates are plotted as datetime64 values, and series longer than max_points
+are decimated to the minimum and maximum of each bucket, which keeps peaks
+and dips. render_batch() renders many series into PNG files across a
+process pool, or into one multipage PDF.
+"""
+
+import os
+import re
+import threading
+
+from . import instrumentation
+
+# Points per line above which a series is decimated
+MAX_POINTS = 2000
+
+# Size in inches and resolution of the figures, and the y ticks of index values
+FIGSIZE = (10, 5)
+DPI = 100
+YTICKS = (-1.0, -0.5, 0.0, 0.5)
+
+_local = threading.local()
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    """Reduces a series to at most max_points points, keeping the extremes.
+
+    The series is split into max_points // 2 buckets, and the minimum and maximum
+    of each bucket are kept in their original order. Missing values are ignored
+    unless a whole bucket is missing.
+
+    Arguments
+    ----------
+    x : numpy.ndarray
+        Sorted x values, such as dates.
+    y : numpy.ndarray
+        Values.
+    max_points : int
+        Maximum number of points (default: MAX_POINTS).
+
+    Returns
+    ----------
+    tuple
+        The decimated x and y arrays; the inputs if they are short enough.
+    """
+    import numpy as np
+
+    size = len(y)
+    if size <= max_points:
+        return x, y
+    buckets = max(1, max_points // 2)
+    width = -(-size // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:size] = y
+    padded = padded.reshape(buckets, width)
+    missing = np.isnan(padded)
+    low = np.where(missing, np.inf, padded).argmin(axis=1)
+    high = np.where(missing, -np.inf, padded).argmax(axis=1)
+    offsets = np.arange(buckets) * width
+    index = np.unique(np.concatenate([offsets + low, offsets + high]))
+    index = index[index < size]
+    return x[index], y[index]
+
+
+def series_arrays(df, columns=None, max_points=MAX_POINTS):
+    """Extracts decimated line data from a reduced time-series.
+
+    Arguments
+    ----------
+    df : DataFrame
+        Time-series with a Date column, such as the df attribute of Geoindexity.
+    columns : list, optional
+        Value columns (default: all numeric columns except Date).
+    max_points : int
+        Maximum number of points per line (default: MAX_POINTS).
+
+    Returns
+    ----------
+    dict
+        (dates as datetime64[ms], values as float64) by column, sorted by date.
+    """
+    import numpy as np
+
+    if columns is None:
+        columns = [column for column in df.columns if column != 'Date' and df[column].dtype.kind in 'biuf']
+    df = df.sort_values(by='Date')
+    dates = df['Date'].to_numpy(dtype='datetime64[ms]')
+    arrays = {}
+    for column in columns:
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        arrays[column] = decimate(dates, values, max_points)
+    return arrays
+
+
+def series_title(columns, name=None):
+    """Returns the title of a plot of the given columns, prefixed by the series name."""
+    if not columns:
+        title = 'No data'
+    elif len(columns) == 1:
+        title = f"{columns[0].replace('_', ' ')} Time Series"
+    else:
+        title = 'Index Time Series'
+    return title if name is None else f'{name}: {title}'
+
+
+class SeriesRenderer:
+    """
+    Draws index time-series on a reused figure.
+
+    Attributes
+    ----------
+    figure : matplotlib.figure.Figure
+        The figure drawn on.
+    ax : matplotlib.axes.Axes
+        Axes of the lines.
+    max_points : int
+        Maximum number of points per line.
+    """
+    def __init__(self, figure=None, figsize=FIGSIZE, dpi=DPI, max_points=MAX_POINTS, yticks=YTICKS):
+        """Initializes the figure, axes and static decorations.
+
+        Arguments
+        ----------
+        figure : matplotlib.figure.Figure, optional
+            Figure to draw on, such as a pyplot figure for interactive display
+            (default: a new figure with an Agg canvas).
+        figsize : tuple
+            Size of a new figure in inches (default: FIGSIZE).
+        dpi : float
+            Resolution of a new figure (default: DPI).
+        max_points : int
+            Maximum number of points per line (default: MAX_POINTS).
+        yticks : tuple
+            Ticks of the y axis, or None for automatic ticks (default: YTICKS).
+        """
+        if figure is None:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+
+            figure = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.max_points = max_points
+        self.ax = figure.add_subplot()
+        self.ax.xaxis_date()
+        self.ax.set_xlabel('Date')
+        self.ax.tick_params(axis='x', labelrotation=45)
+        # Room for the rotated date labels, which a fixed layout does not reserve
+        figure.subplots_adjust(bottom=0.2)
+        if yticks is not None:
+            self.ax.set_yticks(yticks)
+        self.ax.grid(True)
+        self._lines = {}
+
+    def draw(self, df, columns=None, title=None):
+        """Draws a reduced time-series.
+
+        Arguments
+        ----------
+        df : DataFrame
+            Time-series with a Date column.
+        columns : list, optional
+            Value columns (default: all numeric columns except Date).
+        title : str, optional
+            Plot title (default: see series_title()).
+
+        Returns
+        ----------
+        matplotlib.figure.Figure
+        """
+        return self.draw_arrays(series_arrays(df, columns, self.max_points), title)
+
+    def draw_arrays(self, arrays, title=None):
+        """Draws line data of series_arrays(), updating the existing lines.
+        Without columns, such as for an empty reduction, the figure is drawn without lines.
+
+        Returns
+        ----------
+        matplotlib.figure.Figure
+        """
+        import matplotlib.dates as mdates
+
+        columns = list(arrays)
+        for column, line in self._lines.items():
+            if column not in arrays:
+                line.set_visible(False)
+                line.set_label(f'_{column}')
+        for column, (dates, values) in arrays.items():
+            line = self._lines.get(column)
+            if line is None:
+                line, = self.ax.plot([], [], marker='o', linestyle='--')
+                self._lines[column] = line
+            line.set_data(mdates.date2num(dates) if len(dates) else [], values)
+            line.set_label(column.replace('_', ' '))
+            line.set_visible(True)
+
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        self.ax.set_title(title or series_title(columns))
+        self.ax.set_ylabel(columns[0].replace('_', ' ') if len(columns) == 1 else 'Index value')
+        legend = self.ax.get_legend()
+        if len(columns) > 1:
+            self.ax.legend()
+        elif legend is not None:
+            legend.remove()
+        return self.figure
+
+    def save(self, path, **kwargs):
+        """Writes the figure to a file; the format follows the extension of path.
+
+        Arguments
+        ----------
+        path : str
+            Output file, or a file object with format=... in kwargs.
+        **kwargs
+            Further keyword arguments of Figure.savefig, such as format or dpi.
+        """
+        self.figure.savefig(path, **kwargs)
+
+
+def _renderer(options):
+    """Returns the SeriesRenderer of the current thread for the given keyword arguments.
+    It is created on first use and again whenever the options change.
+    """
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None or getattr(_local, 'options', None) != options:
+        renderer = _local.renderer = SeriesRenderer(**options)
+        _local.options = options
+    return renderer
+
+
+def render_series(df, path, columns=None, title=None, **kwargs):
+    """Renders a reduced time-series into a file with the renderer of the current thread.
+
+    The renderer has the default figure size and resolution, also in a thread that
+    rendered a batch with other settings before.
+
+    Arguments
+    ----------
+    df : DataFrame
+        Time-series with a Date column.
+    path : str
+        Output file, such as 'plot.png'.
+    columns : list, optional
+        Value columns (default: all numeric columns except Date).
+    title : str, optional
+        Plot title (default: see series_title()).
+    **kwargs
+        Further keyword arguments of Figure.savefig.
+
+    Returns
+    ----------
+    str
+        path.
+    """
+    renderer = _renderer({})
+    renderer.draw(df, columns, title)
+    renderer.save(path, **kwargs)
+    return path
+
+
+def _render_job(job):
+    """Renders one series of render_batch() in a worker; job is (path, title, arrays, options)."""
+    path, title, arrays, options = job
+    renderer = _renderer(options)
+    renderer.draw_arrays(arrays, title)
+    renderer.save(path)
+    return path
+
+
+def render_batch(series, directory=None, pdf=None, columns=None, processes=None, max_points=MAX_POINTS,
+                 figsize=FIGSIZE, dpi=DPI, chunksize=8):
+    """Renders many time-series into PNG files or one multipage PDF.
+
+    The series are decimated in the calling process, so only the line data is sent
+    to the workers. PNG files are rendered across a process pool, in which every
+    worker reuses one figure. A PDF is written page by page with a single figure in
+    the calling process, since the pages of one file cannot be written concurrently.
+
+    Arguments
+    ----------
+    series : dict
+        DataFrames with a Date column, or Geoindexity objects, by name.
+    directory : str, optional
+        Directory of the PNG files, named after the series. Either directory or pdf is needed.
+    pdf : str, optional
+        Path of the multipage PDF with one page per series.
+    columns : list, optional
+        Value columns (default: all numeric columns except Date).
+    processes : int, optional
+        Number of worker processes for PNG files (default: os.cpu_count()); 1 renders in
+        the calling process.
+    max_points : int
+        Maximum number of points per line (default: MAX_POINTS).
+    figsize : tuple
+        Figure size in inches (default: FIGSIZE).
+    dpi : float
+        Resolution (default: DPI).
+    chunksize : int
+        Series sent to a worker at once (default: 8).
+
+    Returns
+    ----------
+    list
+        Paths of the PNG files, or [pdf].
+
+    Raises
+    ----------
+    ValueError
+        If neither or both of directory and pdf are given.
+    """
+    if (directory is None) == (pdf is None):
+        raise ValueError('Give either a directory for PNG files or a pdf path.')
+    options = {'figsize': tuple(figsize), 'dpi': dpi, 'max_points': max_points}
+
+    def jobs():
+        for name, item in series.items():
+            df = getattr(item, 'df', item)
+            if df is None:
+                raise ValueError(f"Time-series {name} not reduced yet. Use reducer function based on your selected Index")
+            arrays = series_arrays(df, columns, max_points)
+            path = None if directory is None else \
+                os.path.join(directory, re.sub(r'[^A-Za-z0-9.,;_-]', '_', str(name)) + '.png')
+            yield path, series_title(list(arrays), name), arrays, options
+
+    with instrumentation.span('render_batch', series=len(series), pdf=pdf is not None):
+        if pdf is not None:
+            from matplotlib.backends.backend_pdf import PdfPages
+
+            renderer = SeriesRenderer(**options)
+            with PdfPages(pdf) as pages:
+                for _, title, arrays, _ in jobs():
+                    pages.savefig(renderer.draw_arrays(arrays, title))
+            return [pdf]
+
+        os.makedirs(directory, exist_ok=True)
+        processes = processes or os.cpu_count() or 1
+        if processes <= 1:
+            return [_render_job(job) for job in jobs()]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return list(pool.map(_render_job, jobs(), chunksize=chunksize))
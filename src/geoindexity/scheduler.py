@@ -0,0 +1,277 @@
+"""
+This script includes the request scheduler used for all Earth Engine server calls.
+
+Every getInfo() of GeoIndexity goes through a RequestExecutor. The executor
+runs requests on a thread pool, limits the number of requests in flight,
+retries throttled or timed out requests with exponential backoff and jitter,
+and records the latency of every request. Every request runs in a 'getInfo'
+span of geoindexity.instrumentation. A module-level default executor is
+created on first use and replaced in forked child processes.
+"""
+
+import asyncio
+import collections
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from . import instrumentation
+
+# Error messages of Earth Engine that are worth retrying
+RETRYABLE_MESSAGES = (
+    'too many concurrent aggregations',
+    'too many requests',
+    'computation timed out',
+    'quota exceeded',
+    'rate limit',
+    'service unavailable',
+    'deadline exceeded',
+    'internal error',
+    '429',
+    '503',
+)
+
+# Error messages of Earth Engine that ask for a smaller request
+TOO_LARGE_MESSAGES = (
+    'too many elements',
+    'collection query aborted after accumulating over',
+    'user memory limit exceeded',
+    'computation timed out',
+    'response size exceeds',
+    'payload size exceeds',
+)
+
+RequestRecord = collections.namedtuple('RequestRecord', ['name', 'latency', 'attempts', 'error'])
+
+
+def is_retryable(error):
+    """Returns True if an error is a temporary Earth Engine or network error.
+
+    Arguments
+    ----------
+    error : Exception
+        Error raised by a server call.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in RETRYABLE_MESSAGES)
+
+
+def is_too_large(error):
+    """Returns True if an error means that a request has to be split into smaller ones.
+
+    Arguments
+    ----------
+    error : Exception
+        Error raised by a server call.
+    """
+    message = str(error).lower()
+    return any(text in message for text in TOO_LARGE_MESSAGES)
+
+
+def is_retryable_as_is(error):
+    """Returns True if an error is temporary and splitting the request would not help."""
+    return is_retryable(error) and not is_too_large(error)
+
+
+class RequestExecutor:
+    """
+    Runs Earth Engine server calls concurrently, with retries and latency records.
+
+    Attributes
+    ----------
+    max_workers : int
+        Number of threads of the pool.
+    max_in_flight : int
+        Maximum number of requests executed at the same time.
+    max_retries : int
+        Maximum number of retries of a single request.
+    base_delay : float
+        Backoff in seconds before the first retry; doubled for every further retry.
+    max_delay : float
+        Upper bound of the backoff in seconds.
+    records : collections.deque
+        RequestRecord of the latest requests (name, latency in seconds, attempts, error).
+    """
+    def __init__(self, max_workers=8, max_in_flight=None, max_retries=5, base_delay=1.0, max_delay=60.0,
+                 history=10000):
+        """Initializes the executor.
+
+        Arguments
+        ----------
+        max_workers : int
+            Number of threads of the pool (default: 8).
+        max_in_flight : int, optional
+            Maximum number of requests executed at the same time (default: max_workers).
+        max_retries : int
+            Maximum number of retries of a single request (default: 5).
+        base_delay : float
+            Backoff in seconds before the first retry (default: 1.0).
+        max_delay : float
+            Upper bound of the backoff in seconds (default: 60.0).
+        history : int
+            Number of request records kept (default: 10000).
+        """
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.records = collections.deque(maxlen=history)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geoindexity')
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._retries = 0
+
+    def backoff(self, attempt):
+        """Returns the delay in seconds before the given retry, with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _run(self, request, name, retryable, parent=None):
+        """Executes a request in a worker thread until it succeeds or may not be retried."""
+        with instrumentation.span('getInfo', parent, request=name) as span:
+            if span.enabled:
+                span.set(payload_bytes=instrumentation.payload_bytes(request) if hasattr(request, 'getInfo') else None)
+            attempt = 0
+            start = time.perf_counter()
+            while True:
+                with self._slots:
+                    try:
+                        result = request.getInfo() if hasattr(request, 'getInfo') else request()
+                    except Exception as error:
+                        if attempt >= self.max_retries or not retryable(error):
+                            self._record(name, start, attempt + 1, error)
+                            span.set(retries=attempt)
+                            raise
+                    else:
+                        self._record(name, start, attempt + 1, None)
+                        if span.enabled:
+                            span.set(retries=attempt, response_bytes=instrumentation.payload_bytes(result))
+                        return result
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                with self._lock:
+                    self._retries += 1
+
+    def _record(self, name, start, attempts, error):
+        self.records.append(RequestRecord(name, time.perf_counter() - start, attempts,
+                                          None if error is None else repr(error)))
+
+    def submit(self, request, name=None, retryable=is_retryable):
+        """Submits a request to the thread pool.
+
+        Arguments
+        ----------
+        request
+            An Earth Engine object whose getInfo() is called, or a callable without arguments.
+        name : str, optional
+            Name of the request in the records.
+        retryable : function
+            Decides whether an error is retried (default: is_retryable).
+
+        Returns
+        ----------
+        concurrent.futures.Future
+            Future of the request result.
+        """
+        return self._pool.submit(self._run, request, name or type(request).__name__, retryable,
+                                 instrumentation.current())
+
+    def get_info(self, request, name=None, retryable=is_retryable):
+        """Executes a request and waits for its result. See submit() for the arguments."""
+        return self.submit(request, name, retryable).result()
+
+    def map(self, requests, name=None, retryable=is_retryable):
+        """Executes several requests concurrently and returns their results in order.
+
+        Raises the error of the first failed request in order, after all requests have finished.
+        """
+        futures = [self.submit(request, name, retryable) for request in requests]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    async def aget_info(self, request, name=None, retryable=is_retryable):
+        """Asynchronous version of get_info() for use with asyncio."""
+        return await asyncio.wrap_future(self.submit(request, name, retryable))
+
+    async def agather(self, requests, name=None, retryable=is_retryable):
+        """Asynchronous version of map() for use with asyncio."""
+        return await asyncio.gather(*(self.aget_info(request, name, retryable) for request in requests))
+
+    def stats(self):
+        """Summarizes the recorded requests.
+
+        Returns
+        ----------
+        dict
+            Number of requests, errors and retries, and mean, median, 95th percentile
+            and maximum latency in seconds.
+        """
+        records = list(self.records)
+        latencies = sorted(record.latency for record in records)
+        summary = {
+            'requests': len(records),
+            'errors': sum(record.error is not None for record in records),
+            'retries': self._retries,
+        }
+        if latencies:
+            summary.update({
+                'latency_mean': statistics.fmean(latencies),
+                'latency_median': statistics.median(latencies),
+                'latency_p95': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+                'latency_max': latencies[-1],
+            })
+        return summary
+
+    def shutdown(self, wait=True):
+        """Shuts the thread pool down."""
+        self._pool.shutdown(wait=wait)
+
+
+_default = None
+_default_options = {}
+_default_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Sets the options of the default executor, see RequestExecutor for the keywords.
+
+    The current default executor is shut down; a new one is created on next use.
+    """
+    global _default
+    with _default_lock:
+        _default_options.clear()
+        _default_options.update(kwargs)
+        if _default is not None:
+            _default.shutdown(wait=False)
+        _default = None
+
+
+def get_executor():
+    """Returns the default executor, creating it on first use."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = RequestExecutor(**_default_options)
+    return _default
+
+
+def get_info(request, name=None, retryable=is_retryable):
+    """Executes a request on the default executor and waits for its result."""
+    return get_executor().get_info(request, name, retryable)
+
+
+def _reset_after_fork():
+    """Drops the default executor of the parent; thread pools do not survive a fork."""
+    global _default, _default_lock
+    _default = None
+    _default_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,93 @@
+"""
+This script handles the Earth Engine session used by GeoIndexity.
+
+Importing GeoIndexity does not contact Google Earth Engine (GEE). The
+session is initialized on the first call that actually needs the server,
+using the project and credentials given to configure(). Initialization is
+guarded by a lock so that concurrent threads initialize only once, and it
+is reset in forked child processes so that every worker opens its own
+connection.
+"""
+
+import os
+import threading
+
+import ee
+
+_lock = threading.Lock()
+_initialized = False
+_forked = False
+_settings = {}
+
+
+def configure(project=None, credentials='persistent', **kwargs):
+    """Sets the options used to initialize Earth Engine.
+
+    The session is not initialized here; it is (re-)initialized with the new
+    options on the next call that needs the server.
+
+    Arguments
+    ----------
+    project : str, optional
+        Google Cloud project used for Earth Engine requests. Falls back to
+        the GEOINDEXITY_PROJECT environment variable.
+    credentials : optional
+        OAuth2 credentials passed to ee.Initialize (default: 'persistent').
+    **kwargs
+        Further keyword arguments for ee.Initialize, such as url or http_transport.
+    """
+    global _initialized
+    with _lock:
+        _settings.clear()
+        _settings.update(kwargs)
+        _settings['credentials'] = credentials
+        if project is not None:
+            _settings['project'] = project
+        _initialized = False
+
+
+def is_initialized():
+    """Returns True if the Earth Engine session has been initialized."""
+    return _initialized
+
+
+def ensure_initialized():
+    """Initializes Earth Engine once, on first use.
+
+    Does nothing if the session is already initialized, either by GeoIndexity
+    or by an earlier call to ee.Initialize() from user code. A forked child
+    process always initializes its own session.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        if not _settings and not _forked and ee.data.is_initialized():
+            _initialized = True
+            return
+        settings = dict(_settings)
+        if 'project' not in settings and os.environ.get('GEOINDEXITY_PROJECT'):
+            settings['project'] = os.environ['GEOINDEXITY_PROJECT']
+        ee.Initialize(**settings)
+        _initialized = True
+
+
+def reset():
+    """Marks the session as uninitialized so that the next server call initializes it again."""
+    global _initialized
+    with _lock:
+        _initialized = False
+
+
+def _reset_after_fork():
+    """Gives a forked child process a fresh lock and an uninitialized session."""
+    global _lock, _initialized, _forked
+    _lock = threading.Lock()
+    _initialized = False
+    _forked = True
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,754 @@
+"""
+This script includes offline stand-ins for the Earth Engine API used by the tests.
+
+They let GeoIndexity be imported, benchmarked and exercised without a
+Google Earth Engine (GEE) account or network access.
+"""
+
+import collections
+import contextlib
+import hashlib
+import inspect
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def install_stub_ee():
+    """Installs a minimal stub module as ee in sys.modules.
+
+    The stub only provides ee.Initialize, which it counts, and ee.data.is_initialized,
+    which is enough to import GeoIndexity and check that importing it has no
+    side effects. It cannot evaluate anything.
+
+    Returns
+    ----------
+    types.ModuleType
+        The stub module. Its initialize_calls attribute counts ee.Initialize calls.
+    """
+    stub = types.ModuleType('ee')
+    stub.initialize_calls = 0
+
+    def Initialize(*args, **kwargs):
+        stub.initialize_calls += 1
+
+    def __getattr__(name):
+        raise AttributeError(f'The stub ee module does not provide ee.{name}.')
+
+    stub.Initialize = Initialize
+    stub.data = types.SimpleNamespace(is_initialized=lambda: stub.initialize_calls > 0)
+    stub.__getattr__ = __getattr__
+    sys.modules['ee'] = stub
+    return stub
+
+
+class ThrottlingError(Exception):
+    """Error raised by FakeBackend, worded like the Earth Engine throttling error."""
+
+
+class FakeRequest:
+    """
+    A stand-in for an Earth Engine object whose getInfo() is served by a FakeBackend.
+
+    Attributes
+    ----------
+    backend : FakeBackend
+        The backend that evaluates the request.
+    value
+        The value returned by getInfo().
+    """
+    def __init__(self, backend, value):
+        self.backend = backend
+        self.value = value
+
+    def getInfo(self):
+        """Evaluates the request on the fake backend."""
+        return self.backend.evaluate(self)
+
+
+class FakeBackend:
+    """
+    A local fake of the Earth Engine server that injects delays and throttling errors.
+
+    Requests beyond the concurrency capacity fail like Earth Engine does with
+    'Too many concurrent aggregations'; a share of the remaining requests fails
+    with a computation timeout.
+
+    Attributes
+    ----------
+    delay : float
+        Seconds every request takes.
+    capacity : int
+        Number of requests the backend evaluates at the same time.
+    timeout_rate : float
+        Share of requests that fail with a computation timeout.
+    calls : int
+        Number of getInfo() calls received.
+    throttled : int
+        Number of requests rejected because of the capacity.
+    timeouts : int
+        Number of requests that failed with a timeout.
+    peak : int
+        Highest number of concurrent requests seen.
+    """
+    def __init__(self, delay=0.01, capacity=4, timeout_rate=0.0, seed=None):
+        self.delay = delay
+        self.capacity = capacity
+        self.timeout_rate = timeout_rate
+        self.calls = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.peak = 0
+        self._active = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def request(self, value=None):
+        """Returns a FakeRequest that evaluates to the given value."""
+        return FakeRequest(self, value)
+
+    def evaluate(self, request):
+        """Evaluates a request, or raises a throttling or timeout error."""
+        with self._lock:
+            self.calls += 1
+            if self._active >= self.capacity:
+                self.throttled += 1
+                raise ThrottlingError('Too many concurrent aggregations.')
+            self._active += 1
+            self.peak = max(self.peak, self._active)
+            timeout = self._random.random() < self.timeout_rate
+        try:
+            time.sleep(self.delay)
+            if timeout:
+                with self._lock:
+                    self.timeouts += 1
+                raise ThrottlingError('Computation timed out.')
+            return request.value
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+class PixelServer:
+    """
+    A local HTTP stand-in for the Earth Engine pixel download endpoint.
+
+    It serves tiles of a band array in NPY or GeoTIFF format (GeoTIFF needs
+    tifffile), like the URLs returned by
+    ee.Image.getDownloadURL(), and rejects requests beyond its capacity with
+    HTTP 429. Use image() to get an object that can be passed to
+    geoindexity.download.download_image() in place of an ee.Image.
+
+    Attributes
+    ----------
+    array : numpy.ndarray
+        Pixels of shape (bands, rows, cols).
+    bands : list
+        Band names.
+    transform : list
+        Affine transform of the upper left pixel.
+    delay : float
+        Seconds every request takes.
+    capacity : int
+        Number of requests served at the same time.
+    requests : int
+        Number of tile requests received.
+    throttled : int
+        Number of requests rejected with HTTP 429.
+    url : str
+        Base URL of the server.
+    """
+    def __init__(self, array, bands, transform=(1.0, 0, 0.0, 0, -1.0, 0.0), delay=0.0, capacity=8):
+        self.array = array
+        self.bands = list(bands)
+        self.transform = list(transform)
+        self.delay = delay
+        self.capacity = capacity
+        self.requests = 0
+        self.throttled = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = server._serve(urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query))
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _serve(self, query):
+        """Returns the status and body of a tile request."""
+        import numpy as np
+
+        with self._lock:
+            self.requests += 1
+            if self._active >= self.capacity:
+                self.throttled += 1
+                return 429, b'Too many requests.'
+            self._active += 1
+        try:
+            time.sleep(self.delay)
+            row, col, height, width = (int(query[key][0]) for key in ('row', 'col', 'height', 'width'))
+            bands = query['bands'][0].split(',')
+            tile = np.zeros((height, width), dtype=[(band, self.array.dtype) for band in bands])
+            window = self.array[:, row:row + height, col:col + width]
+            for band in bands:
+                tile[band][:window.shape[1], :window.shape[2]] = window[self.bands.index(band)]
+            buffer = io.BytesIO()
+            if query.get('format', ['NPY'])[0] == 'GEO_TIFF':
+                import tifffile
+
+                tifffile.imwrite(buffer, np.stack([tile[band] for band in bands], axis=-1))
+            else:
+                np.save(buffer, tile)
+            return 200, buffer.getvalue()
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def image(self):
+        """Returns a stand-in for an ee.Image whose getDownloadURL() points to this server."""
+        return FakeImage(self)
+
+    def close(self):
+        """Stops the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeImage:
+    """
+    A stand-in for an ee.Image that is downloaded from a PixelServer.
+
+    Attributes
+    ----------
+    server : PixelServer
+        The server that serves the pixels.
+    """
+    def __init__(self, server):
+        self.server = server
+
+    def getDownloadURL(self, params):
+        """Returns the URL of the tile described by the crs_transform and dimensions of params."""
+        scale_x, _, x, _, scale_y, y = self.server.transform
+        tile_x, tile_y = params['crs_transform'][2], params['crs_transform'][5]
+        width, height = params['dimensions'].split('x')
+        query = urllib.parse.urlencode({
+            'row': round((tile_y - y) / scale_y), 'col': round((tile_x - x) / scale_x),
+            'height': height, 'width': width, 'bands': ','.join(params['bands']),
+            'format': params.get('format', 'NPY'),
+        })
+        return f'{self.server.url}/pixels?{query}'
+
+
+class FakeTask:
+    """
+    A stand-in for an ee.batch.Task that is run by a FakeTaskBackend.
+
+    Attributes
+    ----------
+    backend : FakeTaskBackend
+        The backend that runs the task.
+    config : dict
+        Keyword arguments of the export.
+    id : str
+        Task id, assigned by start().
+    state : str
+        Earth Engine task state.
+    """
+    def __init__(self, backend, config):
+        self.backend = backend
+        self.config = config
+        self.id = None
+        self.state = 'UNSUBMITTED'
+        self.error_message = None
+        self._polls = 0
+
+    def start(self):
+        """Submits the task to the backend."""
+        self.backend.submit(self)
+
+    def status(self):
+        """Returns the status dictionary of the task."""
+        return self.backend.get_status([self.id])[0]
+
+
+class FakeTaskBackend:
+    """
+    A local fake of the Earth Engine batch task queue.
+
+    It provides ee.batch.Export.image.toDrive, ee.batch.Export.table.toDrive and
+    ee.data.getTaskStatus. Tasks advance one step per status request: they wait
+    in the READY state while capacity tasks are running, run for run_polls
+    requests and then complete, or fail with a share of failure_rate.
+
+    Attributes
+    ----------
+    capacity : int
+        Number of tasks running at the same time.
+    run_polls : int
+        Status requests a task stays in the RUNNING state.
+    failure_rate : float
+        Share of task runs that fail with a temporary error.
+    tasks : list
+        Submitted FakeTask objects.
+    status_calls : int
+        Number of status requests.
+    peak : int
+        Highest number of submitted, unfinished tasks seen.
+    batch : types.SimpleNamespace
+        Stand-in for the ee.batch module.
+    """
+    def __init__(self, capacity=2, run_polls=2, failure_rate=0.0, seed=None):
+        self.capacity = capacity
+        self.run_polls = run_polls
+        self.failure_rate = failure_rate
+        self.tasks = []
+        self.status_calls = 0
+        self.peak = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        exports = types.SimpleNamespace(toDrive=self.export, toCloudStorage=self.export, toAsset=self.export)
+        self.batch = types.SimpleNamespace(Task=FakeTask,
+                                           Export=types.SimpleNamespace(image=exports, table=exports))
+
+    def export(self, **config):
+        """Returns an unstarted FakeTask for the given export arguments."""
+        return FakeTask(self, config)
+
+    def install(self, module):
+        """Installs the backend as the batch and task status API of a (stub) ee module."""
+        module.batch = self.batch
+        module.data.getTaskStatus = self.get_status
+        return module
+
+    def submit(self, task):
+        """Queues a task on the backend."""
+        with self._lock:
+            task.id = f'FAKE{len(self.tasks):06d}'
+            task.state = 'READY'
+            self.tasks.append(task)
+            self.peak = max(self.peak, sum(item.state in ('READY', 'RUNNING') for item in self.tasks))
+
+    def _advance(self):
+        """Moves every task one step forward."""
+        running = [task for task in self.tasks if task.state == 'RUNNING']
+        for task in running:
+            task._polls += 1
+            if task._polls >= self.run_polls:
+                if self._random.random() < self.failure_rate:
+                    task.state, task.error_message = 'FAILED', 'Internal error.'
+                else:
+                    task.state = 'COMPLETED'
+        free = self.capacity - sum(task.state == 'RUNNING' for task in self.tasks)
+        for task in [task for task in self.tasks if task.state == 'READY'][:max(0, free)]:
+            task.state = 'RUNNING'
+
+    def get_status(self, task_ids):
+        """Advances the tasks and returns their status dictionaries, like ee.data.getTaskStatus."""
+        with self._lock:
+            self.status_calls += 1
+            self._advance()
+            tasks = {task.id: task for task in self.tasks}
+            statuses = []
+            for task_id in task_ids:
+                task = tasks.get(task_id)
+                if task is None:
+                    statuses.append({'id': task_id, 'state': 'UNKNOWN'})
+                    continue
+                status = {'id': task.id, 'state': task.state, 'description': task.config.get('description')}
+                if task.error_message is not None:
+                    status['error_message'] = task.error_message
+                statuses.append(status)
+            return statuses
+
+
+# Classes of the fake ee module; all of them build expression graphs
+EE_CLASSES = ('Image', 'ImageCollection', 'Feature', 'FeatureCollection', 'Geometry', 'Filter', 'Reducer', 'Date',
+              'Number', 'List', 'Dictionary', 'String', 'Algorithms', 'Join', 'Element', 'Array', 'Kernel')
+
+_Node = collections.namedtuple('_Node', ['kind', 'name', 'receiver', 'args', 'kwargs'])
+_trace_depth = [0]
+
+
+class _ExpressionType(type):
+    """Metaclass of the fake ee classes; unknown class attributes are static algorithms, such as ee.Image.cat."""
+    def __getattr__(cls, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: cls._call(f'{cls.__name__}.{name}', None, args, kwargs)
+
+
+def _positional_count(function):
+    """Returns the number of arguments without default of a function, at least one."""
+    try:
+        parameters = inspect.signature(function).parameters.values()
+    except (TypeError, ValueError):
+        return 1
+    return max(1, sum(parameter.default is parameter.empty and
+                      parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+                      for parameter in parameters))
+
+
+def _trace(value, base):
+    """Converts the arguments of a call into graph values; Python functions are traced with variables."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_trace(item, base) for item in value)
+    if isinstance(value, dict):
+        return {key: _trace(item, base) for key, item in value.items()}
+    if callable(value) and not isinstance(value, (FakeExpression, type)):
+        names = tuple(f'_VAR_{_trace_depth[0]}_{number}' for number in range(_positional_count(value)))
+        _trace_depth[0] += 1
+        try:
+            body = value(*(base._wrap(_Node('var', name, None, (), {})) for name in names))
+        finally:
+            _trace_depth[0] -= 1
+        return _Node('function', names, None, (_trace(body, base),), {})
+    return value
+
+
+class FakeExpression(metaclass=_ExpressionType):
+    """
+    An object of the fake ee module: a node of an immutable expression graph.
+
+    Constructors, methods and static algorithms of any name add a node; casts
+    such as ee.Image(image) do not, like in the Earth Engine API. Functions
+    passed to map() and other algorithms are traced with placeholder
+    variables. getInfo() sends the serialized graph to the RecordReplayBackend
+    of the module.
+    """
+    _backend = None
+    _base = None
+
+    def __init__(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(args[0], FakeExpression):
+            self._node = args[0]._node
+        else:
+            self._node = _Node('new', type(self).__name__, None, _trace(args, self._base), _trace(kwargs, self._base))
+
+    @classmethod
+    def _wrap(cls, node):
+        expression = cls._base.__new__(cls._base)
+        expression._node = node
+        return expression
+
+    @classmethod
+    def _call(cls, name, receiver, args, kwargs):
+        return cls._wrap(_Node('call', name, receiver, _trace(args, cls._base), _trace(kwargs, cls._base)))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, self, args, kwargs)
+
+    def getInfo(self):
+        """Evaluates the expression on the backend of the fake module."""
+        return self._backend.evaluate(self)
+
+    @property
+    def node(self):
+        """The graph node: kind ('new', 'call', 'var' or 'function'), name, receiver, args and kwargs."""
+        return self._node
+
+
+def serialize(expression):
+    """Serializes the graph of a FakeExpression into JSON.
+
+    Like the Earth Engine serializer, every distinct sub-expression is encoded
+    once and referenced wherever it appears again, so the length of the result
+    is the payload size of a request.
+
+    Arguments
+    ----------
+    expression : FakeExpression
+        The expression to serialize.
+
+    Returns
+    ----------
+    str
+        Compact JSON with the result reference and the table of values.
+    """
+    values = {}
+    references = {}
+    encoded_nodes = {}
+
+    def encode(value):
+        if isinstance(value, FakeExpression):
+            value = value._node
+        if isinstance(value, _Node):
+            if id(value) in encoded_nodes:
+                return encoded_nodes[id(value)]
+            encoded = {'kind': value.kind, 'name': encode(value.name), 'args': encode(value.args),
+                       'kwargs': encode(value.kwargs)}
+            if value.receiver is not None:
+                encoded['receiver'] = encode(value.receiver)
+            text = json.dumps(encoded, sort_keys=True, separators=(',', ':'))
+            if text not in references:
+                references[text] = str(len(references))
+                values[references[text]] = encoded
+            encoded_nodes[id(value)] = {'ref': references[text]}
+            return encoded_nodes[id(value)]
+        if isinstance(value, (list, tuple)):
+            return [encode(item) for item in value]
+        if isinstance(value, dict):
+            return {str(key): encode(item) for key, item in value.items()}
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        return repr(value)
+
+    result = encode(expression)
+    return json.dumps({'result': result, 'values': values}, sort_keys=True, separators=(',', ':'))
+
+
+class RecordReplayBackend:
+    """
+    Answers getInfo() of the fake ee module with recorded responses.
+
+    Requests are keyed by a hash of their serialized expression graph. A request
+    without a recorded response is passed to the responder and its response is
+    recorded; without a responder it fails, which also reveals requests whose
+    graph changed since the recording. Server calls, payload bytes and time are
+    counted in total and per stage.
+
+    Attributes
+    ----------
+    path : str
+        JSON file of the recorded responses, or None.
+    responder : function
+        Returns the response of a FakeExpression that was not recorded, or None.
+    responses : dict
+        Recorded responses as JSON text by request key.
+    calls : int
+        Number of getInfo() calls.
+    payload_bytes : int
+        Total size of the serialized requests.
+    replayed : int
+        Number of requests answered from the recording.
+    recorded : int
+        Number of requests answered by the responder.
+    stages : dict
+        Calls, payload bytes, replayed and recorded requests and seconds by stage name.
+    """
+    def __init__(self, path=None, responder=None):
+        self.path = path
+        self.responder = responder
+        self.responses = {}
+        self.calls = 0
+        self.payload_bytes = 0
+        self.replayed = 0
+        self.recorded = 0
+        self.stages = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                self.responses = json.load(file)['responses']
+
+    def evaluate(self, expression):
+        """Returns the recorded or newly recorded response of an expression."""
+        payload = serialize(expression)
+        key = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        with self._lock:
+            self.calls += 1
+            self.payload_bytes += len(payload)
+            response = self.responses.get(key)
+            if response is not None:
+                self.replayed += 1
+                return json.loads(response)
+        if self.responder is None:
+            raise KeyError(f'No recorded response for request {key[:12]}; record it with a responder.')
+        response = json.dumps(self.responder(expression))
+        with self._lock:
+            self.responses[key] = response
+            self.recorded += 1
+        return json.loads(response)
+
+    def counters(self):
+        """Returns the current calls, payload bytes, replayed and recorded requests."""
+        with self._lock:
+            return {'calls': self.calls, 'payload_bytes': self.payload_bytes,
+                    'replayed': self.replayed, 'recorded': self.recorded}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager that adds the calls, payload bytes and seconds of a block to stages[name]."""
+        before = self.counters()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = self.counters()
+            stage = self.stages.setdefault(name, {'calls': 0, 'payload_bytes': 0, 'replayed': 0, 'recorded': 0,
+                                                  'seconds': 0.0})
+            for key, value in after.items():
+                stage[key] += value - before[key]
+            stage['seconds'] += seconds
+
+    def save(self, path=None):
+        """Writes the recorded responses to a JSON file (default: path)."""
+        path = path or self.path
+        with open(path, 'w') as file:
+            json.dump({'responses': self.responses}, file, indent=1, sort_keys=True)
+
+
+def fake_ee_module(backend, tasks=None):
+    """Returns a fake ee module whose objects build expression graphs.
+
+    Arguments
+    ----------
+    backend : RecordReplayBackend
+        Answers getInfo().
+    tasks : FakeTaskBackend, optional
+        Provides ee.batch and ee.data.getTaskStatus (default: a new FakeTaskBackend).
+
+    Returns
+    ----------
+    types.ModuleType
+        The module, with initialize_calls counting ee.Initialize calls.
+    """
+    tasks = tasks or FakeTaskBackend()
+    module = types.ModuleType('ee')
+    base = _ExpressionType('ComputedObject', (FakeExpression,), {'_backend': backend})
+    base._base = base
+    module.ComputedObject = base
+    for name in EE_CLASSES:
+        setattr(module, name, _ExpressionType(name, (base,), {}))
+    module.initialize_calls = 0
+
+    def Initialize(*args, **kwargs):
+        module.initialize_calls += 1
+
+    def __getattr__(name):
+        raise AttributeError(f'The fake ee module does not provide ee.{name}.')
+
+    module.Initialize = Initialize
+    module.data = types.SimpleNamespace(is_initialized=lambda: module.initialize_calls > 0)
+    module.serializer = types.SimpleNamespace(toJSON=serialize)
+    module.backend = backend
+    module.tasks = tasks
+    module.__getattr__ = __getattr__
+    return tasks.install(module)
+
+
+@contextlib.contextmanager
+def fake_ee(backend, tasks=None):
+    """Context manager that installs a fake ee module (see fake_ee_module()) for GeoIndexity.
+
+    The module replaces ee in sys.modules and in the GeoIndexity modules that are
+    already imported, and the expression graph cache is cleared on entry and exit.
+    """
+    from geoindexity import graph
+
+    module = fake_ee_module(backend, tasks)
+    previous = sys.modules.get('ee')
+    bound = [item for name, item in list(sys.modules.items())
+             if name.startswith('geoindexity.') and isinstance(getattr(item, 'ee', None), types.ModuleType)]
+    originals = [item.ee for item in bound]
+    sys.modules['ee'] = module
+    for item in bound:
+        item.ee = module
+    graph.clear()
+    try:
+        yield module
+    finally:
+        graph.clear()
+        for item, original in zip(bound, originals):
+            item.ee = original
+        if previous is None:
+            sys.modules.pop('ee', None)
+        else:
+            sys.modules['ee'] = previous
+
+
+def graph_calls(node, calls=None, seen=None):
+    """Collects the call nodes of a fake expression graph, including the bodies of traced functions."""
+    calls = [] if calls is None else calls
+    seen = set() if seen is None else seen
+    if isinstance(node, FakeExpression):
+        node = node.node
+    if isinstance(node, _Node):
+        if id(node) in seen:
+            return calls
+        seen.add(id(node))
+        if node.kind == 'call':
+            calls.append(node)
+        for item in (node.receiver, node.args, node.kwargs):
+            graph_calls(item, calls, seen)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            graph_calls(item, calls, seen)
+    elif isinstance(node, dict):
+        for item in node.values():
+            graph_calls(item, calls, seen)
+    return calls
+
+
+def series_responder(times, seed=0, bands=('B2', 'B3', 'B4', 'B8', 'B11', 'B12', 'SCL')):
+    """Returns a responder for RecordReplayBackend that answers the requests of a synthetic NDVI series.
+
+    It answers the metadata dictionary and reductions mapped over the collection (restricted
+    to the date window of a filterDate), with one NDVI mean per image time.
+
+    Arguments
+    ----------
+    times : list
+        system:time_start of the images in milliseconds.
+    seed : int
+        Seed of the NDVI values (default: 0).
+    bands : tuple
+        Band names reported by the metadata.
+
+    Returns
+    ----------
+    function
+        The responder; its values attribute holds the NDVI value by image time.
+    """
+    generator = random.Random(seed)
+    values = {time_start: round(generator.uniform(0.1, 0.9), 6) for time_start in times}
+
+    def respond(expression):
+        node = expression.node
+        if node.kind == 'new' and node.name == 'Dictionary':
+            metadata = {'count': len(times), 'bands': list(bands),
+                        'ids': [f'IMAGE_{number:05d}' for number in range(len(times))], 'times': list(times),
+                        'clouds': [10.0] * len(times)}
+            return {key: metadata[key] for key in node.args[0]}
+        if node.kind == 'call' and node.name == 'map':
+            start, end = float('-inf'), float('inf')
+            receiver = node.receiver.node
+            if receiver.kind == 'call' and receiver.name == 'filterDate':
+                start, end = receiver.args
+            return {'type': 'FeatureCollection', 'features': [
+                {'type': 'Feature', 'properties': {'time': time_start, 'NDVI': values[time_start]}}
+                for time_start in times if start <= time_start < end]}
+        raise KeyError(f'The synthetic responder cannot answer a {node.kind} of {node.name}.')
+
+    respond.values = values
+    return respond
@@ -0,0 +1,472 @@
+"""
+This script includes the benchmarks that keep the cost of GeoIndexity under control.
+
+They run offline against the stand-ins in fakes.py, so no Google Earth Engine
+(GEE) account is needed, and every benchmark checks its results. Run them with
+pytest-benchmark:
+
+    pytest test/test_benchmarks.py
+    pytest test/test_benchmarks.py -k pipeline --benchmark-columns=mean,max
+"""
+
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fakes import (FakeBackend, FakeTaskBackend, PixelServer, RecordReplayBackend, fake_ee, graph_calls,
+                   series_responder)
+
+# Modules that must not be loaded by a plain import of geoindexity.geoindexity
+HEAVY_MODULES = ('pandas', 'matplotlib', 'numpy')
+
+# Server calls each stage of the pipeline benchmark may make; None for the chunked stage,
+# which makes one call per date window
+PIPELINE_CALLS = {'construct': 0, 'reduce': 1, 'dataframe': 0, 'metadata': 1, 'chunked': None, 'plot': 0,
+                  'export': 0}
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(TEST_DIRECTORY), 'src')
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+sys.path[:0] = %r
+from fakes import install_stub_ee
+stub = install_stub_ee()
+start = time.perf_counter()
+import geoindexity.geoindexity
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds,
+                  'loaded': [m for m in %r if m in sys.modules],
+                  'initialize_calls': stub.initialize_calls}))
+"""
+
+
+def _times(start, days, images):
+    """Returns evenly spaced image times in milliseconds, starting at 10:30 UTC of start."""
+    first = int(datetime.datetime(*start, 10, 30, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    step = days * 24 * 3600 * 1000 // images
+    return [first + number * step for number in range(images)]
+
+
+def test_import_time(benchmark):
+    """Importing geoindexity.geoindexity loads no heavy module and does not initialize ee."""
+    def run():
+        # A fresh interpreter for every round, so that no module is cached
+        output = subprocess.run([sys.executable, '-c', _IMPORT_SNIPPET % ([SOURCE_DIRECTORY, TEST_DIRECTORY],
+                                                                          HEAVY_MODULES)],
+                                check=True, capture_output=True, text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    result = benchmark.pedantic(run, rounds=3, iterations=1)
+    benchmark.extra_info['import_seconds'] = result['seconds']
+    assert result['loaded'] == []
+    assert result['initialize_calls'] == 0
+
+
+def test_scheduler_throughput(benchmark):
+    """The executor returns every result in order against a throttling backend with timeouts."""
+    from geoindexity.scheduler import RequestExecutor
+
+    requests, max_in_flight, delay = 200, 4, 0.01
+    backend = FakeBackend(delay=delay, capacity=4, timeout_rate=0.05, seed=0)
+    executor = RequestExecutor(max_workers=2 * max_in_flight, max_in_flight=max_in_flight, max_retries=8,
+                               base_delay=delay, max_delay=20 * delay)
+    try:
+        results = benchmark.pedantic(executor.map, ([backend.request(number) for number in range(requests)], 'fake'),
+                                     rounds=1, iterations=1)
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    benchmark.extra_info.update(stats)
+    assert results == list(range(requests))
+    assert stats['errors'] == 0
+    assert stats['retries'] == backend.timeouts + backend.throttled
+    # The executor never sends more requests than the backend accepts
+    assert backend.peak <= max_in_flight
+    assert backend.throttled == 0
+
+
+def _reference_indices(bands, indices, collection_id):
+    """Straightforward whole-array float64 evaluation of the registered index formulas."""
+    from geoindexity.registry import get, sensor
+
+    scaling = sensor(collection_id)
+    valid = np.ones(next(iter(bands.values())).shape, dtype=bool)
+    for band in bands.values():
+        valid &= band != scaling.nodata
+    scaled = {name: band * scaling.scale + scaling.offset for name, band in bands.items()}
+    results = {}
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for index in indices:
+            definition = get(index)
+            inputs = {role: scaled[band] for role, band in definition.band_names(collection_id).items()}
+            results[definition.name] = np.where(valid, definition.evaluate(**inputs), np.nan)
+    return results
+
+
+def _synthetic_bands(size, indices, collection_id, seed=0):
+    """Vegetation-like digital numbers, blue < green < red < nir, with scattered nodata pixels."""
+    from geoindexity.local import required_bands
+    from geoindexity.registry import sensor
+
+    generator = np.random.default_rng(seed)
+    noise = lambda high: generator.integers(0, high, size=(size, size), dtype=np.uint16)
+    red = noise(2800) + np.uint16(200)
+    roles = {'red': red, 'blue': red // 2 + noise(100), 'green': red // 4 * 3 + noise(100),
+             'nir': red + noise(5000), 'swir2': red + noise(2000)}
+    names = sensor(collection_id).bands
+    bands = {}
+    for name in required_bands(indices, collection_id):
+        band = next(roles[role] for role in roles if names[role] == name).copy()
+        band[generator.integers(0, size, size), generator.integers(0, size, size)] = 0
+        bands[name] = band
+    return bands
+
+
+@pytest.mark.parametrize('collection_id', ['Sentinel', 'Landsat'])
+def test_local_engine(benchmark, collection_id):
+    """The tiled local engine matches a float64 whole-array reference."""
+    from geoindexity.local import compute_indices
+
+    size, indices = 1024, ['NDVI', 'EVI']
+    bands = _synthetic_bands(size, indices, collection_id)
+    out = {index: np.empty((size, size), dtype=np.float32) for index in indices}
+    benchmark(compute_indices, bands, indices, collection_id, tile_rows=256, out=out)
+    benchmark.extra_info['megapixels'] = size * size / 1e6
+
+    reference = _reference_indices(bands, indices, collection_id)
+    for index, expected in reference.items():
+        finite = np.isfinite(expected)
+        assert np.array_equal(np.isnan(out[index]), ~finite)
+        difference = np.abs(out[index][finite] - expected[finite]) / np.maximum(1, np.abs(expected[finite]))
+        assert difference.max() < 1e-4
+
+
+def test_download_throughput(benchmark):
+    """A tiled download from a throttling pixel server reassembles the served array."""
+    from geoindexity.download import download_image, tile_grid
+    from geoindexity.scheduler import RequestExecutor
+
+    size, bands, max_bytes, delay = 1024, 4, 256 * 1024, 0.005
+    names = [f'B{number}' for number in range(1, bands + 1)]
+    array = np.random.default_rng(0).random((bands, size, size), dtype=np.float32)
+    scale = 10.0
+    bounds = [0.0, -size * scale, size * scale, 0.0]
+    executor = RequestExecutor(max_workers=16, max_in_flight=8, max_retries=8, base_delay=delay,
+                               max_delay=20 * delay)
+    with PixelServer(array, names, transform=[scale, 0, 0.0, 0, -scale, 0.0], delay=delay, capacity=4) as server:
+        try:
+            out, grid = benchmark.pedantic(download_image, (server.image(), bounds, names, scale),
+                                           {'crs': 'EPSG:32632', 'max_bytes': max_bytes, 'executor': executor},
+                                           rounds=1, iterations=1)
+        finally:
+            executor.shutdown()
+        tiles = len(tile_grid(grid, bands, array.itemsize, max_bytes))
+        benchmark.extra_info.update(tiles=tiles, requests=server.requests, throttled=server.throttled)
+        assert server.requests == tiles + server.throttled
+    assert np.array_equal(np.asarray(out[:]), array)
+    assert executor.stats()['errors'] == 0
+
+
+def test_export_queue(benchmark, tmp_path):
+    """All exports complete within the task budget, and a restart submits none of them again."""
+    from geoindexity.exports import ExportManager
+
+    exports, max_running = 300, 10
+    backend = FakeTaskBackend(capacity=4, run_polls=3, failure_rate=0.1, seed=0)
+    names = [f'image_{number:04d}' for number in range(exports)]
+    path = str(tmp_path / 'exports.json')
+    manager = ExportManager(max_running=max_running, poll_interval=0, max_retries=10, path=path,
+                            status=backend.get_status, sleep=lambda seconds: None)
+    for name in names:
+        manager.add(name, lambda name=name: backend.export(description=name))
+    stats = benchmark.pedantic(manager.run, rounds=1, iterations=1)
+    benchmark.extra_info.update(status_calls=backend.status_calls, resubmissions=stats['resubmissions'])
+    assert stats['COMPLETED'] == exports
+    assert backend.peak <= max_running
+    assert len(backend.tasks) == exports + stats['resubmissions']
+
+    submitted = len(backend.tasks)
+    restarted = ExportManager(path=path, status=backend.get_status, sleep=lambda seconds: None)
+    for name in names:
+        restarted.add(name, lambda name=name: backend.export(description=name))
+    assert restarted.run()['COMPLETED'] == exports
+    assert len(backend.tasks) == submitted
+
+
+def _pipeline(backend, tasks, directory, window_images):
+    """Runs a Geoindexity series end to end, stage by stage; returns the series and the number of windows."""
+    from geoindexity import geoindexity
+    from geoindexity.exports import ExportManager
+
+    roi, start_date, end_date = [11.30, 48.05, 11.36, 48.09], '2019-01-01', '2021-01-01'
+    cache = os.path.join(directory, 'results.sqlite')
+    with backend.stage('construct'):
+        series = geoindexity.Geoindexity(roi, start_date, end_date, cache=cache)
+        series.collection
+    with backend.stage('reduce'):
+        series.reduce_ndvi_mean()
+    with backend.stage('dataframe'):
+        cached = geoindexity.Geoindexity(roi, start_date, end_date, cache=cache)
+        cached.reduce_ndvi_mean()
+    with backend.stage('metadata'):
+        len(series)
+        len(series)
+    with backend.stage('chunked'):
+        # Bypass the result cache, which holds the same query from the reduce stage
+        series.cache = None
+        windows = len(series.date_windows(window_images))
+        series.reduce(chunked=True, window_images=window_images)
+    with backend.stage('plot'):
+        geoindexity.download_plot_local(series, os.path.join(directory, 'plot.png'))
+    with backend.stage('export'):
+        manager = ExportManager(status=tasks.get_status, poll_interval=0, sleep=lambda seconds: None)
+        series.export_image_collection_to_drive('series', manager=manager)
+        manager.run()
+    return series, cached, windows
+
+
+def test_pipeline(benchmark, tmp_path):
+    """Every stage of the pipeline stays within its server call budget and returns the synthetic values."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+    images, window_images = 300, 100
+    respond = series_responder(_times((2019, 1, 2), 728, images))
+    runs = iter(range(1000))
+
+    def run():
+        backend = RecordReplayBackend(responder=respond)
+        tasks = FakeTaskBackend(capacity=8, run_polls=1)
+        directory = tmp_path / f'run_{next(runs)}'
+        directory.mkdir()
+        with fake_ee(backend, tasks):
+            series, cached, windows = _pipeline(backend, tasks, str(directory), window_images)
+        return backend, tasks, series, cached, windows
+
+    backend, tasks, series, cached, windows = benchmark.pedantic(run, rounds=3, iterations=1)
+    budget = dict(PIPELINE_CALLS, chunked=windows)
+    for name, calls in budget.items():
+        assert backend.stages[name]['calls'] <= calls, name
+    benchmark.extra_info['stages'] = backend.stages
+
+    expected = np.array([respond.values[time_start] for time_start in sorted(respond.values)], dtype=np.float32)
+    for df in (series.df, cached.df):
+        assert list(df.columns) == ['Date', 'Mean_NDVI']
+        assert np.array_equal(df['Mean_NDVI'].to_numpy(), expected)
+    assert len(tasks.tasks) == images
+
+
+def test_pipeline_replay(tmp_path):
+    """A recorded run replays without a responder, and a changed request is not answered."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+    cassette = str(tmp_path / 'cassette.json')
+    backend = RecordReplayBackend(path=cassette, responder=series_responder(_times((2019, 1, 2), 728, 120)))
+    tasks = FakeTaskBackend(capacity=8, run_polls=1)
+    (tmp_path / 'record').mkdir()
+    with fake_ee(backend, tasks):
+        recorded, _, _ = _pipeline(backend, tasks, str(tmp_path / 'record'), 50)
+    backend.save()
+    assert backend.recorded > 0
+
+    replay = RecordReplayBackend(path=cassette)
+    tasks = FakeTaskBackend(capacity=8, run_polls=1)
+    (tmp_path / 'replay').mkdir()
+    with fake_ee(replay, tasks):
+        replayed, _, _ = _pipeline(replay, tasks, str(tmp_path / 'replay'), 50)
+        assert replay.recorded == 0
+        pd.testing.assert_frame_equal(replayed.df, recorded.df)
+
+        from geoindexity import geoindexity
+
+        with pytest.raises(KeyError, match='No recorded response'):
+            geoindexity.Geoindexity([11.30, 48.05, 11.36, 48.10], '2019-01-01', '2021-01-01').reduce_ndvi_mean()
+
+
+def test_composite_scale():
+    """Daily mean composites of single images reduce to the values of those images.
+
+    Like Earth Engine, the responder masks the ROI of a composite that is reduced without
+    a scale or default projection, since the server would reduce it at 1 degree.
+    """
+    images = 60
+    respond = series_responder(_times((2020, 1, 2), 360, images))
+
+    def composites(expression):
+        calls = graph_calls(expression)
+        names = {call.name for call in calls}
+        if 'ImageCollection.fromImages' not in names:
+            return respond(expression)
+        masked = 'setDefaultProjection' not in names and \
+            any(call.kwargs.get('scale') is None for call in calls if call.name == 'reduceRegion')
+        result = respond(expression)
+        for feature in result['features']:
+            properties = feature['properties']
+            properties['time'] -= properties['time'] % (24 * 3600 * 1000)
+            if masked:
+                properties['NDVI'] = None
+        return result
+
+    with fake_ee(RecordReplayBackend(responder=composites)):
+        from geoindexity import geoindexity
+
+        series = geoindexity.Geoindexity([11.30, 48.05, 11.31, 48.06], '2020-01-01', '2021-01-01')
+        series.reduce()
+        images_df = series.df.assign(Date=series.df['Date'].dt.floor('D')).set_index('Date')
+        series.reduce(composite='daily', composite_method='mean')
+        composites_df = series.df.set_index('Date')
+
+    values = composites_df['Mean_NDVI']
+    assert len(values) == images
+    assert not values.isna().any()
+    assert np.array_equal(values.to_numpy(), images_df['Mean_NDVI'].reindex(values.index).to_numpy())
+
+
+@pytest.mark.benchmark(group='spans')
+def test_span_disabled(benchmark):
+    """Without callbacks a span is the shared no-op object."""
+    from geoindexity import instrumentation
+
+    def section():
+        with instrumentation.span('bench', images=1) as span:
+            span.set(rows=1)
+        return span
+
+    assert benchmark(section) is instrumentation.NULL_SPAN
+
+
+@pytest.mark.benchmark(group='spans')
+def test_span_enabled(benchmark):
+    """With a callback every span is recorded with its attributes and nesting."""
+    from geoindexity import instrumentation
+
+    def section():
+        with instrumentation.span('outer'):
+            with instrumentation.span('inner', images=2) as span:
+                span.set(rows=3)
+
+    with instrumentation.Recorder(history=10) as recorder:
+        benchmark(section)
+    summary = recorder.summary()
+    assert summary['inner']['images'] == 2 * summary['inner']['count']
+    assert summary['inner']['rows'] == 3 * summary['inner']['count']
+    inner, outer = list(recorder.spans)[-2:]
+    assert inner.parent_id == outer.span_id
+    assert not instrumentation.enabled()
+
+
+def _synthetic_frames(series, points, seed=0):
+    generator = np.random.default_rng(seed)
+    dates = np.datetime64('2015-06-23', 'ms') + np.arange(points) * np.timedelta64(5 * 24 * 3600 * 1000 // 10, 'ms')
+    phase = np.arange(points) / points * 20 * np.pi
+    return {f'parcel_{number:05d}': pd.DataFrame({
+        'Date': dates,
+        'Mean_NDVI': (0.5 + 0.3 * np.sin(phase + number) + generator.normal(0, 0.05, points)).astype('float32'),
+    }) for number in range(series)}
+
+
+@pytest.mark.benchmark(group='render')
+def test_render_batch(benchmark, tmp_path):
+    """render_batch() writes one PNG per series, and decimation keeps the extremes."""
+    from geoindexity import render
+
+    frames = _synthetic_frames(20, 5000)
+    rounds = iter(range(1000))
+    paths = benchmark.pedantic(lambda: render.render_batch(frames, directory=str(tmp_path / f'png_{next(rounds)}'),
+                                                           processes=2), rounds=2, iterations=1)
+    assert len(paths) == len(frames)
+    assert all(os.path.getsize(path) > 0 for path in paths)
+
+    arrays = render.series_arrays(frames['parcel_00000'])
+    dates, values = arrays['Mean_NDVI']
+    assert len(values) <= render.MAX_POINTS
+    assert values.max() == frames['parcel_00000']['Mean_NDVI'].max()
+    assert values.min() == frames['parcel_00000']['Mean_NDVI'].min()
+    assert np.all(np.diff(dates.astype('int64')) > 0)
+
+
+@pytest.mark.benchmark(group='render')
+def test_render_pdf(benchmark, tmp_path):
+    """render_batch(pdf=...) writes one page per series, including series without values."""
+    from geoindexity import render
+
+    frames = _synthetic_frames(20, 5000)
+    frames['no_rows'] = frames['parcel_00000'].iloc[:0]
+    frames['no_columns'] = frames['parcel_00000'][['Date']]
+    path = str(tmp_path / 'report.pdf')
+    assert benchmark.pedantic(render.render_batch, (frames,), {'pdf': path}, rounds=2, iterations=1) == [path]
+    with open(path, 'rb') as file:
+        assert len(re.findall(rb'/Type\s*/Page\b(?!s)', file.read())) == len(frames)
+
+
+@pytest.mark.benchmark(group='render')
+def test_render_pyplot_baseline(benchmark, tmp_path):
+    """Renders like GeoIndexity did before geoindexity.render: a new pyplot figure per plot."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    frames = _synthetic_frames(20, 5000)
+
+    def run():
+        for name, df in frames.items():
+            plt.figure(figsize=(10, 5))
+            plt.plot(df['Date'], df['Mean_NDVI'], marker='o', linestyle='--', label='Mean NDVI')
+            plt.title('Mean NDVI Time Series')
+            plt.xlabel('Date')
+            plt.xticks(rotation=45)
+            plt.grid(True)
+            plt.savefig(str(tmp_path / f'{name}.png'))
+            plt.close()
+
+    benchmark.pedantic(run, rounds=1, iterations=1)
+    assert len(list(tmp_path.glob('*.png'))) == len(frames)
+
+
+def test_manifest_throughput(benchmark, tmp_path):
+    """geoindexity run writes every row across processes, and a resumed run runs no shard again."""
+    import csv
+
+    from geoindexity import cli
+
+    aois, images, latency = 16, 50, 0.05
+    respond = series_responder(_times((2020, 1, 2), 360, images))
+
+    def slow(expression):
+        time.sleep(latency)
+        return respond(expression)
+
+    manifest = tmp_path / 'manifest.csv'
+    with open(manifest, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'xmin', 'ymin', 'xmax', 'ymax'])
+        for number in range(aois):
+            x, y = 11.0 + number % 8 * 0.01, 48.0 + number // 8 * 0.01
+            writer.writerow([f'parcel_{number:04d}', x, y, x + 0.005, y + 0.005])
+    output = str(tmp_path / 'results')
+    arguments = {'dates': [('2020-01-01', '2021-01-01')], 'processes': 2, 'shard_size': 4, 'start_method': 'fork',
+                 'log': lambda message: None}
+
+    # The workers are forked, so that they inherit the fake ee module
+    with fake_ee(RecordReplayBackend(responder=slow)):
+        summary = benchmark.pedantic(cli.run_manifest, (str(manifest), output), arguments, rounds=1, iterations=1)
+    benchmark.extra_info['aois_per_minute'] = summary['aois_per_minute']
+    assert summary['failed'] == 0
+    assert summary['rows'] == aois * images
+
+    with fake_ee(RecordReplayBackend(responder=slow)):
+        resumed = cli.run_manifest(str(manifest), output, **arguments)
+    assert resumed['skipped'] == resumed['shards']
+    df = cli.read_results(output)
+    assert len(df) == aois * images
+    assert set(df['parcel_id'].astype(str)) == {f'parcel_{number:04d}' for number in range(aois)}
@@ -0,0 +1,191 @@
+"""
+This script includes the tests of the direct pixel download (geoindexity.download).
+
+The tiles are served by PixelServer of fakes.py, a local HTTP stand-in for the
+Earth Engine download URLs, or by a fake ee.data.computePixels.
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+from fakes import PixelServer, RecordReplayBackend, fake_ee
+from geoindexity.download import (METERS_PER_DEGREE, Grid, Tile, _decode, _tile_transform, download_image,
+                                  fetch_tile, pixel_grid, tile_grid)
+from geoindexity.scheduler import RequestExecutor
+
+SCALE = 10.0
+BANDS = ['B2', 'B4', 'B8']
+
+
+def _bands(height, width, seed=0):
+    return np.random.default_rng(seed).random((len(BANDS), height, width), dtype=np.float32)
+
+
+def _bounds(height, width):
+    """Bounds of an EPSG:32632 region of the given pixels whose upper left corner is the origin."""
+    return [0.0, -height * SCALE, width * SCALE, 0.0]
+
+
+@pytest.fixture
+def executor():
+    executor = RequestExecutor(max_workers=8, max_in_flight=8, max_retries=50, base_delay=0.002, max_delay=0.02)
+    yield executor
+    executor.shutdown()
+
+
+def test_pixel_grid():
+    """The grid starts at the upper left corner and covers partial pixels."""
+    grid = pixel_grid([500.0, 1000.0, 1005.0, 1250.0], 10.0, crs='EPSG:32632')
+    assert grid == Grid('EPSG:32632', [10.0, 0, 500.0, 0, -10.0, 1250.0], 51, 25)
+
+    grid = pixel_grid([11.0, 48.0, 11.01, 48.005], 10.0)
+    assert grid.transform[0] == pytest.approx(10.0 / METERS_PER_DEGREE)
+    assert (grid.width, grid.height) == (112, 56)
+    assert pixel_grid([0.0, 0.0, 0.0, 0.0], 10.0).width == 1
+
+
+@pytest.mark.parametrize('height, width, bands, max_bytes, max_pixels', [
+    (100, 70, 3, 3 * 4 * 32 * 32, 32768),
+    (64, 64, 1, 4 * 16 * 16, 32768),
+    (10, 1000, 2, 10 ** 9, 128),
+    (1, 1, 4, 4, 32768),
+])
+def test_tile_grid(height, width, bands, max_bytes, max_pixels):
+    """Tiles are squares within the limits that cover the grid exactly once; edge tiles are cut."""
+    grid = Grid('EPSG:32632', [SCALE, 0, 0.0, 0, -SCALE, 0.0], width, height)
+    tiles = tile_grid(grid, bands, 4, max_bytes, max_pixels)
+
+    side = max(max(tile.height, tile.width) for tile in tiles)
+    assert side <= max_pixels
+    coverage = np.zeros((height, width), dtype=int)
+    for tile in tiles:
+        assert tile.row % side == 0 and tile.col % side == 0
+        assert tile.height == min(side, height - tile.row) and tile.width == min(side, width - tile.col)
+        assert tile.height * tile.width * bands * 4 <= max(max_bytes, bands * 4)
+        coverage[tile.row:tile.row + tile.height, tile.col:tile.col + tile.width] += 1
+    assert (coverage == 1).all()
+    assert tiles == sorted(tiles)
+
+
+def test_tile_transform():
+    grid = Grid('EPSG:32632', [10.0, 0, 500.0, 0, -10.0, 1250.0], 100, 100)
+    assert _tile_transform(grid, Tile(20, 30, 10, 10)) == [10.0, 0, 800.0, 0, -10.0, 1050.0]
+
+
+def test_decode_npy():
+    """Structured, 2-D and band-last NPY tiles are decoded into (bands, rows, cols)."""
+    array = _bands(4, 5)
+
+    def saved(value):
+        buffer = io.BytesIO()
+        np.save(buffer, value)
+        return buffer.getvalue()
+
+    structured = np.zeros((4, 5), dtype=[(band, np.float32) for band in BANDS])
+    for index, band in enumerate(BANDS):
+        structured[band] = array[index]
+    assert np.array_equal(_decode(saved(structured), 'NPY', BANDS), array)
+    assert np.array_equal(_decode(saved(array[0]), 'NPY', BANDS[:1]), array[:1])
+    assert np.array_equal(_decode(saved(np.moveaxis(array, 0, -1)), 'NPY', BANDS), array)
+
+
+def test_assembled_array(executor):
+    """Tiles at the right and bottom edges are placed without gaps or overlap."""
+    height, width = 83, 61
+    array = _bands(height, width)
+    with PixelServer(array, BANDS, transform=[SCALE, 0, 0.0, 0, -SCALE, 0.0]) as server:
+        out, grid = download_image(server.image(), _bounds(height, width), BANDS, SCALE, crs='EPSG:32632',
+                                   max_bytes=len(BANDS) * 4 * 16 * 16, executor=executor)
+        assert server.requests == len(tile_grid(grid, len(BANDS), 4, len(BANDS) * 4 * 16 * 16)) == 24
+    assert (grid.height, grid.width) == (height, width)
+    assert out.dtype == np.float32
+    assert np.array_equal(out, array)
+
+
+def test_band_subset_and_memmap(executor, tmp_path):
+    """A subset of the bands is downloaded in the requested order into a .npy file."""
+    height, width = 40, 50
+    array = _bands(height, width, seed=1)
+    path = tmp_path / 'nested' / 'pixels.npy'
+    with PixelServer(array, BANDS, transform=[SCALE, 0, 0.0, 0, -SCALE, 0.0]) as server:
+        out, _ = download_image(server.image(), _bounds(height, width), ['B8', 'B2'], SCALE, path=path,
+                                crs='EPSG:32632', max_bytes=2 * 4 * 20 * 20, executor=executor)
+    assert isinstance(out, np.memmap)
+    assert np.array_equal(np.load(path), array[[2, 0]])
+
+
+def test_retry_throttled_tiles(executor):
+    """Tiles rejected with HTTP 429 are retried until every tile arrived."""
+    height, width = 64, 64
+    array = _bands(height, width, seed=2)
+    with PixelServer(array, BANDS, transform=[SCALE, 0, 0.0, 0, -SCALE, 0.0], delay=0.01, capacity=1) as server:
+        out, grid = download_image(server.image(), _bounds(height, width), BANDS, SCALE, crs='EPSG:32632',
+                                   max_bytes=len(BANDS) * 4 * 16 * 16, executor=executor)
+        tiles = len(tile_grid(grid, len(BANDS), 4, len(BANDS) * 4 * 16 * 16))
+        assert server.throttled > 0
+        assert server.requests == tiles + server.throttled
+    stats = executor.stats()
+    assert stats['retries'] == server.throttled
+    assert stats['errors'] == 0
+    assert np.array_equal(out, array)
+
+
+def test_errors_are_raised(executor):
+    """A tile that keeps failing raises its error instead of leaving a hole in the array."""
+    array = _bands(32, 32)
+    executor.max_retries = 1
+    with PixelServer(array, BANDS, transform=[SCALE, 0, 0.0, 0, -SCALE, 0.0], capacity=0) as server:
+        with pytest.raises(Exception, match='429'):
+            download_image(server.image(), _bounds(32, 32), BANDS, SCALE, crs='EPSG:32632', executor=executor)
+
+
+def test_geotiff_tiles(executor):
+    """GeoTIFF tiles are decoded and assembled like NPY tiles."""
+    pytest.importorskip('tifffile')
+    height, width = 45, 38
+    array = _bands(height, width, seed=3)
+    with PixelServer(array, BANDS, transform=[SCALE, 0, 0.0, 0, -SCALE, 0.0]) as server:
+        out, _ = download_image(server.image(), _bounds(height, width), BANDS, SCALE, crs='EPSG:32632',
+                                file_format='GEO_TIFF', max_bytes=len(BANDS) * 4 * 16 * 16, executor=executor)
+    assert np.array_equal(out, array)
+
+
+def test_zarr_output(executor, tmp_path):
+    pytest.importorskip('zarr')
+    height, width = 30, 30
+    array = _bands(height, width, seed=4)
+    with PixelServer(array, BANDS, transform=[SCALE, 0, 0.0, 0, -SCALE, 0.0]) as server:
+        out, _ = download_image(server.image(), _bounds(height, width), BANDS, SCALE, path=tmp_path / 'pixels.zarr',
+                                crs='EPSG:32632', max_bytes=len(BANDS) * 4 * 16 * 16, executor=executor)
+    assert np.array_equal(out[:], array)
+
+
+def test_compute_pixels():
+    """computePixels gets the grid of the tile and its structured array is decoded."""
+    array = _bands(20, 30, seed=5)
+    grid = Grid('EPSG:32632', [SCALE, 0, 0.0, 0, -SCALE, 0.0], 30, 20)
+    tile = Tile(10, 20, 10, 10)
+    requests = []
+
+    def compute_pixels(request):
+        requests.append(request)
+        result = np.zeros((10, 10), dtype=[(band, np.float32) for band in request['bandIds']])
+        for band in request['bandIds']:
+            result[band] = array[BANDS.index(band), 10:20, 20:30]
+        return result
+
+    with fake_ee(RecordReplayBackend(responder=lambda expression: None)) as ee:
+        ee.data.computePixels = compute_pixels
+        pixels = fetch_tile('image', grid, tile, ['B4', 'B8'], method='compute')
+
+    assert np.array_equal(pixels, array[1:, 10:20, 20:30])
+    (request,) = requests
+    assert request['expression'] == 'image' and request['fileFormat'] == 'NUMPY_NDARRAY'
+    assert request['grid'] == {
+        'dimensions': {'width': 10, 'height': 10},
+        'affineTransform': {'scaleX': SCALE, 'shearX': 0, 'translateX': 200.0, 'shearY': 0, 'scaleY': -SCALE,
+                            'translateY': -100.0},
+        'crsCode': 'EPSG:32632',
+    }
@@ -0,0 +1,222 @@
+"""
+This script includes the tests of the export task manager (geoindexity.exports).
+
+The batch tasks run on FakeTaskBackend of fakes.py, a local stand-in for
+ee.batch and ee.data.getTaskStatus.
+"""
+
+import json
+
+import pytest
+
+from fakes import FakeTask, FakeTaskBackend, RecordReplayBackend, fake_ee
+from geoindexity import scheduler
+from geoindexity.exports import ExportManager
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    """Retries export starts without waiting."""
+    scheduler.configure(base_delay=0)
+    yield
+    scheduler.configure()
+
+
+def _manager(backend, **kwargs):
+    return ExportManager(status=kwargs.pop('status', backend.get_status), poll_interval=0,
+                         sleep=lambda seconds: None, **kwargs)
+
+
+def _add(manager, backend, count):
+    names = [f'export_{number}' for number in range(count)]
+    for name in names:
+        manager.add(name, lambda name=name: backend.batch.Export.image.toDrive(description=name))
+    return names
+
+
+class FlakyTask(FakeTask):
+    """A FakeTask whose start fails a number of times, before or after the server created it."""
+    def __init__(self, backend, config, failures=1, after_creation=False):
+        super().__init__(backend, config)
+        self.failures = failures
+        self.after_creation = after_creation
+        self.starts = 0
+
+    def start(self):
+        self.starts += 1
+        if self.starts <= self.failures:
+            if self.after_creation:
+                super().start()
+            raise Exception('HTTP Error 503: Service Unavailable')
+        super().start()
+
+
+def test_budget():
+    """No more than max_running tasks are submitted and unfinished at the same time."""
+    backend = FakeTaskBackend(capacity=2, run_polls=2)
+    manager = _manager(backend, max_running=3)
+    _add(manager, backend, 10)
+
+    stats = manager.run()
+    assert stats['COMPLETED'] == 10 and stats['QUEUED'] == 0
+    assert backend.peak == 3
+    assert len(backend.tasks) == 10
+
+
+def test_batched_polling():
+    """Every poll asks for the status of all active tasks in one request."""
+    backend = FakeTaskBackend(capacity=4, run_polls=1)
+    requests = []
+
+    def status(task_ids):
+        requests.append(list(task_ids))
+        return backend.get_status(task_ids)
+
+    manager = _manager(backend, max_running=4, status=status)
+    _add(manager, backend, 8)
+    manager.run()
+
+    assert len(requests) == backend.status_calls
+    assert all(0 < len(ids) <= 4 for ids in requests)
+    assert len(requests[0]) == 4
+    assert len(requests) < len(backend.tasks)
+
+
+def test_poll_backoff():
+    """The poll interval grows by backoff while nothing changes, up to max_poll_interval."""
+    backend = FakeTaskBackend(capacity=1, run_polls=6)
+    waits = []
+    manager = ExportManager(status=backend.get_status, poll_interval=1.0, max_poll_interval=3.0, backoff=2.0,
+                            sleep=waits.append)
+    _add(manager, backend, 1)
+    manager.run()
+
+    assert waits[:4] == [1.0, 2.0, 3.0, 3.0]
+
+
+def test_persisted_state(tmp_path):
+    """A restarted manager skips completed exports and monitors running ones instead of starting them again."""
+    path = str(tmp_path / 'exports.json')
+    backend = FakeTaskBackend(capacity=2, run_polls=2)
+    manager = _manager(backend, max_running=4, path=path)
+    names = _add(manager, backend, 6)
+    for _ in range(3):
+        manager.step()
+    with open(path) as file:
+        persisted = json.load(file)['tasks']
+    assert {entry['state'] for entry in persisted.values()} >= {'COMPLETED', 'RUNNING'}
+    submitted = len(backend.tasks)
+
+    restarted = _manager(backend, max_running=4, path=path)
+    states = [restarted.add(name, lambda name=name: backend.batch.Export.image.toDrive(description=name))
+              for name in names]
+    assert states.count('QUEUED') == len(names) - submitted
+    assert restarted.run()['COMPLETED'] == len(names)
+    assert len(backend.tasks) == len(names)
+    assert {entry['task_id'] for entry in restarted.tasks.values()} == {task.id for task in backend.tasks}
+
+
+def test_unknown_tasks_fail():
+    """A task the server does not know fails after more than max_retries polls."""
+    backend = FakeTaskBackend(capacity=2, run_polls=1)
+    polls = []
+
+    def status(task_ids):
+        polls.append(task_ids)
+        return [{'id': task_id, 'state': 'UNKNOWN'} for task_id in task_ids[:1]]
+
+    manager = _manager(backend, max_retries=2, status=status)
+    _add(manager, backend, 2)
+    stats = manager.run()
+
+    assert stats['FAILED'] == 2
+    assert len(polls) == 3
+    assert all(entry['error'] == f"Task {entry['task_id']} is unknown to the server."
+               for entry in manager.tasks.values())
+    assert len(backend.tasks) == 2
+
+
+def test_unknown_persisted_task_ids(tmp_path):
+    """Task ids of an earlier run that expired on the server fail, and the export can be queued again."""
+    path = str(tmp_path / 'exports.json')
+    backend = FakeTaskBackend()
+    manager = _manager(backend, path=path)
+    _add(manager, backend, 1)
+    manager.step()
+
+    other = FakeTaskBackend()
+    restarted = _manager(other, max_retries=1, path=path)
+    factory = lambda: other.batch.Export.image.toDrive(description='export_0')
+    assert restarted.add('export_0', factory) == 'RUNNING'
+    assert restarted.run()['FAILED'] == 1
+    assert other.tasks == []
+    assert restarted.add('export_0', factory) == 'QUEUED'
+    assert restarted.run()['COMPLETED'] == 1
+
+
+def test_resubmit_temporary_failures():
+    """Tasks that fail with a temporary error are submitted again, up to max_retries times."""
+    backend = FakeTaskBackend(capacity=4, run_polls=1, failure_rate=1.0)
+    manager = _manager(backend, max_retries=2)
+    _add(manager, backend, 3)
+    stats = manager.run()
+
+    assert stats['FAILED'] == 3
+    assert stats['resubmissions'] == 6
+    assert len(backend.tasks) == 9
+    assert all(entry['attempts'] == 3 and entry['error'] == 'Internal error.' for entry in manager.tasks.values())
+
+
+@pytest.mark.parametrize('after_creation', [False, True])
+def test_start_retries_do_not_duplicate(after_creation):
+    """A failed start is retried on the same task, and not at all once the server created it."""
+    backend = FakeTaskBackend()
+    created = []
+
+    def factory():
+        created.append(FlakyTask(backend, {'description': 'flaky'}, failures=2, after_creation=after_creation))
+        return created[-1]
+
+    manager = _manager(backend)
+    manager.add('flaky', factory)
+    assert manager.run()['COMPLETED'] == 1
+
+    assert len(created) == 1
+    assert len(backend.tasks) == 1
+    assert created[0].starts == (1 if after_creation else 3)
+    assert manager.tasks['flaky']['task_id'] == backend.tasks[0].id
+
+
+def test_start_errors_mark_failed():
+    """An export whose start keeps failing is marked FAILED with the error, the others still run."""
+    backend = FakeTaskBackend()
+    manager = _manager(backend)
+    manager.add('broken', lambda: FlakyTask(backend, {'description': 'broken'}, failures=100))
+    _add(manager, backend, 2)
+    stats = manager.run()
+
+    assert stats['FAILED'] == 1 and stats['COMPLETED'] == 2
+    assert '503' in manager.tasks['broken']['error']
+
+
+def test_cancel():
+    backend = FakeTaskBackend()
+    manager = _manager(backend, max_running=1)
+    _add(manager, backend, 3)
+    manager.step()
+    manager.cancel()
+
+    assert manager.run()['CANCELLED'] == 2
+    assert len(backend.tasks) == 1
+
+
+def test_default_status_uses_ee_batch():
+    """Without a status function the manager polls ee.data.getTaskStatus of the ee module."""
+    backend = FakeTaskBackend(capacity=2, run_polls=1)
+    with fake_ee(RecordReplayBackend(responder=lambda expression: None), backend) as ee:
+        manager = ExportManager(poll_interval=0, sleep=lambda seconds: None)
+        for number in range(3):
+            manager.add(f'image_{number}', lambda number=number: ee.batch.Export.image.toDrive(description=number))
+        assert manager.run()['COMPLETED'] == 3
+
+    assert backend.status_calls > 0
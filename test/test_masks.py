@@ -0,0 +1,42 @@
+"""
+This script includes the tests of the cloud masks of merged collections.
+
+The collections are built against the fake ee module of fakes.py and checked in
+their serialized expression graph.
+"""
+
+import pytest
+
+from fakes import RecordReplayBackend, fake_ee, serialize
+
+
+def _merged_graph(cloud_mask):
+    from geoindexity import geoindexity
+
+    with fake_ee(RecordReplayBackend(responder=lambda expression: None)):
+        series = geoindexity.Geoindexity([11.30, 48.05, 11.36, 48.09], '2020-01-01', '2020-03-01',
+                                         collection_id='Merged', cloud_mask=cloud_mask)
+        return serialize(series.select_product())
+
+
+@pytest.mark.parametrize('cloud_mask, sentinel_band', [
+    ('scl', 'SCL'),
+    ('probability', 'COPERNICUS/S2_CLOUD_PROBABILITY'),
+    ('qa', 'QA60'),
+    (True, 'SCL'),
+])
+def test_merged_masks(cloud_mask, sentinel_band):
+    """A Sentinel-2 mask masks the Sentinel-2 images, and the Landsat images get QA_PIXEL."""
+    graph = _merged_graph(cloud_mask)
+    assert sentinel_band in graph
+    assert 'QA_PIXEL' in graph
+
+
+def test_merged_without_mask():
+    graph = _merged_graph(None)
+    assert 'QA_PIXEL' not in graph and 'SCL' not in graph
+
+
+def test_merged_unknown_mask():
+    with pytest.raises(ValueError, match='Invalid cloud mask'):
+        _merged_graph('clouds')
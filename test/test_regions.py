@@ -0,0 +1,136 @@
+"""
+This script includes the tests of Geoindexity.reduce_regions().
+
+They run offline against the fake ee module in fakes.py, whose responder names the
+properties of reduceRegions like Earth Engine does.
+"""
+
+import datetime
+
+import pytest
+
+from fakes import RecordReplayBackend, fake_ee, graph_calls, series_responder
+
+TIMES = [int(datetime.datetime(2020, 1, 2 + 5 * step, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+         for step in range(6)]
+
+POLYGONS = {'type': 'FeatureCollection', 'features': [
+    {'type': 'Feature', 'properties': {'parcel_id': f'P{number}'},
+     'geometry': {'type': 'Polygon', 'coordinates': [[[11.30 + number / 100, 48.05], [11.31 + number / 100, 48.05],
+                                                      [11.31 + number / 100, 48.06], [11.30 + number / 100, 48.05]]]}}
+    for number in range(4)]}
+
+
+def _reducer_outputs(reducer):
+    """Output names of a fake reducer, in the order of combine()."""
+    outputs = []
+    for call in graph_calls(reducer):
+        if call.name == 'Reducer.percentile':
+            outputs.extend(f'p{value}' for value in call.args[0])
+        elif call.name.startswith('Reducer.'):
+            outputs.append(call.name.split('.')[1])
+    return outputs
+
+
+def _value(parcel, time_start, name):
+    """Synthetic value of a reduceRegions output property."""
+    return hash((parcel, time_start, name)) % 1000 / 1000
+
+
+def regions_responder(too_large=None):
+    """Returns a responder that answers the metadata and the reduceRegions requests of reduce_regions().
+
+    The properties are named like in Earth Engine: after the reducer outputs for a single
+    band, after the bands for a single output and '<band>_<output>' otherwise. Requests for
+    which too_large(polygons, times) is true fail like an oversized request.
+    """
+    metadata = series_responder(TIMES)
+    respond_requests = []
+
+    def respond(expression):
+        node = expression.node
+        if node.kind != 'call' or node.name != 'flatten':
+            return metadata(expression)
+        calls = graph_calls(node)
+        regions = next(call for call in calls if call.name == 'reduceRegions')
+        bands = next(call for call in calls if call.name == 'select' and len(call.args) == 1).args[0]
+        selectors, renamed, _ = next(call for call in calls if call.name == 'select' and len(call.args) == 3).args
+        # The date window is filtered in milliseconds, the date range of the collection with strings
+        start, end = next((call.args for call in calls if call.name == 'filterDate' and isinstance(call.args[0], int)),
+                          (float('-inf'), float('inf')))
+        features = regions.kwargs['collection'].node.args[0]
+        times = [time_start for time_start in TIMES if start <= time_start < end]
+        respond_requests.append((len(features), len(times)))
+        if too_large is not None and too_large(len(features), len(times)):
+            raise Exception('User memory limit exceeded.')
+
+        outputs = _reducer_outputs(regions.kwargs['reducer'])
+        if len(bands) == 1:
+            names = outputs
+        elif len(outputs) == 1:
+            names = list(bands)
+        else:
+            names = [f'{band}_{output}' for band in bands for output in outputs]
+        result = []
+        for feature in features:
+            parcel = feature['properties']['parcel_id']
+            for time_start in times:
+                properties = {'parcel_id': parcel, 'time': time_start,
+                              **{name: _value(parcel, time_start, name) for name in names}}
+                # Feature.select() drops the properties that do not exist
+                result.append({'type': 'Feature', 'geometry': None, 'properties': {
+                    new: properties[old] for old, new in zip(selectors, renamed or selectors) if old in properties}})
+        return {'type': 'FeatureCollection', 'features': result}
+
+    respond.requests = respond_requests
+    return respond
+
+
+def _reduce_regions(respond, **kwargs):
+    from geoindexity import geoindexity
+
+    with fake_ee(RecordReplayBackend(responder=respond)):
+        series = geoindexity.Geoindexity([11.29, 48.04, 11.36, 48.07], '2020-01-01', '2020-02-01')
+        return series.reduce_regions(POLYGONS, **kwargs)
+
+
+@pytest.mark.parametrize('indices, stats, columns', [
+    (['NDVI'], ['mean'], {'Mean_NDVI': 'mean'}),
+    (['NDVI'], ['mean', 'std', 'p90'], {'Mean_NDVI': 'mean', 'Std_NDVI': 'stdDev', 'P90_NDVI': 'p90'}),
+    (['NDVI', 'EVI'], ['mean'], {'Mean_NDVI': 'NDVI', 'Mean_EVI': 'EVI'}),
+    (['NDVI', 'EVI'], ['mean', 'p90'], {'Mean_NDVI': 'NDVI_mean', 'P90_NDVI': 'NDVI_p90',
+                                        'Mean_EVI': 'EVI_mean', 'P90_EVI': 'EVI_p90'}),
+])
+def test_output_names(indices, stats, columns):
+    """Every index and statistic gets its column, whatever names reduceRegions gives the properties."""
+    df = _reduce_regions(regions_responder(), indices=indices, stats=stats)
+
+    assert list(df.columns) == ['parcel_id', 'Date', *columns]
+    assert len(df) == len(POLYGONS['features']) * len(TIMES)
+    assert not df[list(columns)].isna().any().any()
+    for row in df.itertuples(index=False):
+        time_start = int(row.Date.timestamp() * 1000)
+        for column, name in columns.items():
+            assert getattr(row, column) == pytest.approx(_value(row.parcel_id, time_start, name))
+
+
+def test_split_too_large_chunks():
+    """A chunk that is too large is halved, and a single polygon is split by date."""
+    from geoindexity import instrumentation
+
+    respond = regions_responder(too_large=lambda polygons, times: polygons > 1 or times > 3)
+    with instrumentation.Recorder() as recorder:
+        df = _reduce_regions(respond, chunk_size=4)
+
+    assert len(df) == len(POLYGONS['features']) * len(TIMES)
+    assert not df['Mean_NDVI'].isna().any()
+    assert sorted(df['parcel_id'].astype(str).unique()) == ['P0', 'P1', 'P2', 'P3']
+    assert recorder.summary()['split']['count'] > 3
+    assert all(polygons == 1 and times <= 3 for polygons, times in respond.requests[-4:])
+
+
+def test_split_stops_at_one_day():
+    """A single polygon and a single day that are still too large raise the error."""
+    respond = regions_responder(too_large=lambda polygons, times: True)
+    with pytest.raises(Exception, match='memory limit'):
+        _reduce_regions(respond, chunk_size=1)
@@ -0,0 +1,37 @@
+"""
+This script includes the tests of the batch renderer (geoindexity.render).
+"""
+
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+def _png_size(path):
+    """Width and height in pixels of a PNG file."""
+    with open(path, 'rb') as file:
+        header = file.read(24)
+    return struct.unpack('>II', header[16:24])
+
+
+def _frame(points=50):
+    dates = np.datetime64('2020-01-01', 'ms') + np.arange(points) * np.timedelta64(5 * 24 * 3600 * 1000, 'ms')
+    return pd.DataFrame({'Date': dates, 'Mean_NDVI': np.linspace(0.1, 0.9, points, dtype='float32')})
+
+
+def test_render_series_uses_default_settings(tmp_path):
+    """render_series() does not reuse the figure size and resolution of an earlier batch in the same thread."""
+    from geoindexity import render
+
+    batch = render.render_batch({'small': _frame()}, directory=str(tmp_path / 'batch'), processes=1,
+                                figsize=(4, 2), dpi=50)
+    assert _png_size(batch[0]) == (200, 100)
+
+    path = render.render_series(_frame(), str(tmp_path / 'series.png'))
+    width, height = render.FIGSIZE
+    assert _png_size(path) == (width * render.DPI, height * render.DPI)
+
+    again = render.render_batch({'small': _frame()}, directory=str(tmp_path / 'again'), processes=1,
+                                figsize=(4, 2), dpi=50)
+    assert _png_size(again[0]) == (200, 100)
@@ -0,0 +1,183 @@
+"""
+This script includes the tests of the request scheduler (geoindexity.scheduler).
+
+The requests are callables that fail a given number of times before they succeed,
+so no Google Earth Engine (GEE) account is needed.
+"""
+
+import random
+import threading
+import time
+import types
+
+import pytest
+
+from geoindexity import scheduler
+from geoindexity.scheduler import RequestExecutor
+
+
+class FailingRequest:
+    """A request that raises an error for its first failures calls and then returns its value.
+
+    All instances that share a counter record the peak number of calls running at the same time.
+    """
+    def __init__(self, failures=0, error=None, value='done', duration=0.0, counter=None):
+        self.failures = failures
+        self.error = error or Exception('Too many concurrent aggregations.')
+        self.value = value
+        self.duration = duration
+        self.calls = 0
+        self.finished = False
+        self.counter = counter if counter is not None else InFlight()
+
+    def __call__(self):
+        self.calls += 1
+        with self.counter:
+            time.sleep(self.duration)
+        if self.calls <= self.failures:
+            raise self.error
+        self.finished = True
+        return self.value
+
+
+class InFlight:
+    """Counts the calls in flight and keeps their peak."""
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.current -= 1
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Records the backoff delays of the scheduler instead of sleeping."""
+    recorded = []
+    monkeypatch.setattr(scheduler, 'time', types.SimpleNamespace(sleep=recorded.append,
+                                                                 perf_counter=time.perf_counter))
+    return recorded
+
+
+@pytest.mark.parametrize('message, retryable, too_large', [
+    ('Too many concurrent aggregations.', True, False),
+    ('HTTP Error 429: Too Many Requests', True, False),
+    ('503 Service Unavailable', True, False),
+    ('Computation timed out.', True, True),
+    ('User memory limit exceeded.', False, True),
+    ('Collection query aborted after accumulating over 5000 elements.', False, True),
+    ('Image.select: Pattern "B8" did not match any bands.', False, False),
+])
+def test_classification(message, retryable, too_large):
+    """Temporary errors are retried as they are; errors of oversized requests ask for a split."""
+    error = Exception(message)
+    assert scheduler.is_retryable(error) is retryable
+    assert scheduler.is_too_large(error) is too_large
+    assert scheduler.is_retryable_as_is(error) is (retryable and not too_large)
+
+
+def test_network_errors_are_retryable():
+    assert scheduler.is_retryable(ConnectionError('reset'))
+    assert scheduler.is_retryable(TimeoutError())
+
+
+def test_retry_until_success(delays):
+    """A request that fails three times is retried three times with growing backoff bounds."""
+    executor = RequestExecutor(max_workers=2, max_retries=5, base_delay=0.5, max_delay=1.5)
+    request = FailingRequest(failures=3)
+
+    assert executor.get_info(request, 'flaky') == 'done'
+    assert request.calls == 4
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(1.5, 0.5 * 2 ** attempt)
+    stats = executor.stats()
+    assert stats['requests'] == 1 and stats['errors'] == 0 and stats['retries'] == 3
+    assert executor.records[-1].attempts == 4
+
+
+def test_retries_are_limited(delays):
+    """A request that keeps failing raises its error after max_retries retries."""
+    executor = RequestExecutor(max_retries=2)
+    request = FailingRequest(failures=10)
+
+    with pytest.raises(Exception, match='concurrent aggregations'):
+        executor.get_info(request, 'failing')
+    assert request.calls == 3
+    assert len(delays) == 2
+    record = executor.records[-1]
+    assert record.attempts == 3 and 'concurrent aggregations' in record.error
+    assert executor.stats()['errors'] == 1
+
+
+def test_permanent_errors_are_not_retried(delays):
+    request = FailingRequest(failures=1, error=ValueError('Invalid band name.'))
+
+    with pytest.raises(ValueError):
+        RequestExecutor().get_info(request)
+    assert request.calls == 1
+    assert delays == []
+
+
+def test_retryable_argument(delays):
+    """Timeouts are not retried as they are when the caller splits too large requests."""
+    request = FailingRequest(failures=1, error=Exception('Computation timed out.'))
+
+    with pytest.raises(Exception, match='timed out'):
+        RequestExecutor().get_info(request, retryable=scheduler.is_retryable_as_is)
+    assert request.calls == 1
+
+
+def test_backoff_bounds():
+    """The backoff has full jitter below base_delay * 2 ** attempt, capped at max_delay."""
+    executor = RequestExecutor(base_delay=1.0, max_delay=10.0)
+    random.seed(1)
+    for attempt in range(8):
+        samples = [executor.backoff(attempt) for _ in range(200)]
+        bound = min(10.0, 2 ** attempt)
+        assert all(0 <= sample <= bound for sample in samples)
+        # Full jitter spreads the delays over the whole interval
+        assert max(samples) - min(samples) > bound / 2
+
+
+def test_max_in_flight():
+    """No more than max_in_flight requests run at the same time, also while retrying."""
+    executor = RequestExecutor(max_workers=8, max_in_flight=3, base_delay=0.001)
+    counter = InFlight()
+    requests = [FailingRequest(failures=number % 2, value=number, duration=0.02, counter=counter)
+                for number in range(12)]
+
+    assert executor.map(requests, 'bounded') == list(range(12))
+    assert counter.peak == 3
+    assert executor.stats()['retries'] == 6
+
+
+def test_map_waits_for_all_requests():
+    """map() raises the first error in order, but only after the other requests have finished."""
+    executor = RequestExecutor(max_workers=4)
+    failing = FailingRequest(failures=1, error=ValueError('first'))
+    later = FailingRequest(failures=1, error=ValueError('second'))
+    slow = FailingRequest(duration=0.2)
+
+    with pytest.raises(ValueError, match='first'):
+        executor.map([failing, slow, later])
+    assert slow.finished
+
+
+def test_configure_replaces_default_executor():
+    try:
+        scheduler.configure(max_workers=3, max_in_flight=2)
+        executor = scheduler.get_executor()
+        assert (executor.max_workers, executor.max_in_flight) == (3, 2)
+        assert scheduler.get_executor() is executor
+        assert scheduler.get_info(FailingRequest(value=42)) == 42
+    finally:
+        scheduler.configure()
+    assert scheduler.get_executor() is not executor